@@ -1,19 +1,279 @@
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime
 from http import HTTPStatus
-from typing import Optional
+from typing import AsyncIterator, Dict, List, Optional, Sequence, Tuple, Union
 
-import requests
-from fastapi import APIRouter
-from starlette.responses import JSONResponse
+import httpx
+from fastapi import APIRouter, Query
+from starlette.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse, Response, StreamingResponse
 
 import config
+from libs.clustering import MAX_ZOOM, cluster_points
+from libs.earthquake_store import EarthquakeStore, to_epoch_ms
+from libs.http_client import get_http_client
 from libs.responses import responses
+from libs.ttl_cache import TTLCache
+from libs.typed_arrays import pack_columns
 
-router = APIRouter(
-    prefix="/earthquakes",
-    tags=["earthquakes"]
+router = APIRouter(prefix="/earthquakes", tags=["earthquakes"])
+
+logger = logging.getLogger(__name__)
+
+# Created on startup if config.EARTHQUAKE_STORE is enabled
+earthquake_store: Optional[EarthquakeStore] = None
+sync_task: Optional[asyncio.Task] = None
+
+# USGS responses by normalized query, map refreshes polling the same window are served from here
+usgs_cache = TTLCache(
+    ttl=config.USGS_CACHE_TTL,
+    maxsize=config.USGS_CACHE_SIZE,
+    max_bytes=config.USGS_CACHE_MAX_MB * 2**20,
 )
 
 
+RESPONSE_FORMATS = ("geojson", "columnar", "binary")
+# Columns of the compact formats, what the map shows
+EVENT_COLUMNS = ("time", "latitude", "longitude", "depth", "magnitude")
+# Epoch milliseconds do not fit a float32, the other columns are float32
+BINARY_COLUMN_TYPES = {"time": "float64"}
+CLUSTER_COLUMNS = ("latitude", "longitude", "count", "max_magnitude")
+
+
+def bad_request_response(message: str) -> JSONResponse:
+    responses[HTTPStatus.BAD_REQUEST]["error_message"] = message
+    return JSONResponse(
+        status_code=HTTPStatus.BAD_REQUEST,
+        content=responses[HTTPStatus.BAD_REQUEST],
+    )
+
+
+def round_to_minute(value: str) -> str:
+    """Floors an ISO date(time) to the minute, other formats are passed to USGS as they are"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return value
+    return moment.replace(second=0, microsecond=0).isoformat()
+
+
+def usgs_cache_key(query_params: Dict[str, object]) -> Tuple:
+    return tuple(sorted(query_params.items()))
+
+
+async def stream_and_cache(
+    upstream: httpx.Response, cache_key: Tuple
+) -> AsyncIterator[bytes]:
+    """Passes the upstream body through as it arrives, cached once it was read completely"""
+    chunks = []
+    try:
+        async for chunk in upstream.aiter_bytes():
+            chunks.append(chunk)
+            yield chunk
+    finally:
+        await upstream.aclose()
+
+    body = b"".join(chunks)
+    usgs_cache.set(cache_key, body, size=len(body))
+
+
+async def run_store_sync() -> None:
+    while True:
+        try:
+            await earthquake_store.sync(get_http_client("usgs"), config.USGS_API_HOST)
+        except Exception as err:
+            logger.warning("Earthquake store sync failed: %s", err)
+        await asyncio.sleep(config.EARTHQUAKE_STORE_SYNC_INTERVAL)
+
+
+async def startup() -> None:
+    """Opens the event store and starts syncing it in the background"""
+    global earthquake_store, sync_task
+
+    if not config.EARTHQUAKE_STORE:
+        return
+    os.makedirs(os.path.dirname(config.EARTHQUAKE_STORE_PATH), exist_ok=True)
+    earthquake_store = EarthquakeStore(
+        config.EARTHQUAKE_STORE_PATH,
+        min_magnitude=config.EARTHQUAKE_STORE_MIN_MAGNITUDE,
+        days=config.EARTHQUAKE_STORE_DAYS,
+        max_staleness=config.EARTHQUAKE_STORE_MAX_STALENESS,
+    )
+    sync_task = asyncio.create_task(run_store_sync())
+
+
+async def shutdown() -> None:
+    if sync_task is not None:
+        sync_task.cancel()
+
+
+def usgs_url(query_params: Dict[str, object]) -> httpx.URL:
+    # USGS_API_HOST carries the fixed parameters (e.g. format=geojson), params= would drop them
+    return httpx.URL(config.USGS_API_HOST).copy_merge_params(query_params)
+
+
+async def fetch_usgs(query_params: Dict[str, object]) -> Response:
+    cache_key = usgs_cache_key(query_params)
+    body = usgs_cache.get(cache_key)
+    if body is not None:
+        return Response(content=body, media_type="application/json")
+
+    client = get_http_client("usgs")
+    upstream = await client.send(
+        client.build_request("GET", usgs_url(query_params)), stream=True
+    )
+    if upstream.status_code != HTTPStatus.OK:
+        await upstream.aclose()
+        return JSONResponse(
+            status_code=upstream.status_code, content={"error": upstream.reason_phrase}
+        )
+
+    return StreamingResponse(
+        stream_and_cache(upstream, cache_key), media_type="application/json"
+    )
+
+
+async def read_usgs_features(
+    query_params: Dict[str, object],
+) -> Union[List[dict], JSONResponse]:
+    """Parsed features of a USGS query, for the responses built from the events"""
+    cache_key = usgs_cache_key(query_params)
+    body = usgs_cache.get(cache_key)
+    if body is None:
+        response = await get_http_client("usgs").get(usgs_url(query_params))
+        if response.status_code != HTTPStatus.OK:
+            return JSONResponse(
+                status_code=response.status_code,
+                content={"error": response.reason_phrase},
+            )
+        body = response.content
+        usgs_cache.set(cache_key, body, size=len(body))
+
+    collection = await run_in_threadpool(json.loads, body)
+    return collection.get("features", [])
+
+
+def project_properties(feature: dict, properties: Sequence[str]) -> dict:
+    """The requested properties of a feature, "id" is the event id"""
+    feature_properties = feature.get("properties") or {}
+    return {
+        name: feature.get("id") if name == "id" else feature_properties.get(name)
+        for name in properties
+    }
+
+
+def feature_columns(
+    features: Sequence[dict], properties: Sequence[str]
+) -> Dict[str, list]:
+    """Parallel arrays of the event columns and the requested properties"""
+    columns: Dict[str, list] = {name: [] for name in (*EVENT_COLUMNS, *properties)}
+    for feature in features:
+        longitude, latitude, depth = (feature["geometry"]["coordinates"] + [None])[:3]
+        feature_properties = feature.get("properties") or {}
+        columns["time"].append(feature_properties.get("time"))
+        columns["latitude"].append(latitude)
+        columns["longitude"].append(longitude)
+        columns["depth"].append(depth)
+        columns["magnitude"].append(feature_properties.get("mag"))
+        for name, value in project_properties(feature, properties).items():
+            columns[name].append(value)
+    return columns
+
+
+def store_columns(store_query: dict, properties: Sequence[str]) -> Dict[str, list]:
+    """Event columns straight from the store, features are parsed only for extra properties"""
+    if not properties:
+        rows = earthquake_store.query(EVENT_COLUMNS, **store_query)
+        return {
+            name: list(values)
+            for name, values in zip(
+                EVENT_COLUMNS, zip(*rows) if rows else ((),) * len(EVENT_COLUMNS)
+            )
+        }
+
+    rows = earthquake_store.query((*EVENT_COLUMNS, "feature"), **store_query)
+    columns: Dict[str, list] = {name: [] for name in (*EVENT_COLUMNS, *properties)}
+    for *values, feature in rows:
+        for name, value in zip(EVENT_COLUMNS, values):
+            columns[name].append(value)
+        for name, value in project_properties(json.loads(feature), properties).items():
+            columns[name].append(value)
+    return columns
+
+
+def store_features(store_query: dict) -> List[dict]:
+    return [
+        json.loads(feature)
+        for (feature,) in earthquake_store.query(("feature",), **store_query)
+    ]
+
+
+async def load_columns(
+    query_params: Dict[str, object],
+    store_query: Optional[dict],
+    properties: Sequence[str],
+) -> Union[Dict[str, list], JSONResponse]:
+    if store_query is not None:
+        return await run_in_threadpool(store_columns, store_query, properties)
+
+    features = await read_usgs_features(query_params)
+    if isinstance(features, JSONResponse):
+        return features
+    return await run_in_threadpool(feature_columns, features, properties)
+
+
+async def clustered_response(
+    columns: Dict[str, list],
+    response_format: str,
+    cluster_zoom: Optional[int],
+    max_points: Optional[int],
+) -> Response:
+    clusters = await run_in_threadpool(
+        cluster_points,
+        columns["latitude"],
+        columns["longitude"],
+        columns["magnitude"],
+        cluster_zoom,
+        max_points,
+    )
+    metadata = {
+        "count": len(columns["time"]),
+        "clusters": len(clusters["count"]),
+        "zoom": clusters.pop("zoom"),
+    }
+
+    if response_format == "geojson":
+        return JSONResponse(
+            {
+                "type": "FeatureCollection",
+                "metadata": metadata,
+                "features": [
+                    {
+                        "type": "Feature",
+                        "properties": {"count": count, "max_magnitude": max_magnitude},
+                        "geometry": {
+                            "type": "Point",
+                            "coordinates": [longitude, latitude],
+                        },
+                    }
+                    for latitude, longitude, count, max_magnitude in zip(
+                        *(clusters[name] for name in CLUSTER_COLUMNS)
+                    )
+                ],
+            }
+        )
+    if response_format == "columnar":
+        return JSONResponse({**metadata, "columns": clusters})
+    return Response(
+        content=pack_columns(clusters, {}),
+        media_type="application/octet-stream",
+        headers={"X-Cluster-Zoom": str(metadata["zoom"])},
+    )
+
+
 @router.get("", status_code=HTTPStatus.OK)
 async def get_data(
     start_date: str,
@@ -24,6 +284,10 @@ async def get_data(
     max_long: Optional[float] = None,
     min_lat: Optional[float] = None,
     min_long: Optional[float] = None,
+    response_format: str = Query("geojson", alias="format"),
+    properties: Optional[List[str]] = Query(None),
+    cluster_zoom: Optional[int] = Query(None, ge=0, le=MAX_ZOOM),
+    max_points: Optional[int] = Query(None, ge=1),
 ):
     """
     Fetches earthquake data from the USGS API based on the provided parameters.
@@ -37,13 +301,34 @@ async def get_data(
     - max_long (Optional[float]): Maximum longitude for filtering results.
     - min_lat (Optional[float]): Minimum latitude for filtering results.
     - min_long (Optional[float]): Minimum longitude for filtering results.
+    - format (str): "geojson" (as USGS returns it), "columnar" (JSON of parallel arrays of time,
+      latitude, longitude, depth and magnitude) or "binary" (the same columns as typed arrays,
+      see libs/typed_arrays.py).
+    - properties (Optional[List[str]]): Feature properties to keep in geojson, or to add as
+      columns in the other formats ("id" is the event id).
+    - cluster_zoom (Optional[int]): Aggregates the events into the grid cells of this map zoom
+      level (see libs/clustering.py), returning the centroid, count and max magnitude per cell
+      instead of the events. Properties are ignored.
+    - max_points (Optional[int]): Aggregates the events into at most this many cells, the grid is
+      coarsened (from cluster_zoom, or the finest zoom) until they fit.
 
     Returns:
     - JSONResponse: The response from the USGS API or an error message.
     """
+    if response_format not in RESPONSE_FORMATS:
+        return bad_request_response(
+            f"Invalid format: '{response_format}', expected one of {', '.join(RESPONSE_FORMATS)}"
+        )
+    properties = [
+        name
+        for name in dict.fromkeys(properties or ())
+        if name and name not in EVENT_COLUMNS
+    ]
+
+    # Time windows are rounded to the minute, so polling clients share the cache entries
     query_params = {
-        "starttime": start_date,
-        "endtime": end_date,
+        "starttime": round_to_minute(start_date),
+        "endtime": round_to_minute(end_date),
         "minmagnitude": min_magnitude,
         "maxmagnitude": max_magnitude,
     }
@@ -58,11 +343,71 @@ async def get_data(
     # Add optional parameters if they are provided
     query_params |= {k: v for k, v in optional_params.items() if v is not None}
 
-    # Construct query string
-    query_string = "&".join(f"{key}={value}" for key, value in query_params.items())
-    url = f"{config.USGS_API_HOST}&{query_string}"
-    response = requests.get(url)
+    # Windows within the synced history are answered locally, without calling USGS
+    store_query = None
+    start_ms = to_epoch_ms(str(query_params["starttime"]))
+    end_ms = to_epoch_ms(str(query_params["endtime"]))
+    if earthquake_store is not None and earthquake_store.covers(
+        start_ms, end_ms, min_magnitude
+    ):
+        store_query = {
+            "start_ms": start_ms,
+            "end_ms": end_ms,
+            "min_magnitude": min_magnitude,
+            "max_magnitude": max_magnitude,
+            "min_lat": min_lat,
+            "max_lat": max_lat,
+            "min_long": min_long,
+            "max_long": max_long,
+        }
+
+    if cluster_zoom is not None or max_points is not None:
+        columns = await load_columns(query_params, store_query, ())
+        if isinstance(columns, JSONResponse):
+            return columns
+        return await clustered_response(
+            columns, response_format, cluster_zoom, max_points
+        )
+
+    if response_format == "geojson":
+        if not properties:
+            if store_query is None:
+                return await fetch_usgs(query_params)
+            body = await run_in_threadpool(
+                earthquake_store.feature_collection, **store_query
+            )
+            return Response(content=body, media_type="application/json")
+
+        if store_query is None:
+            features = await read_usgs_features(query_params)
+            if isinstance(features, JSONResponse):
+                return features
+        else:
+            features = await run_in_threadpool(store_features, store_query)
+        return JSONResponse(
+            {
+                "type": "FeatureCollection",
+                "metadata": {"count": len(features)},
+                "features": [
+                    {
+                        "type": "Feature",
+                        "id": feature.get("id"),
+                        "properties": project_properties(feature, properties),
+                        "geometry": feature.get("geometry"),
+                    }
+                    for feature in features
+                ],
+            }
+        )
+
+    columns = await load_columns(query_params, store_query, properties)
+    if isinstance(columns, JSONResponse):
+        return columns
 
-    if response.status_code == HTTPStatus.OK:
-        return response.json()
-    return JSONResponse(status_code=response.status_code, content={"error": response.reason})
+    if response_format == "columnar":
+        # JSONResponse directly, jsonable_encoder would walk every value
+        return JSONResponse({"count": len(columns["time"]), "columns": columns})
+    return Response(
+        content=pack_columns(columns, BINARY_COLUMN_TYPES),
+        media_type="application/octet-stream",
+    )
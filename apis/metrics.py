@@ -0,0 +1,27 @@
+from http import HTTPStatus
+
+from fastapi import APIRouter, Depends
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from starlette.responses import Response
+
+from libs.auth.bearer_token import BearerAuth
+from libs.db_instrumentation import get_slow_query_plans
+
+router = APIRouter(
+    prefix="/metrics",
+    tags=["metrics"],
+    dependencies=[Depends(BearerAuth())],
+    include_in_schema=False,
+)
+
+
+@router.get("", status_code=HTTPStatus.OK)
+async def metrics():
+    """Metrics of this worker process in Prometheus text format"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
+@router.get("/slow_queries", status_code=HTTPStatus.OK)
+async def slow_queries():
+    """Last captured EXPLAIN (ANALYZE, BUFFERS) plans of the slow SQL statements"""
+    return get_slow_query_plans()
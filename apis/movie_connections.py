@@ -1,40 +1,91 @@
+import asyncio
 from http import HTTPStatus
-from typing import Tuple, List, Annotated
+from typing import Annotated, Dict, List, Optional, Tuple
 from urllib.parse import quote
 
-import requests
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Body, Depends, Query
 from starlette.responses import JSONResponse
 
 import config
 from libs.auth.bearer_token import BearerAuth
+from libs.credit_graph import CreditGraph
+from libs.http_client import get_http_client
+from libs.intersection import check_size, count_shared, intersect
 from libs.responses import responses
+from libs.ttl_cache import TTLCache
 
-router = APIRouter(
-    prefix="/movie_connections",
-    tags=["movie_connections"]
-)
+router = APIRouter(prefix="/movie_connections", tags=["movie_connections"])
 
 bearer_security = BearerAuth()
 
+# The movie_credits of the persons fetched from TMDB, connections are searched in it
+credit_graph = CreditGraph(max_credits=config.MOVIE_CONNECTIONS_GRAPH_MAX_CREDITS)
+
+# TMDB movie_credits by person id
+person_credits_cache = TTLCache(
+    ttl=config.MOVIE_CREDITS_CACHE_TTL, maxsize=config.MOVIE_CREDITS_CACHE_SIZE
+)
+
+MOVIE_FIELDS = (
+    "title",
+    "original_title",
+    "original_language",
+    "overview",
+    "popularity",
+    "poster_path",
+    "backdrop_path",
+    "release_date",
+)
 
-def get_data_from_url(url: str) -> Tuple:
-    resp = requests.get(url)
 
-    if int(resp.status_code) == 200:
+async def get_data_from_url(url: str) -> Tuple:
+    """
+    GET request to TMDB through the pooled client.
+
+    :return: (status code, JSON body or the error message)
+    """
+    resp = await get_http_client("tmdb").get(url)
+
+    if resp.status_code == HTTPStatus.OK:
         return resp.status_code, resp.json()
-    else:
+    try:
         return resp.status_code, resp.json()["status_message"]
+    except (ValueError, KeyError):
+        return resp.status_code, resp.reason_phrase
+
+
+def bad_request_response(message: str) -> JSONResponse:
+    responses[HTTPStatus.BAD_REQUEST]["error_message"] = message
+    return JSONResponse(
+        status_code=HTTPStatus.BAD_REQUEST,
+        content=responses[HTTPStatus.BAD_REQUEST],
+    )
+
+
+def upstream_error_response(person_id: int, status_code: int, message) -> JSONResponse:
+    """The status of a failed TMDB request of a person"""
+    return JSONResponse(
+        status_code=status_code,
+        content={"error_message": f"Person {person_id}: {message}"},
+    )
+
+
+def check_id_lists(id_lists: list) -> None:
+    check_size(
+        id_lists, config.MOVIE_CONNECTIONS_MAX_LISTS, config.MOVIE_CONNECTIONS_MAX_IDS
+    )
 
 
 def parse_person_ids(person_ids: str) -> List[int]:
     try:
         return [int(id.strip()) for id in person_ids.split(",")]
     except ValueError:
-        raise ValueError("Invalid person_ids format. Expected comma-separated integers.")
+        raise ValueError(
+            "Invalid person_ids format. Expected comma-separated integers."
+        )
 
 
-def get_person_details(person_id: int):
+async def get_person_details(person_id: int):
     """
     Fetches details about a person from the IMDB API.
 
@@ -45,20 +96,23 @@ def get_person_details(person_id: int):
     - List[Dict[str, Any]]: A list of person details if found, otherwise a JSONResponse with an error message.
     """
     url = f"{config.IMDB_API_URL}/person/{person_id}?api_key={config.IMDB_API_KEY}"
-    status_code, result = get_data_from_url(url)
+    status_code, result = await get_data_from_url(url)
 
     if status_code == 200:
         persons = []
-        for person_data in result.get('results', []):
-            if person_data.get('gender', 0) > 0:
-                known_for = [(x['title'], x['original_title']) for x in person_data.get('known_for', [])]
+        for person_data in result.get("results", []):
+            if person_data.get("gender", 0) > 0:
+                known_for = [
+                    (x["title"], x["original_title"])
+                    for x in person_data.get("known_for", [])
+                ]
                 person = {
-                    "id": person_data['id'],
-                    "name": person_data['name'],
-                    "known_for_department": person_data['known_for_department'],
-                    "popularity": person_data['popularity'],
-                    "profile_path": person_data['profile_path'],
-                    "known_for": known_for
+                    "id": person_data["id"],
+                    "name": person_data["name"],
+                    "known_for_department": person_data["known_for_department"],
+                    "popularity": person_data["popularity"],
+                    "profile_path": person_data["profile_path"],
+                    "known_for": known_for,
                 }
                 persons.append(person)
         return persons
@@ -66,74 +120,103 @@ def get_person_details(person_id: int):
     return JSONResponse(status_code=status_code, content={"error_message": result})
 
 
-def get_person_movies(person_id: int):
+async def fetch_person_credits(person_id: int) -> Tuple:
+    """
+    The TMDB movie_credits of a person through the pooled client, cached.
+
+    :return: (status code, credits or the error message)
+    """
+    credits = person_credits_cache.get(person_id)
+    if credits is not None:
+        # Cached from before the graph was cleared
+        if not credit_graph.has_person(person_id):
+            credit_graph.add_person_credits(person_id, credits)
+        return HTTPStatus.OK, credits
+
     url = f"{config.IMDB_API_URL}/person/{person_id}/movie_credits?api_key={config.IMDB_API_KEY}"
+    status_code, credits = await get_data_from_url(url)
+    if status_code != HTTPStatus.OK:
+        return status_code, credits
+
+    credit_graph.add_person_credits(person_id, credits)
+    person_credits_cache.set(person_id, credits)
+    return HTTPStatus.OK, credits
+
 
+def index_credits(credits: dict) -> Dict[int, Dict[str, list]]:
+    """movie_id -> {"cast": [...], "crew": [...]} credits of a person in the movie"""
+    index: Dict[int, Dict[str, list]] = {}
+    for key in ("cast", "crew"):
+        for credit in credits.get(key, []):
+            index.setdefault(credit["id"], {"cast": [], "crew": []})[key].append(credit)
+    return index
+
+
+def get_person_movies(person_id: int, result: dict) -> dict:
+    """The cast and crew movies of a person from their movie_credits, empty without credits"""
     movies = []
     movies_list = []
 
-    status_code, result = get_data_from_url(url)
-    if status_code != 200:
-        return []
-
     if len(result) == 0:
-        return JSONResponse(
-            status_code=HTTPStatus.NOT_FOUND,
-            content=responses[HTTPStatus.NOT_FOUND],
-        )
+        return {}
     else:
-        for item in result['cast']:
+        for item in result["cast"]:
             movie = {
-                'person_id': int(person_id),
-                'movie_id': int(item['id']),
-                'character': item['character'],
-                'title': item['title'],
-                'original_title': item['original_title'],
-                'popularity': item['popularity'],
-                'overview': item['overview'],
-                'poster_path': item['poster_path']
+                "person_id": int(person_id),
+                "movie_id": int(item["id"]),
+                "character": item["character"],
+                "title": item["title"],
+                "original_title": item["original_title"],
+                "popularity": item["popularity"],
+                "overview": item["overview"],
+                "poster_path": item["poster_path"],
             }
             movies.append(movie)
-            movies_list.append(item['id'])
+            movies_list.append(item["id"])
 
-        for item in result['crew']:
+        for item in result["crew"]:
             movie = {
-                'person_id': int(person_id),
-                'movie_id': int(item['id']),
-                'job': item['job'],
-                'title': item['title'],
-                'original_title': item['original_title'],
-                'popularity': item['popularity'],
-                'overview': item['overview'],
-                'poster_path': item['poster_path']
+                "person_id": int(person_id),
+                "movie_id": int(item["id"]),
+                "job": item["job"],
+                "title": item["title"],
+                "original_title": item["original_title"],
+                "popularity": item["popularity"],
+                "overview": item["overview"],
+                "poster_path": item["poster_path"],
             }
             movies.append(movie)
-            movies_list.append(item['id'])
+            movies_list.append(item["id"])
 
-        result = {
-            'movies': movies,
-            'movies_list': movies_list
-        }
+        result = {"movies": movies, "movies_list": movies_list}
 
         return result
 
 
-@router.get('/persons/search', status_code=HTTPStatus.OK, dependencies=[Depends(bearer_security)])
+@router.get(
+    "/persons/search",
+    status_code=HTTPStatus.OK,
+    dependencies=[Depends(bearer_security)],
+)
 async def person_search(name: str):
     if not name:
-        return JSONResponse(status_code=HTTPStatus.BAD_REQUEST, content=responses[HTTPStatus.BAD_REQUEST])
+        return JSONResponse(
+            status_code=HTTPStatus.BAD_REQUEST,
+            content=responses[HTTPStatus.BAD_REQUEST],
+        )
 
     query = quote(name)
-    url = '{url}/search/person?api_key={key}&query={q}&sort_by=popularity.desc'.format(url=config.IMDB_API_URL,
-                                                                                       key=config.IMDB_API_KEY, q=query)
+    url = "{url}/search/person?api_key={key}&query={q}&sort_by=popularity.desc".format(
+        url=config.IMDB_API_URL, key=config.IMDB_API_KEY, q=query
+    )
 
-    status_code, result = get_data_from_url(url)
+    status_code, result = await get_data_from_url(url)
 
     if status_code == 200:
         persons = []
-        if len(result['results']) > 0:
-            for result in result['results']:
-                if result['gender'] > 0:
+        if len(result["results"]) > 0:
+            for result in result["results"]:
+                if result["gender"] > 0:
                     known_for = []
                     for kf in result["known_for"]:
                         if "title" in kf:
@@ -141,12 +224,14 @@ async def person_search(name: str):
                             if kf["original_title"] != movie_title:
                                 movie_title += f'({kf["original_title"]})'
                             known_for.append(movie_title)
-                    person = {"id": result['id'],
-                              "name": result['name'],
-                              "known_for_department": result['known_for_department'],
-                              "popularity": result['popularity'],
-                              "profile_path": result['profile_path'],
-                              "known_for": ", ".join(list(known_for))}
+                    person = {
+                        "id": result["id"],
+                        "name": result["name"],
+                        "known_for_department": result["known_for_department"],
+                        "popularity": result["popularity"],
+                        "profile_path": result["profile_path"],
+                        "known_for": ", ".join(list(known_for)),
+                    }
                     persons.append(person)
         return persons
     else:
@@ -154,9 +239,13 @@ async def person_search(name: str):
         return JSONResponse(status_code=status_code, content=responses[status_code])
 
 
-@router.get('/person/{person_id}/movies', dependencies=[Depends(bearer_security)])
+@router.get("/person/{person_id}/movies", dependencies=[Depends(bearer_security)])
 async def person_movies(person_id: int):
-    results = get_person_movies(person_id)
+    status_code, credits = await fetch_person_credits(person_id)
+    if status_code != HTTPStatus.OK:
+        return upstream_error_response(person_id, status_code, credits)
+
+    results = get_person_movies(person_id, credits)
 
     if len(results) > 0:
         return JSONResponse(status_code=HTTPStatus.OK, content=results)
@@ -167,59 +256,224 @@ async def person_movies(person_id: int):
         )
 
 
-@router.put('/common_movies', dependencies=[Depends(bearer_security)])
-async def common_movies(items: list):
+@router.put("/common_movies", dependencies=[Depends(bearer_security)])
+async def common_movies(
+    items: list = Body(), min_count: Optional[int] = Query(None, ge=1)
+):
+    """
+    Movie ids present in every list of items.
+
+    Parameters:
+    - items (list): Lists of movie ids, e.g. the movies_list of persons
+    - min_count (Optional[int]): Returns the ids present in at least min_count lists instead,
+      as [{"movie_id": ..., "count": number of lists}], most shared first
+    """
     if items is None or not items:
-        return JSONResponse(status_code=HTTPStatus.BAD_REQUEST, content=responses[HTTPStatus.BAD_REQUEST])
+        return JSONResponse(
+            status_code=HTTPStatus.BAD_REQUEST,
+            content=responses[HTTPStatus.BAD_REQUEST],
+        )
+
+    try:
+        check_id_lists(items)
+    except (TypeError, ValueError) as err:
+        return bad_request_response(str(err))
 
-    items_set = [set(item) for item in items]
-    return items_set[0].intersection(*items_set)
+    if min_count is not None:
+        return [
+            {"movie_id": movie_id, "count": count}
+            for movie_id, count in count_shared(items, min_count)
+        ]
+    return intersect(items)
 
 
-@router.get('/persons/common_movies', dependencies=[Depends(bearer_security)])
-async def common_movies_of_persons(person_ids: Annotated[list, Query()] = []) -> list:
-    common_movies: list = []
-    person_ids_list = ",".join(str(x) for x in person_ids)
+@router.get("/persons/common_movies", dependencies=[Depends(bearer_security)])
+async def common_movies_of_persons(person_ids: Annotated[list, Query()] = []):
+    """
+    Movies all the persons have a cast or crew credit in, from their movie_credits, most
+    popular first. "jobs" and "characters" are the crew and cast credits of each person.
+    A failed fetch returns the status of TMDB.
+    """
+    try:
+        person_ids = [int(person_id) for person_id in person_ids]
+    except ValueError:
+        return bad_request_response("Invalid person_ids, expected integers.")
+    if len(person_ids) > config.MOVIE_CONNECTIONS_MAX_LISTS:
+        return bad_request_response(
+            f"Too many persons, at most {config.MOVIE_CONNECTIONS_MAX_LISTS} are allowed."
+        )
 
-    url = '{url}/discover/movie?with_people={person_ids_list}?with_cast={person_ids_list}?with_crew={person_ids_list}&api_key={key}&sort_by=popularity.desc'.format(
-        url=config.IMDB_API_URL,
-        person_ids_list=person_ids_list,
-        key=config.IMDB_API_KEY)
+    # movie_id -> credits of the person in the movie
+    results = await asyncio.gather(
+        *(fetch_person_credits(person_id) for person_id in person_ids)
+    )
+    credits_by_person: Dict[int, Dict[int, dict]] = {}
+    for person_id, (status_code, credits) in zip(person_ids, results):
+        if status_code != HTTPStatus.OK:
+            return upstream_error_response(person_id, status_code, credits)
+        credits_by_person[person_id] = index_credits(credits)
+
+    movie_ids_by_person = [
+        list(person_credits) for person_credits in credits_by_person.values()
+    ]
+    try:
+        check_id_lists(movie_ids_by_person)
+    except ValueError as err:
+        return bad_request_response(str(err))
+    movie_ids = intersect(movie_ids_by_person)
 
-    status_code, result = get_data_from_url(url)
-    if status_code == 200:
-        common_movies_raw = result['results']
-        if len(common_movies_raw) > 0:
-
-            for movie in common_movies_raw:
-                persons = []
-                credit_url = '{url}/movie/{movie_id}/credits?api_key={key}&sort_by=popularity.desc'.format(
-                    url=config.IMDB_API_URL,
-                    movie_id=movie["id"],
-                    key=config.IMDB_API_KEY)
-                credit_status_code, credits = get_data_from_url(credit_url)
-                if credit_status_code == 200:
-                    for person_id in person_ids:
-                        as_cast = list(filter(lambda cast: cast['id'] == person_id, credits['cast']))
-                        as_crew = list(filter(lambda crew: crew['id'] == person_id, credits['crew']))
-                        person_data = {
-                            "person_id": person_id,
-                            "jobs": as_cast,
-                            "characters": as_crew
-                        }
-
-                        persons.append(person_data)
-
-                common_movies.append(
-                    {"movie_id": movie['id'],
-                     "poster_path": movie['backdrop_path'],
-                     "year": movie['release_date'][:4],
-                     "title": movie['title'],
-                     "original_title": movie['original_title'],
-                     "original_language": movie['original_language'],
-                     "overview": movie['overview'],
-                     "release_date": movie['release_date'],
-                     "popularity": movie['popularity'],
-                     "persons": persons})
+    common_movies: list = []
+    for movie_id in movie_ids:
+        first_credits = credits_by_person[person_ids[0]][movie_id]
+        movie = (first_credits["cast"] or first_credits["crew"])[0]
+        release_date = movie.get("release_date") or ""
+        common_movies.append(
+            {
+                "movie_id": movie_id,
+                "poster_path": movie.get("backdrop_path"),
+                "year": release_date[:4],
+                "title": movie.get("title"),
+                "original_title": movie.get("original_title"),
+                "original_language": movie.get("original_language"),
+                "overview": movie.get("overview"),
+                "release_date": release_date,
+                "popularity": movie.get("popularity"),
+                "persons": [
+                    {
+                        "person_id": person_id,
+                        "jobs": credits_by_person[person_id][movie_id]["crew"],
+                        "characters": credits_by_person[person_id][movie_id]["cast"],
+                    }
+                    for person_id in person_ids
+                ],
+            }
+        )
 
+    common_movies.sort(key=lambda movie: movie["popularity"] or 0, reverse=True)
     return common_movies
+
+
+@router.get("/persons/connection", dependencies=[Depends(bearer_security)])
+async def persons_connection(
+    source_id: int, target_id: int, max_degrees: int = Query(6, ge=1, le=10)
+):
+    """
+    Shortest chain of shared movies between two people, searched in the local credit graph.
+
+    Only the credits of the two people are fetched from TMDB (if they were not yet), the path
+    can only go through people and movies the API has seen before. A failed fetch returns the
+    status of TMDB.
+
+    Returns:
+    - degrees: The number of movies in the path
+    - path: Alternating persons and movies from source to target
+    - graph: The size of the local graph
+    """
+    person_ids = list(dict.fromkeys((source_id, target_id)))
+    results = await asyncio.gather(
+        *(fetch_person_credits(person_id) for person_id in person_ids)
+    )
+    credits_by_person = {}
+    for person_id, (status_code, result) in zip(person_ids, results):
+        if status_code != HTTPStatus.OK:
+            return upstream_error_response(person_id, status_code, result)
+        credits_by_person[person_id] = result
+
+    # Another request can clear the graph (max_credits) while these are fetched. Both are
+    # added together and searched without an await, so no other request runs in between.
+    credit_graph.add_persons_credits(credits_by_person)
+    path = credit_graph.shortest_path(source_id, target_id, max_degrees)
+    if path is None:
+        return JSONResponse(
+            status_code=HTTPStatus.NOT_FOUND,
+            content=responses[HTTPStatus.NOT_FOUND],
+        )
+
+    return {"degrees": len(path) // 2, "path": path, "graph": credit_graph.stats()}
+
+
+@router.get("/persons/credits", dependencies=[Depends(bearer_security)])
+async def persons_credits(
+    person_ids: Annotated[List[int], Query()],
+    min_count: Optional[int] = Query(None, ge=1),
+    breakdown: bool = False,
+):
+    """
+    Movies of several persons in one call, their movie_credits are fetched concurrently.
+
+    Parameters:
+    - person_ids (List[int]): The persons, repeated or comma-separated
+    - min_count (Optional[int]): Movies of at least this many persons, all of them by default
+    - breakdown (bool): Every movie of any of the persons, with the movie ids of each person
+
+    Returns:
+    - movies: The movies (most popular first) with the characters and jobs of the persons
+    - persons: With breakdown, the movie ids of every person
+    """
+    person_ids = list(dict.fromkeys(person_ids))
+    if len(person_ids) > config.MOVIE_CONNECTIONS_MAX_LISTS:
+        return bad_request_response(
+            f"Too many persons, at most {config.MOVIE_CONNECTIONS_MAX_LISTS} are allowed."
+        )
+
+    results = await asyncio.gather(
+        *(fetch_person_credits(person_id) for person_id in person_ids)
+    )
+    credits_by_person: Dict[int, Dict[int, Dict[str, list]]] = {}
+    for person_id, (status_code, result) in zip(person_ids, results):
+        if status_code != HTTPStatus.OK:
+            return upstream_error_response(person_id, status_code, result)
+        credits_by_person[person_id] = index_credits(result)
+
+    movie_ids_by_person = [
+        list(person_credits) for person_credits in credits_by_person.values()
+    ]
+    try:
+        check_id_lists(movie_ids_by_person)
+    except ValueError as err:
+        return bad_request_response(str(err))
+
+    movie_ids: List[int]
+    if breakdown:
+        movie_ids = sorted(set().union(*movie_ids_by_person))
+    elif min_count is not None:
+        movie_ids = [
+            movie_id for movie_id, _ in count_shared(movie_ids_by_person, min_count)
+        ]
+    else:
+        movie_ids = intersect(movie_ids_by_person)
+
+    movies = []
+    for movie_id in movie_ids:
+        persons = []
+        movie = None
+        for person_id, person_credits in credits_by_person.items():
+            movie_credits = person_credits.get(movie_id)
+            if movie_credits is None:
+                continue
+            movie = movie or (movie_credits["cast"] or movie_credits["crew"])[0]
+            persons.append(
+                {
+                    "person_id": person_id,
+                    "characters": [
+                        credit.get("character") for credit in movie_credits["cast"]
+                    ],
+                    "jobs": [credit.get("job") for credit in movie_credits["crew"]],
+                }
+            )
+        movies.append(
+            {
+                "movie_id": movie_id,
+                **{field: movie.get(field) for field in MOVIE_FIELDS},
+                "persons": persons,
+            }
+        )
+    movies.sort(key=lambda movie: movie["popularity"] or 0, reverse=True)
+
+    result = {"movies": movies}
+    if breakdown:
+        result["persons"] = [
+            {"person_id": person_id, "movie_ids": list(person_credits)}
+            for person_id, person_credits in credits_by_person.items()
+        ]
+    return result
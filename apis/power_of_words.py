@@ -2,39 +2,62 @@ import asyncio
 from collections import Counter
 from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from functools import lru_cache
 from http import HTTPStatus
-from typing import List, Optional
+from typing import Any, Dict, FrozenSet, List, Literal, Optional, Sequence, Tuple, Type
 
 import httpx
 
 # import requests  # type: ignore
 from fastapi import APIRouter, Depends, HTTPException, Query
-from nltk.corpus import stopwords
-from palzlib.database.db_client import DBClient
-from palzlib.database.db_mapper import DBMapper
-from palzlib.sentiment_analyzers.factory.sentiment_factory import (
-    SentimentAnalyzerFactory,
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from sqlalchemy import (
+    RowMapping,
+    and_,
+    asc,
+    column,
+    func,
+    insert,
+    or_,
+    select,
+    table,
+    text,
 )
-from palzlib.sentiment_analyzers.models.sentiments import (
-    LABEL_MAPPING_ROBERTA,
-    Sentiments,
-)
-from sqlalchemy import and_, asc, case, func, or_, select, text
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, load_only
+from starlette.concurrency import run_in_threadpool
 from starlette.responses import JSONResponse
 
 import config
-from config import pow_db_config
+from config import pow_db_config, pow_db_pool_config
+from libs import sentiment_rollup
 from libs.auth.bearer_token import BearerAuth
-from libs.functions import generate_sentiment_by_source_series, to_dict
+from libs.correlation import CorrelationEngine
+from libs.db_client import PooledDBClient
+from libs.functions import SENTIMENT_KEYS, generate_sentiment_series, row_converter
+from libs.metrics import track_executor
 from libs.responses import responses
+from libs.schema_snapshot import SchemaSnapshotMapper
 from models.feed_db_filters import FeedDBFilters
 
-db_client = DBClient(db_config=pow_db_config)
-db_mapper = DBMapper(db_client=db_client)
-Feeds = db_mapper.get_model("feeds")
-FeedSentiments = db_mapper.get_model("feed_sentiments")
-Sources = db_mapper.get_model("sources")
+db_client = PooledDBClient(
+    db_config=pow_db_config, pool_config=pow_db_pool_config, name="power_of_words"
+)
+db_mapper = SchemaSnapshotMapper(db_client, "power_of_words")
+
+# Reflected on application startup by load_models()
+Feeds = None
+FeedSentiments = None
+Sources = None
+
+
+def load_models() -> None:
+    """Reflects the tables of the endpoints, called from the application lifespan"""
+    global Feeds, FeedSentiments, Sources
+
+    Feeds = db_mapper.get_model("feeds")
+    FeedSentiments = db_mapper.get_model("feed_sentiments")
+    Sources = db_mapper.get_model("sources")
+
 
 router = APIRouter(
     prefix="/power_of_words",
@@ -42,7 +65,88 @@ router = APIRouter(
     dependencies=[Depends(BearerAuth())],
 )
 
-STOPWORDS = stopwords.words("hungarian")
+DATE_GRANULARITIES = ("day", "week", "month")
+
+# Columns never shipped in API responses
+FEED_EXCLUDED_COLUMNS = ("search_vector",)
+
+# Lean projection of /feeds: what the UI shows (title, date, source and sentiment)
+DEFAULT_FEED_FIELDS = (
+    "feed.id",
+    "feed.title",
+    "feed.published",
+    "feed_sentiments.sentiment_key",
+    "feed_sentiments.sentiment_value",
+    "feed_sentiments.sentiment_compound",
+    "source.id",
+    "source.name",
+)
+
+
+@lru_cache(maxsize=1)
+def get_stopwords() -> FrozenSet[str]:
+    # nltk is imported on the first use, it is slow to import
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words("hungarian"))
+
+
+def bad_request_response(message: str) -> JSONResponse:
+    responses[HTTPStatus.BAD_REQUEST]["error_message"] = message
+    return JSONResponse(
+        status_code=HTTPStatus.BAD_REQUEST,
+        content=responses[HTTPStatus.BAD_REQUEST],
+    )
+
+
+def feed_field_models() -> dict:
+    """Response group name -> model of the /feeds sparse fieldsets"""
+    return {"feed": Feeds, "feed_sentiments": FeedSentiments, "source": Sources}
+
+
+@lru_cache(maxsize=128)
+def parse_feed_fields(fields: Tuple[str, ...]) -> Dict[str, Tuple[str, ...]]:
+    """
+    Resolves the requested sparse fieldset of /feeds.
+
+    Fields are given as "<group>.<column>" (e.g. "source.name"), a bare column name means
+    a column of the feed, "<group>.*" selects every column of the group.
+
+    :param fields: Requested fields
+    :return: Dictionary of group name -> column names, in table order
+    :raise ValueError: on unknown group or column
+    """
+    models = feed_field_models()
+    requested: Dict[str, set] = {}
+
+    for field_ in fields:
+        group, _, name = field_.strip().rpartition(".")
+        group = group or "feed"
+        model = models.get(group)
+        if model is None:
+            raise ValueError(f"Unknown field group: '{group}'")
+
+        columns = model.__table__.columns
+        if name == "*":
+            requested.setdefault(group, set()).update(
+                column.name
+                for column in columns
+                if column.name not in FEED_EXCLUDED_COLUMNS
+            )
+        elif name in columns and name not in FEED_EXCLUDED_COLUMNS:
+            requested.setdefault(group, set()).add(name)
+        else:
+            raise ValueError(f"Unknown field: '{field_}'")
+
+    return {
+        group: tuple(
+            column.name
+            for column in models[group].__table__.columns
+            if column.name in requested[group]
+        )
+        for group in models
+        if group in requested
+    }
 
 
 @router.get("/feeds")
@@ -52,10 +156,16 @@ async def feeds(
     sources: Optional[List[int]] = Query(None),
     words: Optional[List[str]] = Query(None),
     free_text: Optional[str] = Query(None),
+    fields: Optional[List[str]] = Query(None),
     page: int = 1,
     items_per_page: int = 30,
     db: Session = Depends(db_client.get_session),
 ):
+    try:
+        projection = parse_feed_fields(tuple(fields or DEFAULT_FEED_FIELDS))
+    except ValueError as err:
+        return bad_request_response(str(err))
+
     filters = FeedDBFilters(
         start_date=str(f"{start_date} 00:00:00"),
         end_date=str(f"{end_date} 23:59:59"),
@@ -65,8 +175,19 @@ async def feeds(
     )
     filters.Feed = Feeds
 
+    # Push the projection down into the select list, the primary keys are always loaded
+    models = feed_field_models()
+    load_options = [
+        load_only(
+            *(getattr(model, column.name) for column in model.__mapper__.primary_key),
+            *(getattr(model, name) for name in projection.get(group, ())),
+        )
+        for group, model in models.items()
+    ]
+
     query = (
         db.query(Feeds, FeedSentiments, Sources)
+        .options(*load_options)
         .join(
             FeedSentiments,
             and_(FeedSentiments.feed_id == Feeds.id, FeedSentiments.model_id == 1),
@@ -81,20 +202,184 @@ async def feeds(
         query.limit(items_per_page).offset((page - 1) * items_per_page)
     ).all()
 
+    converters = [
+        (group, row_converter(models[group], columns=columns))
+        for group, columns in projection.items()
+    ]
+    group_index = {group: index for index, group in enumerate(models)}
+
     return {
         "total": total_items,
         "page": page,
         "feeds": [
-            {
-                "feed": to_dict(feed),
-                "feed_sentiments": to_dict(sentiment),
-                "source": to_dict(source),
-            }
-            for feed, sentiment, source in results
+            {group: convert(row[group_index[group]]) for group, convert in converters}
+            for row in results
         ],
     }
 
 
+def count_sentiments_result(db: Session, filters: FeedDBFilters, condition) -> dict:
+    """
+    Number of feeds per sentiment.
+
+    :param filters: Request filters, used when the rollup can answer
+    :param condition: Condition on the raw feeds table
+    """
+    if sentiment_rollup.can_use_rollup(filters):
+        query = sentiment_rollup.count_sentiments_query(
+            filters.start_date, filters.end_date, sources=filters.sources
+        )
+    else:
+        query = (
+            select(
+                *(
+                    func.count(FeedSentiments.feed_id)
+                    .filter(FeedSentiments.sentiment_key == sentiment_key)
+                    .label(f"{sentiment_key}_sentiments")
+                    for sentiment_key in SENTIMENT_KEYS
+                )
+            )
+            .join(Feeds, FeedSentiments.feed_id == Feeds.id)
+            .where(FeedSentiments.model_id == 1, condition)
+        )
+
+    result = db.execute(query).one()
+    return {
+        "positive_sentiments": result.positive_sentiments or 0,
+        "negative_sentiments": result.negative_sentiments or 0,
+        "neutral_sentiments": result.neutral_sentiments or 0,
+    }
+
+
+def sentiment_grouped_result(
+    db: Session,
+    filters: FeedDBFilters,
+    condition,
+    group_by: str = "source",
+    granularity: str = "day",
+    with_categories: bool = False,
+) -> dict:
+    """Sentiment series grouped by source or date bucket"""
+    if granularity not in DATE_GRANULARITIES:
+        raise ValueError(
+            f"Invalid granularity, expected one of: {', '.join(DATE_GRANULARITIES)}"
+        )
+
+    if sentiment_rollup.can_use_rollup(filters):
+        query = sentiment_rollup.sentiment_grouped_query(
+            filters, group_by=group_by, granularity=granularity
+        )
+        return generate_sentiment_series(
+            db.execute(query).all(), with_categories=with_categories
+        )
+
+    if group_by == "source":
+        group_by_column = Feeds.source_id
+    else:
+        group_by_column = sentiment_rollup.date_bucket(Feeds.feed_date, granularity)
+
+    # One row per group, pivoted by sentiment in SQL
+    query = (
+        select(
+            group_by_column.label("group_by"),
+            *(
+                func.count(Feeds.id)
+                .filter(FeedSentiments.sentiment_key == sentiment_key)
+                .label(sentiment_key)
+                for sentiment_key in SENTIMENT_KEYS
+            ),
+        )
+        .join(
+            FeedSentiments,
+            (Feeds.id == FeedSentiments.feed_id) & (FeedSentiments.model_id == 1),
+            isouter=True,
+        )
+        .where(condition)
+        .group_by(group_by_column)
+        .order_by(asc(group_by_column))
+    )
+    return generate_sentiment_series(
+        db.execute(query).all(), with_categories=with_categories
+    )
+
+
+def most_common_words_result(db: Session, condition, nm_common: int = 20) -> list:
+    stopwords = get_stopwords()
+    words: Counter = Counter()
+    for (row_words,) in db.execute(select(Feeds.words).where(condition)):
+        words.update(word for word in row_words or () if word not in stopwords)
+
+    return words.most_common(nm_common)
+
+
+def extreme_sentiments_result(db: Session, condition) -> Sequence[RowMapping]:
+    query = (
+        select(
+            Feeds.title,
+            Sources.name.label("source"),
+            Feeds.published,
+            FeedSentiments.sentiment_key,
+            FeedSentiments.sentiment_value,
+            FeedSentiments.sentiment_compound,
+        )
+        .join(FeedSentiments, FeedSentiments.feed_id == Feeds.id)
+        .join(Sources, Feeds.source_id == Sources.id)
+        .where(
+            or_(
+                FeedSentiments.sentiment_value > 0.6,
+                FeedSentiments.sentiment_value < -0.6,
+            ),
+            FeedSentiments.sentiment_key != "neutral",
+            condition,
+        )
+        .order_by(FeedSentiments.sentiment_value.desc())
+    )
+
+    return db.execute(query).mappings().all()
+
+
+def top_feeds_result(
+    db: Session,
+    filters: FeedDBFilters,
+    condition,
+    pos_neg: str = "positive",
+    limit: int = 5,
+) -> Sequence[RowMapping]:
+    conditions = [condition, FeedSentiments.sentiment_key == pos_neg.lower()]
+
+    # The rollup bounds the top values, so only the feeds above the bound are read
+    if sentiment_rollup.can_use_rollup(filters):
+        threshold = db.execute(
+            sentiment_rollup.top_value_threshold_query(
+                filters.start_date,
+                filters.end_date,
+                pos_neg.lower(),
+                limit,
+                sources=filters.sources,
+            )
+        ).scalar()
+        if threshold is not None:
+            conditions.append(FeedSentiments.sentiment_value >= threshold)
+
+    query = (
+        select(
+            Feeds.title,
+            Feeds.published,
+            Sources.name,
+            FeedSentiments.sentiment_value,
+            FeedSentiments.sentiment_compound,
+        )
+        .select_from(FeedSentiments)
+        .join(Feeds, FeedSentiments.feed_id == Feeds.id)
+        .join(Sources, Feeds.source_id == Sources.id)
+        .where(*conditions)
+        .order_by(FeedSentiments.sentiment_value.desc())
+        .limit(limit)
+    )
+
+    return db.execute(query).mappings().all()
+
+
 @router.get("/get_sentiment_grouped")
 async def get_sentiment_grouped(
     start_date: date,
@@ -102,6 +387,8 @@ async def get_sentiment_grouped(
     words: Optional[List[str]] = Query(None),
     free_text: Optional[str] = Query(None),
     group_by: str = "source",
+    granularity: str = "day",
+    with_categories: bool = False,
     db: Session = Depends(db_client.get_session),
 ):
     filters = FeedDBFilters(
@@ -112,23 +399,17 @@ async def get_sentiment_grouped(
     )
     filters.Feed = Feeds
 
-    group_by_column = Feeds.source_id if group_by == "source" else Feeds.feed_date
-    query = (
-        select(
-            group_by_column.label("group_by"),
-            func.count(Feeds.id).label("count"),
-            FeedSentiments.sentiment_key,
-        )
-        .join(
-            FeedSentiments,
-            (Feeds.id == FeedSentiments.feed_id) & (FeedSentiments.model_id == 1),
-            isouter=True,
+    try:
+        return sentiment_grouped_result(
+            db,
+            filters,
+            filters.conditions,
+            group_by=group_by,
+            granularity=granularity,
+            with_categories=with_categories,
         )
-        .where(filters.conditions)
-        .group_by(group_by_column, FeedSentiments.sentiment_key)
-        .order_by(asc(group_by_column))
-    )
-    return generate_sentiment_by_source_series(db.execute(query).all())
+    except ValueError as err:
+        return bad_request_response(str(err))
 
 
 @router.get("/most_common_words", status_code=HTTPStatus.OK)
@@ -138,49 +419,20 @@ async def most_common_words(
     nm_common: int = 20,
     db: Session = Depends(db_client.get_session),
 ):
-    cursor_result = db.query(Feeds.words).filter(
-        Feeds.feed_date.between(start_date, end_date)
+    return most_common_words_result(
+        db, Feeds.feed_date.between(start_date, end_date), nm_common=nm_common
     )
-    words: List[str] = []
-    for row_words in list(cursor_result):
-        words.extend(word for word in row_words[0] if word not in STOPWORDS)
-
-    return Counter(words).most_common(nm_common)
 
 
 @router.get("/count_sentiments", status_code=HTTPStatus.OK)
 async def count_sentiments(
     start_date: str, end_date: str, db: Session = Depends(db_client.get_session)
 ):
-    query = (
-        db.query(
-            func.sum(
-                case((FeedSentiments.sentiment_key == "positive", 1), else_=0)
-            ).label("positive_sentiments"),
-            func.sum(
-                case((FeedSentiments.sentiment_key == "negative", 1), else_=0)
-            ).label("negative_sentiments"),
-            func.sum(
-                case((FeedSentiments.sentiment_key == "neutral", 1), else_=0)
-            ).label("neutral_sentiments"),
-        )
-        .join(Feeds, FeedSentiments.feed_id == Feeds.id)
-        .filter(
-            FeedSentiments.model_id == 1, Feeds.feed_date.between(start_date, end_date)
-        )
+    filters = FeedDBFilters(start_date=start_date, end_date=end_date)
+    return count_sentiments_result(
+        db, filters, Feeds.feed_date.between(start_date, end_date)
     )
 
-    result = query.one()
-
-    if result is None:
-        JSONResponse(status_code=404, content=responses[404])
-
-    return {
-        "positive_sentiments": result.positive_sentiments or 0,
-        "negative_sentiments": result.negative_sentiments or 0,
-        "neutral_sentiments": result.neutral_sentiments or 0,
-    }
-
 
 @router.get("/extreme_sentiments")
 async def get_extreme_sentiments(
@@ -196,31 +448,7 @@ async def get_extreme_sentiments(
     )
     filters.Feed = Feeds
 
-    query = (
-        select(
-            Feeds.title,
-            Sources.name.label("source"),
-            Feeds.published,
-            FeedSentiments.sentiment_key,
-            FeedSentiments.sentiment_value,
-            FeedSentiments.sentiment_compound,
-        )
-        .join(FeedSentiments, FeedSentiments.feed_id == Feeds.id)
-        .join(Sources, Feeds.source_id == Sources.id)
-        .where(
-            or_(
-                FeedSentiments.sentiment_value > 0.6,
-                FeedSentiments.sentiment_value < -0.6,
-            ),
-            FeedSentiments.sentiment_key != "neutral",
-            filters.conditions,
-        )
-        .order_by(FeedSentiments.sentiment_value.desc())
-    )
-
-    results = db.execute(query).mappings().all()
-
-    return results
+    return extreme_sentiments_result(db, filters.conditions)
 
 
 @router.get("/top_feeds")
@@ -231,27 +459,180 @@ async def top_feeds(
     limit: int = 5,
     db: Session = Depends(db_client.get_session),
 ):
-    query = (
-        db.query(
-            Feeds.title,
-            Feeds.published,
-            Sources.name,
-            FeedSentiments.sentiment_value,
-            FeedSentiments.sentiment_compound,
+    filters = FeedDBFilters(start_date=start_date, end_date=end_date)
+    return top_feeds_result(
+        db,
+        filters,
+        Feeds.feed_date.between(start_date, end_date),
+        pos_neg=pos_neg,
+        limit=limit,
+    )
+
+
+class DashboardParams(BaseModel):
+    """Parameters of a dashboard sub-query, none for the types without parameters"""
+
+    model_config = ConfigDict(extra="forbid")
+
+
+class SentimentGroupedParams(DashboardParams):
+    group_by: str = "source"
+    granularity: Literal["day", "week", "month"] = "day"
+    with_categories: bool = False
+
+
+class MostCommonWordsParams(DashboardParams):
+    nm_common: int = 20
+
+
+class TopFeedsParams(DashboardParams):
+    pos_neg: Literal["negative", "neutral", "positive"] = "positive"
+    limit: int = 5
+
+
+class DashboardQuery(BaseModel):
+    """One sub-query of the dashboard batch"""
+
+    type: str
+    name: Optional[str] = None  # Key of the result, defaults to the type
+    params: Dict[str, Any] = Field(default_factory=dict)
+
+
+class DashboardRequest(BaseModel):
+    """Shared filters and the sub-queries of the dashboard batch"""
+
+    start_date: date
+    end_date: date
+    sources: List[int] = Field(default_factory=list)
+    words: List[str] = Field(default_factory=list)
+    free_text: str = ""
+    queries: List[DashboardQuery]
+
+
+def run_dashboard_query(db: Session, query: DashboardQuery, filters, condition):
+    """:param query: With the params validated by dashboard()"""
+    params = query.params
+    if query.type == "count_sentiments":
+        return count_sentiments_result(db, filters, condition)
+    if query.type == "sentiment_grouped":
+        return sentiment_grouped_result(db, filters, condition, **params)
+    if query.type == "most_common_words":
+        return most_common_words_result(db, condition, **params)
+    if query.type == "top_feeds":
+        return top_feeds_result(db, filters, condition, **params)
+    if query.type == "extreme_sentiments":
+        return extreme_sentiments_result(db, condition)
+    raise ValueError(f"Unknown query type: '{query.type}'")
+
+
+# Sub-queries the rollup answers without the shared feed set
+ROLLUP_DASHBOARD_QUERIES = ("count_sentiments", "sentiment_grouped")
+# Parameters of every sub-query type
+DASHBOARD_QUERIES: Dict[str, Type[DashboardParams]] = {
+    "count_sentiments": DashboardParams,
+    "sentiment_grouped": SentimentGroupedParams,
+    "most_common_words": MostCommonWordsParams,
+    "top_feeds": TopFeedsParams,
+    "extreme_sentiments": DashboardParams,
+}
+
+# Ids of the feeds matching the dashboard filters, one temporary table per transaction
+dashboard_feeds = table("dashboard_feeds", column("id"))
+
+
+def run_rollup_dashboard_queries(queries: List[DashboardQuery], filters) -> dict:
+    with db_client.get_db_session() as session:
+        return {
+            query.name: run_dashboard_query(session, query, filters, filters.conditions)
+            for query in queries
+        }
+
+
+def run_feed_set_dashboard_queries(
+    db: Session, queries: List[DashboardQuery], filters
+) -> dict:
+    """Filters the feeds once into a temporary table, the sub-queries read only those"""
+    db.execute(
+        text(
+            "CREATE TEMPORARY TABLE dashboard_feeds (id BIGINT PRIMARY KEY) ON COMMIT DROP"
         )
-        .join(Feeds, FeedSentiments.feed_id == Feeds.id)
-        .join(Sources, Feeds.source_id == Sources.id)
-        .filter(
-            Feeds.feed_date.between(start_date, end_date),
-            FeedSentiments.sentiment_key == pos_neg.lower(),
+    )
+    db.execute(
+        insert(dashboard_feeds).from_select(
+            ["id"], select(Feeds.id).where(filters.conditions)
         )
-        .order_by(FeedSentiments.sentiment_value.desc())
-        .limit(limit)
     )
+    db.execute(text("ANALYZE dashboard_feeds"))
 
-    results = db.execute(query).mappings().all()
+    condition = Feeds.id.in_(select(dashboard_feeds.c.id))
+    return {
+        query.name: run_dashboard_query(db, query, filters, condition)
+        for query in queries
+    }
 
-    return results
+
+@router.post("/dashboard")
+async def dashboard(
+    request: DashboardRequest, db: Session = Depends(db_client.get_session)
+):
+    """
+    Runs several dashboard queries with shared filters in one request.
+
+    Sub-queries answered by the sentiment rollup run on their own session, concurrently with
+    the others. The others run one after another on the request session, sharing one
+    temporary set of the filtered feed ids.
+    """
+    names = set()
+    for query in request.queries:
+        query.name = query.name or query.type
+        if query.type not in DASHBOARD_QUERIES:
+            return bad_request_response(f"Unknown query type: '{query.type}'")
+        if query.name in names:
+            return bad_request_response(f"Duplicated query name: '{query.name}'")
+        names.add(query.name)
+        try:
+            params = DASHBOARD_QUERIES[query.type].model_validate(query.params)
+        except ValidationError as err:
+            return bad_request_response(f"Invalid params of '{query.name}': {err}")
+        query.params = params.model_dump()
+
+    filters = FeedDBFilters(
+        start_date=f"{request.start_date} 00:00:00",
+        end_date=f"{request.end_date} 23:59:59",
+        sources=request.sources,
+        words=request.words,
+        free_text=request.free_text,
+    )
+    filters.Feed = Feeds
+
+    use_rollup = sentiment_rollup.can_use_rollup(filters)
+    rollup_queries, feed_set_queries = [], []
+    for query in request.queries:
+        if use_rollup and query.type in ROLLUP_DASHBOARD_QUERIES:
+            rollup_queries.append(query)
+        else:
+            feed_set_queries.append(query)
+
+    tasks = []
+    if rollup_queries:
+        tasks.append(
+            run_in_threadpool(run_rollup_dashboard_queries, rollup_queries, filters)
+        )
+    if feed_set_queries:
+        tasks.append(
+            run_in_threadpool(
+                run_feed_set_dashboard_queries, db, feed_set_queries, filters
+            )
+        )
+
+    try:
+        results: dict = {}
+        for partial_results in await asyncio.gather(*tasks):
+            results |= partial_results
+    except ValueError as err:
+        return bad_request_response(str(err))
+
+    return {query.name: results[query.name] for query in request.queries}
 
 
 @router.get("/bias_detection")
@@ -260,69 +641,71 @@ async def bias_detection(
     end_date: str,
     words: List[str] = Query(None),
     sources: Optional[List[int]] = Query(None),
+    model_id: int = 1,
     db: Session = Depends(db_client.get_session),
 ):
+    input_words = sorted({word.lower().strip() for word in words or [] if word.strip()})
+    if not input_words:
+        return bad_request_response("Missing 'words' parameter.")
+
+    # Input words are expanded to the vocabulary words starting with them (text_pattern_ops
+    # range scan on feed_words, sql/feed_words.sql), the feeds containing any of those are
+    # found by the GIN index on feeds.words, then every feed's words are unnested once.
     sql = text(
         """
-            WITH input_words AS (
-            SELECT unnest(:words) AS input_word
+        WITH input_words AS (
+            SELECT DISTINCT unnest(CAST(:words AS text[])) AS input_word
+        ),
+        expanded AS (
+            SELECT iw.input_word, fw.word
+            FROM input_words iw
+            JOIN feed_words fw
+                ON fw.word ~>=~ iw.input_word
+                AND fw.word ~<~ (iw.input_word || chr(1114111))
+                AND left(fw.word, length(iw.input_word)) = iw.input_word
         ),
-        matched_feeds AS (
+        matched AS (
             SELECT
-                f.id AS feed_id,
                 f.source_id,
-                f.feed_date,
-                s.name AS source_name,
-                f.words,
-                f.search_vector,
+                fw.input_word,
                 fs.sentiment_key,
                 fs.sentiment_value
             FROM feeds f
-            JOIN feed_sentiments fs ON fs.feed_id = f.id
-            JOIN sources s ON f.source_id = s.id
+            JOIN feed_sentiments fs ON fs.feed_id = f.id AND fs.model_id = :model_id
+            CROSS JOIN LATERAL (
+                SELECT DISTINCT e.input_word
+                FROM unnest(f.words) AS w
+                JOIN expanded e ON e.word = w
+            ) fw
             WHERE
-                f.published BETWEEN :start_date AND :end_date
-                AND f.search_vector @@ to_tsquery('hungarian', :tsquery)
-        ),
-        word_match AS (
-            SELECT
-                mf.source_name,
-                iw.input_word,
-                mf.sentiment_key,
-                mf.sentiment_value
-            FROM matched_feeds mf
-            JOIN input_words iw
-                ON EXISTS (
-                    SELECT 1
-                    FROM unnest(mf.words) w
-                    WHERE w ILIKE iw.input_word || '%'
-                )
+                f.words && (SELECT array_agg(word) FROM expanded)
+                AND f.published BETWEEN :start_date AND :end_date
+                AND (:source_ids IS NULL OR f.source_id = ANY(:source_ids))
         )
         SELECT
-            source_name,
-            input_word AS keyword,
+            s.name AS source_name,
+            m.input_word AS keyword,
             COUNT(*) AS mention_count,
             -- Net Sentiment Score (Bias Indicator)
-            (SUM(CASE WHEN sentiment_key = 'positive' THEN sentiment_value ELSE 0 END) -
-             SUM(CASE WHEN sentiment_key = 'negative' THEN sentiment_value ELSE 0 END))
+            (SUM(CASE WHEN m.sentiment_key = 'positive' THEN m.sentiment_value ELSE 0 END) -
+             SUM(CASE WHEN m.sentiment_key = 'negative' THEN m.sentiment_value ELSE 0 END))
             / NULLIF(COUNT(*), 0) AS net_sentiment_score,
-             ROUND(COALESCE(STDDEV(sentiment_value)::NUMERIC, 0), 2) AS sentiment_std_dev
-
-        FROM word_match
-        GROUP BY source_name, input_word
-        ORDER BY input_word, net_sentiment_score DESC;
+            ROUND(COALESCE(STDDEV(m.sentiment_value)::NUMERIC, 0), 2) AS sentiment_std_dev
+        FROM matched m
+        JOIN sources s ON s.id = m.source_id
+        GROUP BY s.name, m.input_word
+        ORDER BY m.input_word, net_sentiment_score DESC;
     """
     )
 
-    # Create to_tsquery-compatible string from words
-    tsquery_string = " | ".join(words)
     result = db.execute(
         sql,
         {
-            "words": words,
+            "words": input_words,
             "start_date": f"{start_date} 00:00:00",
             "end_date": f"{end_date} 23:59:59",
-            "tsquery": tsquery_string,
+            "source_ids": sources if sources else None,
+            "model_id": model_id,
         },
     )
 
@@ -330,28 +713,40 @@ async def bias_detection(
     return rows
 
 
-@router.get("/correlation_between_sources_avg_compound")
-async def correlation_between_sources_avg_compound(
+def correlation_engine(
+    db: Session,
     start_date: str,
     end_date: str,
-    words: List[str] = Query(None),
-    sources: List[str] = Query(None),
-    db: Session = Depends(db_client.get_session),
-):
+    words: List[str],
+    sources: Optional[List[int]] = None,
+    model_id: int = 1,
+    approximate: bool = False,
+) -> CorrelationEngine:
+    """
+    Scans the feeds matched by any of the words once and feeds them into a CorrelationEngine.
+    Every feed is attributed to the input words its search vector actually matches.
+    """
     sql = text(
         """
+        WITH input_words AS (
+            SELECT w AS word, to_tsquery('hungarian', w) AS query
+            FROM unnest(CAST(:words AS text[])) AS w
+        )
         SELECT
+            ARRAY(
+                SELECT iw.word FROM input_words iw WHERE f.search_vector @@ iw.query
+            ) AS matched_words,
             s.name AS sourcename,
             date_trunc('month', f.published)::date AS month,
-            AVG(fs.sentiment_compound) AS avg_compound
+            fs.sentiment_key,
+            fs.sentiment_value,
+            fs.sentiment_compound
         FROM feeds AS f
-        LEFT JOIN feed_sentiments AS fs ON f.id = fs.feed_id
+        JOIN feed_sentiments AS fs ON f.id = fs.feed_id AND fs.model_id = :model_id
         LEFT JOIN sources AS s ON f.source_id = s.id
         WHERE f.search_vector @@ to_tsquery('hungarian', :tsquery)
         AND f.published BETWEEN :start_date AND :end_date
-        AND (:source_ids IS NULL OR f.source_id = ANY(:source_ids))
-        GROUP BY s.name, month
-        ORDER BY s.name, month;
+        AND (:source_ids IS NULL OR f.source_id = ANY(:source_ids));
         """
     )
 
@@ -360,80 +755,89 @@ async def correlation_between_sources_avg_compound(
         {
             "start_date": f"{start_date} 00:00:00",
             "end_date": f"{end_date} 23:59:59",
-            "words_array": ",".join(words),
+            "words": words,
             "tsquery": " | ".join(words),
             "source_ids": sources if sources else None,
+            "model_id": model_id,
         },
     )
 
-    rows = result.mappings().fetchall()
-    return rows
+    return CorrelationEngine(approximate=approximate).consume(result)
 
 
-@router.get("/correlation_between_sources")
-async def correlation_between_sources(
+@router.get("/correlation")
+async def correlation(
     start_date: str,
     end_date: str,
     words: List[str] = Query(None),
+    sources: Optional[List[int]] = Query(None),
+    approximate: bool = False,
     db: Session = Depends(db_client.get_session),
 ):
-
-    sql = text(
-        """
-        SELECT
-            word,
-            s.name as sourcename,
-            min(fs.sentiment_compound) AS min_compound,
-            max(fs.sentiment_compound) AS max_compound,
-            AVG(fs.sentiment_compound) AS avg_compound,
-            -- Positive Sentiments
-            sum(CASE WHEN fs.sentiment_key = 'positive' THEN 1 ELSE 0 END) AS nm_of_positive,
-            MAX(CASE WHEN fs.sentiment_key = 'positive' THEN sentiment_value END) AS max_positive,
-            MIN(CASE WHEN fs.sentiment_key = 'positive' THEN sentiment_value END) AS min_positive,
-            AVG(CASE WHEN fs.sentiment_key = 'positive' THEN sentiment_value END) AS avg_positive,
-            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY CASE WHEN fs.sentiment_key = 'positive'
-                THEN sentiment_value END) AS median_positive,
-            -- Negative Sentiments
-            sum(CASE WHEN fs.sentiment_key = 'negative' THEN 1 ELSE 0 END) AS nm_of_negative,
-            MAX(CASE WHEN fs.sentiment_key = 'negative' THEN sentiment_value END) AS max_negative,
-            MIN(CASE WHEN fs.sentiment_key = 'negative' THEN sentiment_value END) AS min_negative,
-            AVG(CASE WHEN fs.sentiment_key = 'negative' THEN sentiment_value END) AS avg_negative,
-            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY CASE WHEN fs.sentiment_key = 'negative'
-                THEN sentiment_value END) AS median_negative,
-            -- Neutral Sentiments
-            sum(CASE WHEN fs.sentiment_key = 'neutral' THEN 1 ELSE 0 END) AS nm_of_neutral,
-            MAX(CASE WHEN fs.sentiment_key = 'neutral' THEN sentiment_value END) AS max_neutral,
-            MIN(CASE WHEN fs.sentiment_key = 'neutral' THEN sentiment_value END) AS min_neutral,
-            AVG(CASE WHEN fs.sentiment_key = 'neutral' THEN sentiment_value END) AS avg_neutral,
-            PERCENTILE_CONT(0.5) WITHIN GROUP (ORDER BY CASE WHEN fs.sentiment_key = 'neutral'
-                THEN sentiment_value END) AS median_neutral
-        FROM feeds AS f
-        LEFT JOIN feed_sentiments AS fs ON f.id = fs.feed_id
-        LEFT JOIN sources AS s ON f.source_id = s.id
-        LEFT JOIN LATERAL unnest(string_to_array(:words_array, ',')) AS word ON true
-        WHERE f.search_vector @@ to_tsquery('hungarian', :tsquery)
-        AND f.published BETWEEN :start_date AND :end_date
-        GROUP BY word, s.name
-        ORDER BY word, s.name;
-    """
+    """Per-source statistics and monthly compound averages from a single scan"""
+    if not words:
+        return bad_request_response("Missing 'words' parameter.")
+
+    # The scan and the aggregation in Python run in the threadpool, off the event loop
+    engine = await run_in_threadpool(
+        correlation_engine,
+        db,
+        start_date,
+        end_date,
+        words,
+        sources=sources,
+        approximate=approximate,
     )
+    return {
+        "by_source": await run_in_threadpool(engine.source_rows),
+        "by_month": await run_in_threadpool(engine.monthly_rows),
+    }
 
-    result = db.execute(
-        sql,
-        {
-            "start_date": f"{start_date} 00:00:00",
-            "end_date": f"{end_date} 23:59:59",
-            "words_array": ",".join(words),
-            "tsquery": " | ".join(words),
-        },
+
+@router.get("/correlation_between_sources_avg_compound")
+async def correlation_between_sources_avg_compound(
+    start_date: str,
+    end_date: str,
+    words: List[str] = Query(None),
+    sources: Optional[List[int]] = Query(None),
+    db: Session = Depends(db_client.get_session),
+):
+    if not words:
+        return bad_request_response("Missing 'words' parameter.")
+
+    engine = await run_in_threadpool(
+        correlation_engine, db, start_date, end_date, words, sources=sources
     )
+    return await run_in_threadpool(engine.monthly_rows)
 
-    rows = result.mappings().fetchall()
-    return rows
+
+@router.get("/correlation_between_sources")
+async def correlation_between_sources(
+    start_date: str,
+    end_date: str,
+    words: List[str] = Query(None),
+    sources: Optional[List[int]] = Query(None),
+    approximate: bool = False,
+    db: Session = Depends(db_client.get_session),
+):
+    if not words:
+        return bad_request_response("Missing 'words' parameter.")
+
+    engine = await run_in_threadpool(
+        correlation_engine,
+        db,
+        start_date,
+        end_date,
+        words,
+        sources=sources,
+        approximate=approximate,
+    )
+    return await run_in_threadpool(engine.source_rows)
 
 
 # analyzer_hun = SentimentAnalyzerFactory.get_analyzer("hun")
 executor = ThreadPoolExecutor(max_workers=4)
+track_executor("ondemand_feed_analyse", executor)
 
 
 @router.get("/word_co_occurences")
@@ -442,49 +846,41 @@ async def word_co_occurences(
     end_date: str,
     word: str,
     sources: Optional[List[int]] = Query(None),
+    top_n: int = Query(30, ge=1, le=500),
+    min_count: int = Query(2, ge=1),
+    model_id: int = 1,
     db: Session = Depends(db_client.get_session),
 ):
+    word = word.lower().strip() if word else word
     if not word:
         raise HTTPException(status_code=404, detail="Word parameter is required")
 
+    # words @> ARRAY[word], typed as the TEXT[] column, is answered by the GIN index on feeds.words
+    # (sql/indexes.sql), sentiments are read only for the target articles of one model
     sql = text(
         """
             WITH target_articles AS (
               SELECT f.id, f.words
               FROM feeds f
-              WHERE :word = ANY(
-                SELECT w FROM unnest(f.words) AS w
-              )
+              WHERE f.words @> CAST(:word_array AS TEXT[])
                 AND f.published BETWEEN :start_date AND :end_date
                 AND (:source_ids IS NULL OR f.source_id = ANY(:source_ids))
-            ),
-            co_words AS (
-              SELECT ta.id AS feed_id, w AS co_word
-              FROM target_articles ta,
-                   unnest(ta.words) AS w
-              WHERE w <> :word
-            ),
-            sentiments AS (
-              SELECT feed_id,
-                     COUNT(*) FILTER (WHERE sentiment_key = 'positive') AS pos_count,
-                     COUNT(*) FILTER (WHERE sentiment_key = 'negative') AS neg_count,
-                     COUNT(*) FILTER (WHERE sentiment_key = 'neutral') AS neu_count
-              FROM feed_sentiments
-              GROUP BY feed_id
             )
             SELECT
-              cw.co_word,
+              w AS co_word,
               COUNT(*) AS co_occurrence,
-              COALESCE(SUM(s.pos_count), 0) AS positive_count,
-              COALESCE(SUM(s.neg_count), 0) AS negative_count,
-              COALESCE(SUM(s.neu_count), 0) AS neutral_count
-            FROM co_words cw
-            LEFT JOIN sentiments s ON cw.feed_id = s.feed_id
-            GROUP BY cw.co_word
-            HAVING COUNT(*) > 1
+              COUNT(*) FILTER (WHERE fs.sentiment_key = 'positive') AS positive_count,
+              COUNT(*) FILTER (WHERE fs.sentiment_key = 'negative') AS negative_count,
+              COUNT(*) FILTER (WHERE fs.sentiment_key = 'neutral') AS neutral_count
+            FROM target_articles ta
+            CROSS JOIN LATERAL unnest(ta.words) AS w
+            LEFT JOIN feed_sentiments fs
+              ON fs.feed_id = ta.id AND fs.model_id = :model_id
+            WHERE w <> :word
+            GROUP BY w
+            HAVING COUNT(*) >= :min_count
             ORDER BY co_occurrence DESC
-            LIMIT 30;
-
+            LIMIT :top_n;
         """
     )
 
@@ -492,9 +888,75 @@ async def word_co_occurences(
         sql,
         {
             "word": word,
+            "word_array": [word],
             "start_date": f"{start_date} 00:00:00",
             "end_date": f"{end_date} 23:59:59",
             "source_ids": sources if sources else None,
+            "model_id": model_id,
+            "min_count": min_count,
+            "top_n": top_n,
+        },
+    )
+
+    rows = result.mappings().fetchall()
+    return rows
+
+
+@router.get("/word_neighbours")
+async def word_neighbours(
+    start_date: str,
+    end_date: str,
+    word: str,
+    top_k: int = Query(30, ge=1, le=500),
+    min_count: int = Query(2, ge=1),
+    db: Session = Depends(db_client.get_session),
+):
+    """
+    Top-k co-occurring words of a word, summed from the daily co-occurrence index
+    (sql/word_pair_daily.sql). Counts are articles containing both words. The index stores
+    unordered pairs, the word is looked up on both sides. Stop-words and the most frequent
+    words (word_pair_excluded_words) have no neighbours.
+    """
+    word = word.lower().strip() if word else word
+    if not word:
+        raise HTTPException(status_code=404, detail="Word parameter is required")
+
+    sql = text(
+        """
+            SELECT
+              co_word,
+              SUM(pair_count) AS co_occurrence,
+              SUM(positive_count) AS positive_count,
+              SUM(negative_count) AS negative_count,
+              SUM(neutral_count) AS neutral_count
+            FROM (
+              SELECT word_b AS co_word, pair_count, positive_count, negative_count,
+                     neutral_count
+              FROM word_pair_daily
+              WHERE word_a = :word
+                AND feed_date BETWEEN :start_date AND :end_date
+              UNION ALL
+              SELECT word_a AS co_word, pair_count, positive_count, negative_count,
+                     neutral_count
+              FROM word_pair_daily
+              WHERE word_b = :word
+                AND feed_date BETWEEN :start_date AND :end_date
+            ) AS pairs
+            GROUP BY co_word
+            HAVING SUM(pair_count) >= :min_count
+            ORDER BY co_occurrence DESC
+            LIMIT :top_k;
+        """
+    )
+
+    result = db.execute(
+        sql,
+        {
+            "word": word,
+            "start_date": start_date,
+            "end_date": end_date,
+            "min_count": min_count,
+            "top_k": top_k,
         },
     )
 
@@ -508,7 +970,7 @@ async def ondemand_feed_analyse(start_date: str, word: str, lang: str = "hu"):
         raise HTTPException(status_code=404, detail="Word parameter is required")
 
     url = (
-        f"https://newsapi.org/v2/everything?q={word}"
+        f"{config.NEWS_API_URL}/everything?q={word}"
         f"&from={start_date}&sortBy=publishedAt"
         f"&apiKey={config.NEWS_API_KEY}&searchIn=title"
         f"&language={lang}"
@@ -533,7 +995,7 @@ async def ondemand_feed_analyse(start_date: str, word: str, lang: str = "hu"):
     return results
 
 
-@router.get('/sources')
+@router.get("/sources")
 async def get_sources(db: Session = Depends(db_client.get_session)):
     result = db.execute(
         text("SELECT * FROM sources;"),
@@ -544,11 +1006,19 @@ async def get_sources(db: Session = Depends(db_client.get_session)):
     return rows
 
 
-
 def analyze_with_details_sync(feeds: list, lang: str) -> List[dict]:
     """
     Synchronously analyzes sentiment for a list of feeds and returns results with metadata.
     """
+    # The analyzers pull in torch and transformers, imported on the first analysis
+    from palzlib.sentiment_analyzers.factory.sentiment_factory import (
+        SentimentAnalyzerFactory,
+    )
+    from palzlib.sentiment_analyzers.models.sentiments import (
+        LABEL_MAPPING_ROBERTA,
+        Sentiments,
+    )
+
     analyzer = SentimentAnalyzerFactory.get_analyzer(lang)
     titles = [feed["title"] for feed in feeds]
     predictions = analyzer.pipeline(titles)
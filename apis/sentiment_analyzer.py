@@ -4,10 +4,6 @@ from uuid import uuid4
 
 # import httpx
 from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from gnews import GNews
-from palzlib.sentiment_analyzers.factory.sentiment_factory import (
-    SentimentAnalyzerFactory,
-)
 from pydantic import BaseModel
 from starlette.responses import JSONResponse
 
@@ -21,6 +17,15 @@ router = APIRouter(
 )
 
 
+def get_analyzer(lang: str):
+    """The analyzers pull in torch and transformers, imported on the first analysis"""
+    from palzlib.sentiment_analyzers.factory.sentiment_factory import (
+        SentimentAnalyzerFactory,
+    )
+
+    return SentimentAnalyzerFactory.get_analyzer(lang)
+
+
 class InputData(BaseModel):
     """Schema for input data used in sentiment analysis.
 
@@ -39,6 +44,8 @@ JOB_RESULTS: Dict[str, Dict] = {}
 def get_google_news(
     q: str, period: str = "7d", lang: str = "hu", country: str = "hu"
 ) -> List[dict]:
+    from gnews import GNews
+
     google_news = GNews(
         language=lang,
         country=country,
@@ -124,7 +131,7 @@ def background_chunked_analysis(job_id: str, lang: str = "hun"):
         lang (str): Language code for the analyzer.
     """
 
-    analyzer = SentimentAnalyzerFactory.get_analyzer(lang)
+    analyzer = get_analyzer(lang)
     feeds = JOB_RESULTS[job_id]["feeds"]
     chunk_size = 50
 
@@ -181,7 +188,7 @@ def get_result_page(job_id: str, page: int = 0, page_size: int = 50):
 
 @router.post("/analyze_text", status_code=HTTPStatus.OK)
 async def analyze_text(item: InputData):
-    analyzer = SentimentAnalyzerFactory.get_analyzer(item.lang)
+    analyzer = get_analyzer(item.lang)
     result = analyzer.analyze_text(item.text)
 
     return JSONResponse(status_code=200, content=result.asdict())
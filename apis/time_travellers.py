@@ -2,29 +2,51 @@ from http import HTTPStatus
 
 # https://bl.ocks.org/vasturiano/ded69192b8269a78d2d97e24211e64e0
 from fastapi import APIRouter, Depends
-from palzlib.database.db_client import DBClient
-from palzlib.database.db_mapper import DBMapper
 from sqlalchemy import or_
 from sqlalchemy.orm import Session, aliased
 from starlette.responses import JSONResponse
 
-from config import time_travelers_db_config
+from config import time_travelers_db_config, time_travelers_db_pool_config
 from libs.api_factory import APIFactory
 from libs.auth.bearer_token import BearerAuth
+from libs.db_client import PooledDBClient
 from libs.responses import responses
+from libs.schema_snapshot import SchemaSnapshotMapper
 
-db_client = DBClient(db_config=time_travelers_db_config)
-db_mapping = DBMapper(db_client=db_client)
-Persons = db_mapping.get_model("persons")
-Trips = db_mapping.get_model("trips")
-TripPersons = db_mapping.get_model("trip_persons")
-Dates = db_mapping.get_model("dates")
-Movies = db_mapping.get_model("movies")
-Devices = db_mapping.get_model("devices")
+db_client = PooledDBClient(
+    db_config=time_travelers_db_config,
+    pool_config=time_travelers_db_pool_config,
+    name="time_travellers",
+)
+db_mapping = SchemaSnapshotMapper(db_client, "time_travellers")
+
+# Reflected on application startup by load_models()
+Persons = None
+Trips = None
+TripPersons = None
+Dates = None
+Movies = None
+Devices = None
+DepartureDates = None
+ArrivalDates = None
+
+
+def load_models() -> None:
+    """Reflects the tables of the endpoints, called from the application lifespan"""
+    global Persons, Trips, TripPersons, Dates, Movies, Devices
+    global DepartureDates, ArrivalDates
+
+    Persons = db_mapping.get_model("persons")
+    Trips = db_mapping.get_model("trips")
+    TripPersons = db_mapping.get_model("trip_persons")
+    Dates = db_mapping.get_model("dates")
+    Movies = db_mapping.get_model("movies")
+    Devices = db_mapping.get_model("devices")
+
+    # Aliases for the Dates
+    DepartureDates = aliased(Dates)
+    ArrivalDates = aliased(Dates)
 
-# Aliases for the Dates
-DepartureDates = aliased(Dates)
-ArrivalDates = aliased(Dates)
 
 router = APIRouter(
     prefix="/time_travellers",
@@ -33,7 +55,7 @@ router = APIRouter(
 )
 
 
-def get_trips_query(where: tuple = None, with_persons: bool = False) -> dict:
+def get_trips_query(where: tuple = None, with_persons: bool = False) -> list:
     result = []
 
     select = (
@@ -0,0 +1,345 @@
+"""
+Seeded synthetic data of the power_of_words and time_travellers databases for the load
+benchmarks (benchmarks/load.py)
+
+Rows are generated inside Postgres (generate_series, setseed), so millions of feeds do not
+travel through Python. The databases of config.py (DB_HOST, DB_PORT, DB_USER, ...) are
+created if missing and their tables are recreated. The rollups and indexes of sql/ are
+installed and loaded as in production. Run from the project root:
+
+    python -m benchmarks.fixtures [--feeds 1000000] [--skip-word-pairs]
+"""
+
+import argparse
+import json
+import os
+import time
+from datetime import date, timedelta
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine import URL, Engine
+
+import config
+
+# The data ends on a fixed day, so the scenarios of benchmarks/load.py hit the same rows
+END_DATE = date(2025, 6, 30)
+DAYS = 730
+START_DATE = END_DATE - timedelta(days=DAYS - 1)
+BATCH_SIZE = 250_000
+VOCABULARY_SIZE = 5000
+MODELS = (1, 2)
+EXCLUDED_PAIR_WORDS = 50
+
+POW_SCHEMA = """
+DROP TABLE IF EXISTS feed_sentiments, feeds, sources, feed_words, feed_sentiment_daily,
+    word_pair_daily, word_pair_excluded_words CASCADE;
+
+CREATE TABLE sources (
+    id      INTEGER PRIMARY KEY,
+    name    VARCHAR NOT NULL,
+    url     VARCHAR
+);
+
+CREATE TABLE feeds (
+    id              BIGINT PRIMARY KEY,
+    title           TEXT NOT NULL,
+    published       TIMESTAMP NOT NULL,
+    feed_date       DATE NOT NULL,
+    source_id       INTEGER NOT NULL REFERENCES sources (id),
+    words           TEXT[] NOT NULL,
+    search_vector   TSVECTOR
+);
+
+CREATE TABLE feed_sentiments (
+    id                  BIGSERIAL PRIMARY KEY,
+    feed_id             BIGINT NOT NULL REFERENCES feeds (id),
+    model_id            INTEGER NOT NULL,
+    sentiment_key       VARCHAR NOT NULL,
+    sentiment_value     DOUBLE PRECISION,
+    sentiment_compound  DOUBLE PRECISION
+);
+"""
+
+# Word i is drawn with a skewed (power law like) frequency, a few words are in most feeds
+POW_FEEDS = """
+INSERT INTO feeds (id, title, published, feed_date, source_id, words, search_vector)
+SELECT id, array_to_string(words, ' '), published, published::date, source_id, words,
+       to_tsvector('hungarian', array_to_string(words, ' '))
+FROM (
+    SELECT id,
+           CAST(:end_date AS timestamp) + interval '1 day'
+               - random() * (:days * interval '1 day') AS published,
+           1 + floor(random() * :sources)::int AS source_id,
+           ARRAY(
+               SELECT 'szo' || floor(:vocabulary * power(random(), 3))::int
+               FROM generate_series(1, 5 + (id % 8))
+           ) AS words
+    FROM generate_series(CAST(:first_id AS bigint), :last_id) AS id
+) AS generated
+"""
+
+POW_FEED_SENTIMENTS = """
+INSERT INTO feed_sentiments (
+    feed_id, model_id, sentiment_key, sentiment_value, sentiment_compound
+)
+SELECT f.id, m.model_id,
+       (ARRAY['negative', 'neutral', 'positive'])[1 + floor(random() * 3)::int],
+       0.34 + random() * 0.66,
+       random() * 2 - 1
+FROM feeds f
+CROSS JOIN unnest(CAST(:models AS int[])) AS m (model_id)
+WHERE f.id BETWEEN :first_id AND :last_id
+"""
+
+POW_INDEXES = """
+CREATE INDEX feeds_published_idx ON feeds (published);
+CREATE INDEX feeds_feed_date_idx ON feeds (feed_date);
+CREATE INDEX feeds_search_vector_idx ON feeds USING GIN (search_vector);
+"""
+
+TIME_TRAVELLERS_SCHEMA = """
+DROP TABLE IF EXISTS trip_persons, trips, persons, dates, movies, devices CASCADE;
+
+CREATE TABLE persons (
+    id                  INTEGER PRIMARY KEY,
+    actor_name          VARCHAR,
+    role_name           VARCHAR,
+    short_role_name     VARCHAR
+);
+
+CREATE TABLE dates (
+    id      INTEGER PRIMARY KEY,
+    date    DATE,
+    time    TIME
+);
+
+CREATE TABLE movies (
+    id              INTEGER PRIMARY KEY,
+    title           VARCHAR,
+    original_title  VARCHAR,
+    released        INTEGER,
+    imdb_url        VARCHAR,
+    plot            TEXT
+);
+
+CREATE TABLE devices (
+    id          INTEGER PRIMARY KEY,
+    name        VARCHAR,
+    description TEXT,
+    more_info   VARCHAR
+);
+
+CREATE TABLE trips (
+    id                  INTEGER PRIMARY KEY,
+    departure_date_id   INTEGER REFERENCES dates (id),
+    arrival_date_id     INTEGER REFERENCES dates (id),
+    movie_id            INTEGER REFERENCES movies (id),
+    device_id           INTEGER REFERENCES devices (id),
+    memo                TEXT
+);
+
+CREATE TABLE trip_persons (
+    id          SERIAL PRIMARY KEY,
+    trip_id     INTEGER NOT NULL REFERENCES trips (id),
+    person_id   INTEGER NOT NULL REFERENCES persons (id),
+    trip_order  INTEGER NOT NULL
+);
+"""
+
+TIME_TRAVELLERS_DATA = """
+SELECT setseed(:seed);
+
+INSERT INTO movies (id, title, original_title, released, imdb_url, plot)
+SELECT i, 'Movie ' || i, 'Original movie ' || i, 1960 + i % 60,
+       'https://www.imdb.com/title/tt' || lpad(i::text, 7, '0'), 'Plot of movie ' || i
+FROM generate_series(1, 40) AS i;
+
+INSERT INTO devices (id, name, description, more_info)
+SELECT i, 'Device ' || i, 'Time machine ' || i, 'https://devices.example/' || i
+FROM generate_series(1, 15) AS i;
+
+INSERT INTO persons (id, actor_name, role_name, short_role_name)
+SELECT i, 'Actor ' || i, 'Time traveller ' || i, 'Traveller ' || i
+FROM generate_series(1, 120) AS i;
+
+INSERT INTO dates (id, date, time)
+SELECT i, DATE '1800-01-01' + floor(random() * 120000)::int,
+       CAST(floor(random() * 1440) * interval '1 minute' AS time)
+FROM generate_series(1, 400) AS i;
+
+INSERT INTO trips (id, departure_date_id, arrival_date_id, movie_id, device_id, memo)
+SELECT i, 1 + floor(random() * 400)::int, 1 + floor(random() * 400)::int,
+       1 + floor(random() * 40)::int, 1 + floor(random() * 15)::int, 'Trip ' || i
+FROM generate_series(1, 600) AS i;
+
+INSERT INTO trip_persons (trip_id, person_id, trip_order)
+SELECT trip_id, person_id, row_number() OVER (PARTITION BY person_id ORDER BY trip_id)
+FROM (
+    SELECT DISTINCT t.id AS trip_id, 1 + floor(random() * 120)::int AS person_id
+    FROM trips t CROSS JOIN generate_series(1, 3)
+) AS travellers;
+"""
+
+
+def get_engine(db_name: str, **kwargs) -> Engine:
+    db_config = config.get_db_config(db_name)
+    return create_engine(
+        URL.create(
+            drivername=db_config.dialect,
+            username=db_config.username,
+            password=db_config.password,
+            host=db_config.host,
+            port=db_config.port,
+            database=db_config.dbname,
+        ),
+        **kwargs,
+    )
+
+
+def create_database(db_name: str) -> None:
+    engine = get_engine(config.psql_config.dbname, isolation_level="AUTOCOMMIT")
+    with engine.connect() as connection:
+        exists = connection.execute(
+            text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": db_name}
+        ).scalar()
+        if not exists:
+            connection.exec_driver_sql(f'CREATE DATABASE "{db_name}"')
+    engine.dispose()
+
+
+def run_sql_file(engine: Engine, name: str) -> None:
+    """A file of sql/, several statements (functions, triggers) in one call"""
+    with open(os.path.join(config.ROOT_DIR, "sql", name)) as sql_file:
+        statements = sql_file.read()
+    with engine.begin() as connection:
+        connection.exec_driver_sql(statements)
+
+
+def seed_power_of_words(
+    feeds: int, sources: int, seed: float, word_pairs: bool = True
+) -> dict:
+    db_name = config.pow_db_config.dbname
+    create_database(db_name)
+    engine = get_engine(db_name)
+    timings = {}
+
+    started = time.perf_counter()
+    with engine.begin() as connection:
+        connection.exec_driver_sql(POW_SCHEMA)
+        connection.execute(text("SELECT setseed(:seed)"), {"seed": seed})
+        connection.execute(
+            text(
+                "INSERT INTO sources (id, name, url) "
+                "SELECT i, 'Source ' || i, 'https://source' || i || '.example' "
+                "FROM generate_series(1, :sources) AS i"
+            ),
+            {"sources": sources},
+        )
+        # Same session, so setseed applies to every batch
+        for first_id in range(1, feeds + 1, BATCH_SIZE):
+            batch = {
+                "first_id": first_id,
+                "last_id": min(first_id + BATCH_SIZE - 1, feeds),
+            }
+            connection.execute(
+                text(POW_FEEDS),
+                {
+                    **batch,
+                    "end_date": END_DATE,
+                    "days": DAYS,
+                    "sources": sources,
+                    "vocabulary": VOCABULARY_SIZE,
+                },
+            )
+            connection.execute(
+                text(POW_FEED_SENTIMENTS), {**batch, "models": list(MODELS)}
+            )
+        connection.exec_driver_sql(POW_INDEXES)
+    timings["rows_seconds"] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for name in ("feed_words.sql", "feed_sentiment_daily.sql", "word_pair_daily.sql"):
+        run_sql_file(engine, name)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO feed_words (word) SELECT DISTINCT unnest(words) FROM feeds "
+            "ON CONFLICT DO NOTHING"
+        )
+        connection.execute(
+            text("SELECT refresh_feed_sentiment_daily(:start_date, :end_date)"),
+            {"start_date": START_DATE, "end_date": END_DATE},
+        )
+        if word_pairs:
+            # The most frequent words, as recommended by sql/word_pair_daily.sql
+            connection.execute(
+                text(
+                    "INSERT INTO word_pair_excluded_words (word) "
+                    "SELECT w FROM feeds, unnest(words) AS w "
+                    "GROUP BY w ORDER BY COUNT(*) DESC LIMIT :excluded"
+                ),
+                {"excluded": EXCLUDED_PAIR_WORDS},
+            )
+            connection.exec_driver_sql("ANALYZE word_pair_excluded_words")
+            connection.execute(
+                text("SELECT refresh_word_pair_daily(:start_date, :end_date)"),
+                {"start_date": START_DATE, "end_date": END_DATE},
+            )
+    timings["rollups_seconds"] = time.perf_counter() - started
+
+    # CREATE INDEX CONCURRENTLY cannot run in a transaction, one statement at a time
+    started = time.perf_counter()
+    with get_engine(db_name, isolation_level="AUTOCOMMIT").connect() as connection:
+        with open(os.path.join(config.ROOT_DIR, "sql", "indexes.sql")) as sql_file:
+            for statement in sql_file.read().split(";"):
+                lines = [
+                    line for line in statement.splitlines() if not line.startswith("--")
+                ]
+                if "".join(lines).strip():
+                    connection.exec_driver_sql("\n".join(lines))
+        connection.exec_driver_sql("VACUUM ANALYZE")
+    timings["indexes_seconds"] = time.perf_counter() - started
+
+    engine.dispose()
+    return {
+        "feeds": feeds,
+        "sources": sources,
+        **{k: round(v, 1) for k, v in timings.items()},
+    }
+
+
+def seed_time_travellers(seed: float) -> dict:
+    db_name = config.time_travelers_db_config.dbname
+    create_database(db_name)
+    engine = get_engine(db_name)
+    with engine.begin() as connection:
+        connection.exec_driver_sql(TIME_TRAVELLERS_SCHEMA)
+        connection.execute(text(TIME_TRAVELLERS_DATA), {"seed": seed})
+    engine.dispose()
+    return {"persons": 120, "trips": 600}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--feeds", type=int, default=1_000_000)
+    parser.add_argument("--sources", type=int, default=25)
+    parser.add_argument(
+        "--seed", type=float, default=0.42, help="setseed() value, -1..1"
+    )
+    parser.add_argument(
+        "--skip-word-pairs",
+        action="store_true",
+        help="Leave word_pair_daily empty, its initial load is the slowest step",
+    )
+    args = parser.parse_args()
+
+    print(
+        json.dumps(
+            {
+                "power_of_words": seed_power_of_words(
+                    args.feeds, args.sources, args.seed, not args.skip_word_pairs
+                ),
+                "time_travellers": seed_time_travellers(args.seed),
+            },
+            indent=2,
+        )
+    )
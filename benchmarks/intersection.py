@@ -0,0 +1,83 @@
+"""
+Intersection of the movie id lists of several people: sets of every list (before) vs.
+libs/intersection.py (after), and the k-of-n counts with collections.Counter vs. NumPy
+
+The lists are random ids drawn from a shared pool, with a few movies common to everyone.
+Run from the project root:
+
+    python -m benchmarks.intersection [--people 10] [--credits 5000] [--repeat 200]
+"""
+
+import argparse
+import json
+import random
+import time
+from collections import Counter
+
+from libs import intersection
+
+
+def set_intersection(items: list) -> set:
+    """common_movies as it was before, for comparison"""
+    items_set = [set(item) for item in items]
+    return items_set[0].intersection(*items_set)
+
+
+def build_lists(people: int, credits: int, seed: int = 1) -> list:
+    rng = random.Random(seed)
+    pool = range(1, credits * people * 4)
+    shared = rng.sample(pool, 10)
+    return [rng.sample(pool, credits - len(shared)) + shared for _ in range(people)]
+
+
+def measure(function, repeat: int) -> float:
+    """:return: Average milliseconds per call"""
+    function()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+def counter_count_shared(items: list, min_count: int) -> list:
+    """count_shared without NumPy, for comparison"""
+    counter = Counter(id for item in items for id in set(item))
+    return [(id, count) for id, count in counter.items() if count >= min_count]
+
+
+def run(people: int, credits: int, repeat: int) -> dict:
+    lists = build_lists(people, credits)
+    disjoint = lists + [[0]]
+    expected = sorted(set_intersection(lists))
+    assert intersection.intersect(lists) == expected
+    assert sorted(intersection.count_shared(lists, 2)) == sorted(
+        counter_count_shared(lists, 2)
+    )
+
+    scenarios = {
+        "set_intersection_before": lambda: set_intersection(lists),
+        "intersect_after": lambda: intersection.intersect(lists),
+        "set_intersection_before_disjoint": lambda: set_intersection(disjoint),
+        "intersect_after_disjoint": lambda: intersection.intersect(disjoint),
+        "counter_2_of_n": lambda: counter_count_shared(lists, 2),
+        "count_shared_2_of_n": lambda: intersection.count_shared(lists, 2),
+        "count_shared_n_of_n": lambda: intersection.count_shared(lists, people),
+    }
+    return {
+        "people": people,
+        "credits": credits,
+        "common": len(expected),
+        "ms_per_call": {
+            name: round(measure(function, repeat), 3)
+            for name, function in scenarios.items()
+        },
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--people", type=int, default=10)
+    parser.add_argument("--credits", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.people, args.credits, args.repeat), indent=2))
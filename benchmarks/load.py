@@ -0,0 +1,662 @@
+"""
+Load scenarios of every router against a local, offline stack: latency percentiles,
+throughput and peak memory of the API per endpoint, compared with a baseline run
+
+Starts benchmarks/mock_servers.py (the upstreams) and benchmarks/server.py (the API, with the
+stub sentiment analyzer) as subprocesses. The power_of_words and time_travellers databases are
+the ones of config.py (DB_HOST, DB_PORT, ...), seeded by benchmarks/fixtures.py first. Any
+other setting (e.g. POW_SENTIMENT_ROLLUP, EARTHQUAKE_STORE) is passed to the API through the
+environment. most_common_words (and the dashboard) need the NLTK stopwords of
+download_language_models.sh. Run from the project root:
+
+    python -m benchmarks.fixtures
+    python -m benchmarks.load [--routers earthquakes,movie_connections] [--requests 200]
+        [--concurrency 10] [--output after.json] [--baseline before.json] [--threshold 0.1]
+
+With --baseline, the scenarios whose p95 latency or throughput got worse by more than the
+threshold (or which got errors) are listed under "regressions", and the exit code is 1.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+import jwt
+
+import config
+from benchmarks.fixtures import END_DATE, START_DATE
+from benchmarks.server import configure
+
+# Date ranges of the power_of_words scenarios, inside the seeded data
+DAYS_PER_RANGE = (7, 30, 90)
+# Words of the fixtures, frequent to rare
+WORDS = ("szo0", "szo3", "szo17", "szo42", "szo250", "szo1200")
+# Words of the co-occurrence index, the most frequent ones are excluded from it
+NEIGHBOUR_WORDS = ("szo120", "szo250", "szo600", "szo1200")
+TOKEN_CLAIMS = {"email": "benchmark@localhost", "iss": "benchmarks.load"}
+
+
+@dataclass
+class Scenario:
+    """
+    :param build: Arguments of httpx.AsyncClient.request of a request, from a seeded random
+        generator and the context (path parameters)
+    :param context: Path parameters, callables are drawn per request (ids of the seeded data)
+    :param setup: Requests run once before the measured ones (e.g. starting a job), their
+        result is added to the context
+    """
+
+    router: str
+    name: str
+    build: Callable[[random.Random, dict], dict]
+    context: dict = field(default_factory=dict)
+    setup: Optional[Callable[[httpx.AsyncClient], Awaitable[dict]]] = None
+    statuses: Tuple[int, ...] = (200,)
+
+
+def date_range(rng: random.Random) -> Tuple[str, str]:
+    days = rng.choice(DAYS_PER_RANGE)
+    start = START_DATE + timedelta(
+        days=rng.randrange((END_DATE - START_DATE).days - days)
+    )
+    return start.isoformat(), (start + timedelta(days=days - 1)).isoformat()
+
+
+def draw(rng: random.Random, values: dict) -> dict:
+    """Callable values are drawn per request"""
+    return {
+        key: value(rng) if callable(value) else value for key, value in values.items()
+    }
+
+
+def get(path: str, params: Callable[[random.Random], dict] = None) -> Callable:
+    return lambda rng, context: {
+        "method": "GET",
+        "url": path.format(**draw(rng, context)),
+        "params": params(rng) if params else None,
+    }
+
+
+def dated(**params) -> Callable[[random.Random], dict]:
+    """Query parameters with a random date range"""
+
+    def build(rng: random.Random) -> dict:
+        start_date, end_date = date_range(rng)
+        return {"start_date": start_date, "end_date": end_date, **draw(rng, params)}
+
+    return build
+
+
+def words(count: int) -> Callable[[random.Random], List[str]]:
+    return lambda rng: rng.sample(WORDS, count)
+
+
+def person_id(rng: random.Random) -> int:
+    # A small pool, so some of the persons are cached by the API, as in real use
+    return rng.randrange(1, 2000)
+
+
+def earthquake_params(days: int, **params) -> Callable[[random.Random], dict]:
+    """USGS ranges relative to today, the mock generates the events of the last year"""
+
+    def build(rng: random.Random) -> dict:
+        end = datetime.now(timezone.utc).date() - timedelta(days=rng.randrange(30))
+        return {
+            "start_date": (end - timedelta(days=days)).isoformat(),
+            "end_date": end.isoformat(),
+            "min_magnitude": rng.choice((2.5, 3.5, 4.5)),
+            "max_magnitude": 10,
+            **params,
+        }
+
+    return build
+
+
+def dashboard(rng: random.Random, context: dict) -> dict:
+    start_date, end_date = date_range(rng)
+    return {
+        "method": "POST",
+        "url": "/power_of_words/dashboard",
+        "json": {
+            "start_date": start_date,
+            "end_date": end_date,
+            "words": words(1)(rng),
+            "queries": [
+                {"type": "count_sentiments"},
+                {"type": "sentiment_grouped", "params": {"granularity": "week"}},
+                {"type": "most_common_words"},
+                {"type": "top_feeds"},
+                {"type": "extreme_sentiments"},
+            ],
+        },
+    }
+
+
+def common_movies(rng: random.Random, context: dict) -> dict:
+    pool = range(1, 20000)
+    shared = rng.sample(pool, 20)
+    return {
+        "method": "PUT",
+        "url": "/movie_connections/common_movies",
+        "json": [rng.sample(pool, 2000) + shared for _ in range(rng.randint(2, 10))],
+    }
+
+
+def analyze_text(rng: random.Random, context: dict) -> dict:
+    return {
+        "method": "POST",
+        "url": "/sentiment_analyzer/analyze_text",
+        "json": {"lang": "hun", "text": " ".join(rng.sample(WORDS, 3))},
+    }
+
+
+async def start_job(client: httpx.AsyncClient) -> dict:
+    response = await client.get(
+        "/sentiment_analyzer/start_analysis",
+        params={"start_date": date.today().isoformat(), "word": "benchmark"},
+    )
+    response.raise_for_status()
+    return {"job_id": response.json()["job_id"]}
+
+
+SCENARIOS = [
+    Scenario("earthquakes", "geojson_30d", get("/earthquakes", earthquake_params(30))),
+    Scenario(
+        "earthquakes",
+        "columnar_180d",
+        get(
+            "/earthquakes",
+            earthquake_params(180, format="columnar", properties="mag,time,place"),
+        ),
+    ),
+    Scenario(
+        "earthquakes",
+        "clustered_365d",
+        get("/earthquakes", earthquake_params(365, cluster_zoom=4, max_points=500)),
+    ),
+    Scenario("time_travellers", "persons", get("/time_travellers/persons")),
+    Scenario(
+        "time_travellers",
+        "persons_search",
+        get(
+            "/time_travellers/persons/search",
+            lambda rng: {"name": f"Actor {rng.randrange(120)}"},
+        ),
+    ),
+    Scenario("time_travellers", "persons_list", get("/time_travellers/persons/list")),
+    Scenario(
+        "time_travellers",
+        "person",
+        get("/time_travellers/persons/{id}"),
+        context={"id": lambda rng: rng.randint(1, 120)},
+    ),
+    # Ids without trips are answered with 404
+    Scenario(
+        "time_travellers",
+        "person_trips",
+        get("/time_travellers/persons/{id}/trips"),
+        context={"id": lambda rng: rng.randint(1, 120)},
+        statuses=(200, 404),
+    ),
+    Scenario("time_travellers", "dates", get("/time_travellers/dates")),
+    Scenario(
+        "time_travellers",
+        "date",
+        get("/time_travellers/dates/{id}"),
+        context={"id": lambda rng: rng.randint(1, 400)},
+    ),
+    Scenario(
+        "time_travellers",
+        "date_trips",
+        get("/time_travellers/dates/{id}/trips"),
+        context={"id": lambda rng: rng.randint(1, 400)},
+        statuses=(200, 404),
+    ),
+    Scenario("time_travellers", "trips", get("/time_travellers/trips")),
+    Scenario(
+        "time_travellers",
+        "trip",
+        get("/time_travellers/trips/{id}"),
+        context={"id": lambda rng: rng.randint(1, 600)},
+    ),
+    Scenario(
+        "movie_connections",
+        "persons_search",
+        get(
+            "/movie_connections/persons/search",
+            lambda rng: {"name": f"actor{rng.randrange(500)}"},
+        ),
+    ),
+    Scenario(
+        "movie_connections",
+        "person_movies",
+        get("/movie_connections/person/{id}/movies"),
+        context={"id": person_id},
+    ),
+    Scenario("movie_connections", "common_movies", common_movies),
+    Scenario(
+        "movie_connections",
+        "persons_common_movies",
+        get(
+            "/movie_connections/persons/common_movies",
+            lambda rng: {
+                "person_ids": [person_id(rng) for _ in range(rng.randint(2, 5))]
+            },
+        ),
+    ),
+    Scenario(
+        "movie_connections",
+        "persons_connection",
+        get(
+            "/movie_connections/persons/connection",
+            lambda rng: {"source_id": person_id(rng), "target_id": person_id(rng)},
+        ),
+        statuses=(200, 404),
+    ),
+    Scenario(
+        "movie_connections",
+        "persons_credits",
+        get(
+            "/movie_connections/persons/credits",
+            lambda rng: {
+                "person_ids": ",".join(
+                    str(person_id(rng)) for _ in range(rng.randint(2, 8))
+                ),
+                "min_count": 2,
+            },
+        ),
+    ),
+    Scenario(
+        "power_of_words",
+        "feeds",
+        get("/power_of_words/feeds", dated(words=words(1), items_per_page=30)),
+    ),
+    Scenario(
+        "power_of_words",
+        "feeds_free_text",
+        get("/power_of_words/feeds", dated(free_text=lambda rng: rng.choice(WORDS))),
+    ),
+    Scenario(
+        "power_of_words",
+        "get_sentiment_grouped",
+        get(
+            "/power_of_words/get_sentiment_grouped",
+            dated(words=words(2), granularity="week"),
+        ),
+    ),
+    Scenario(
+        "power_of_words",
+        "most_common_words",
+        get("/power_of_words/most_common_words", dated()),
+    ),
+    Scenario(
+        "power_of_words",
+        "count_sentiments",
+        get("/power_of_words/count_sentiments", dated()),
+    ),
+    Scenario(
+        "power_of_words",
+        "extreme_sentiments",
+        get("/power_of_words/extreme_sentiments", dated(sources="1,2,3")),
+    ),
+    Scenario("power_of_words", "top_feeds", get("/power_of_words/top_feeds", dated())),
+    Scenario("power_of_words", "dashboard", dashboard),
+    Scenario(
+        "power_of_words",
+        "bias_detection",
+        get("/power_of_words/bias_detection", dated(words=words(2))),
+    ),
+    Scenario(
+        "power_of_words",
+        "correlation",
+        get("/power_of_words/correlation", dated(words=words(2))),
+    ),
+    Scenario(
+        "power_of_words",
+        "correlation_between_sources_avg_compound",
+        get(
+            "/power_of_words/correlation_between_sources_avg_compound",
+            dated(words=words(2)),
+        ),
+    ),
+    Scenario(
+        "power_of_words",
+        "correlation_between_sources",
+        get("/power_of_words/correlation_between_sources", dated(words=words(2))),
+    ),
+    Scenario(
+        "power_of_words",
+        "word_co_occurences",
+        get(
+            "/power_of_words/word_co_occurences",
+            dated(word=lambda rng: rng.choice(WORDS)),
+        ),
+    ),
+    Scenario(
+        "power_of_words",
+        "word_neighbours",
+        get(
+            "/power_of_words/word_neighbours",
+            dated(word=lambda rng: rng.choice(NEIGHBOUR_WORDS)),
+        ),
+    ),
+    Scenario(
+        "power_of_words",
+        "ondemand_feed_analyse",
+        get(
+            "/power_of_words/ondemand_feed_analyse",
+            lambda rng: {
+                "start_date": date.today().isoformat(),
+                "word": rng.choice(WORDS),
+            },
+        ),
+    ),
+    Scenario("power_of_words", "sources", get("/power_of_words/sources")),
+    Scenario(
+        "sentiment_analyzer",
+        "start_analysis",
+        get(
+            "/sentiment_analyzer/start_analysis",
+            lambda rng: {
+                "start_date": date.today().isoformat(),
+                "word": rng.choice(WORDS),
+            },
+        ),
+    ),
+    Scenario(
+        "sentiment_analyzer",
+        "results",
+        get(
+            "/sentiment_analyzer/results/{job_id}",
+            lambda rng: {"page": rng.randrange(2)},
+        ),
+        setup=start_job,
+    ),
+    Scenario("sentiment_analyzer", "analyze_text", analyze_text),
+    Scenario("metrics", "metrics", get("/metrics")),
+]
+
+
+def read_status_kb(pid: int, key: str) -> Optional[int]:
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith(f"{key}:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def reset_peak_rss(pid: int) -> None:
+    """The peak (VmHWM) starts again from the current RSS, Linux only"""
+    try:
+        with open(f"/proc/{pid}/clear_refs", "w") as clear_refs:
+            clear_refs.write("5")
+    except OSError:
+        pass
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(
+        len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1)
+    )
+    return sorted_values[index]
+
+
+async def run_scenario(
+    client: httpx.AsyncClient,
+    scenario: Scenario,
+    requests: int,
+    concurrency: int,
+    warmup: int,
+    server_pid: int,
+    seed: int,
+) -> dict:
+    context = {
+        **scenario.context,
+        **(await scenario.setup(client) if scenario.setup else {}),
+    }
+    rng = random.Random(f"{seed}/{scenario.router}/{scenario.name}")
+    built = [scenario.build(rng, context) for _ in range(warmup + requests)]
+    latencies: List[float] = []
+    errors: Dict[str, int] = {}
+
+    async def send(arguments: dict, measured: bool) -> None:
+        started = time.perf_counter()
+        try:
+            response = await client.request(**arguments)
+            error = (
+                None
+                if response.status_code in scenario.statuses
+                else str(response.status_code)
+            )
+        except httpx.HTTPError as err:
+            error = type(err).__name__
+        if not measured:
+            return
+        latencies.append(time.perf_counter() - started)
+        if error is not None:
+            errors[error] = errors.get(error, 0) + 1
+
+    for arguments in built[:warmup]:
+        await send(arguments, measured=False)
+
+    queue = iter(built[warmup:])
+
+    async def worker() -> None:
+        for arguments in queue:
+            await send(arguments, measured=True)
+
+    reset_peak_rss(server_pid)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    peak_rss = read_status_kb(server_pid, "VmHWM")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "peak_rss_mb": round(peak_rss / 1024, 1) if peak_rss else None,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> dict:
+    comparison = {}
+    regressions = []
+    for key, result in results.items():
+        before = baseline.get("scenarios", {}).get(key)
+        if not before:
+            continue
+        change = {
+            "p95_ratio": (
+                round(result["p95_ms"] / before["p95_ms"], 3)
+                if before["p95_ms"]
+                else None
+            ),
+            "throughput_ratio": (
+                round(result["throughput_rps"] / before["throughput_rps"], 3)
+                if before["throughput_rps"]
+                else None
+            ),
+        }
+        if before.get("peak_rss_mb") and result.get("peak_rss_mb"):
+            change["peak_rss_ratio"] = round(
+                result["peak_rss_mb"] / before["peak_rss_mb"], 3
+            )
+        comparison[key] = change
+        if (
+            (change["p95_ratio"] or 0) > 1 + threshold
+            or (change["throughput_ratio"] or 1) < 1 / (1 + threshold)
+            or sum(result["errors"].values()) > sum(before.get("errors", {}).values())
+        ):
+            regressions.append(key)
+    return {"threshold": threshold, "scenarios": comparison, "regressions": regressions}
+
+
+def start_process(module: str, *args: str, env: dict) -> subprocess.Popen:
+    # Their output goes to stderr, stdout is the JSON report
+    return subprocess.Popen(
+        [sys.executable, "-m", module, *args],
+        cwd=config.ROOT_DIR,
+        env=env,
+        stdout=sys.stderr,
+    )
+
+
+def wait_until_ready(url: str, process: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{process.args!r} exited with {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1).status_code < 500:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} is not ready after {timeout} seconds")
+
+
+async def run_scenarios(args, scenarios: List[Scenario], server_pid: int) -> dict:
+    token = jwt.encode(TOKEN_CLAIMS, os.environ["AUTH_SECRET_KEY"], algorithm="HS256")
+    limits = httpx.Limits(max_connections=args.concurrency)
+    results = {}
+    async with httpx.AsyncClient(
+        base_url=f"http://127.0.0.1:{args.port}",
+        headers={"Authorization": f"Bearer {token}"},
+        limits=limits,
+        timeout=args.timeout,
+    ) as client:
+        for scenario in scenarios:
+            key = f"{scenario.router}/{scenario.name}"
+            results[key] = await run_scenario(
+                client,
+                scenario,
+                args.requests,
+                args.concurrency,
+                args.warmup,
+                server_pid,
+                args.seed,
+            )
+            print(key, json.dumps(results[key]), file=sys.stderr)
+    return results
+
+
+def run(args) -> dict:
+    routers = [router.strip() for router in args.routers.split(",") if router.strip()]
+    scenarios = [scenario for scenario in SCENARIOS if scenario.router in routers]
+    upstream = f"http://127.0.0.1:{args.upstream_port}"
+
+    configure(upstream)
+    env = {
+        **os.environ,
+        # metrics is served by every process, not a module of API_ROUTERS
+        "API_ROUTERS": ",".join(router for router in routers if router != "metrics"),
+        "API_LOG_LEVEL": os.environ.get("API_LOG_LEVEL", "WARNING"),
+    }
+    mocks = start_process(
+        "benchmarks.mock_servers",
+        "--port",
+        str(args.upstream_port),
+        "--latency-ms",
+        str(args.upstream_latency_ms),
+        env=env,
+    )
+    server = None
+    try:
+        wait_until_ready(
+            f"{upstream}/gnews/rss/search?q=ready", mocks, args.startup_timeout
+        )
+        server = start_process(
+            "benchmarks.server",
+            "--port",
+            str(args.port),
+            "--upstream",
+            upstream,
+            "--analyzer-delay-ms",
+            str(args.analyzer_delay_ms),
+            env=env,
+        )
+        wait_until_ready(
+            f"http://127.0.0.1:{args.port}/swagger.json", server, args.startup_timeout
+        )
+        started_rss = read_status_kb(server.pid, "VmRSS")
+        results = asyncio.run(run_scenarios(args, scenarios, server.pid))
+    finally:
+        for process in (server, mocks):
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=10)
+
+    return {
+        "settings": {
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "upstream_latency_ms": args.upstream_latency_ms,
+            "analyzer_delay_ms": args.analyzer_delay_ms,
+            "startup_rss_mb": round(started_rss / 1024, 1) if started_rss else None,
+        },
+        "scenarios": results,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--routers",
+        default=",".join(dict.fromkeys(scenario.router for scenario in SCENARIOS)),
+        help="Comma-separated routers of the scenarios, all of them by default",
+    )
+    parser.add_argument(
+        "--requests", type=int, default=200, help="Measured requests per scenario"
+    )
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--upstream-port", type=int, default=8900)
+    parser.add_argument("--upstream-latency-ms", type=float, default=50)
+    parser.add_argument("--analyzer-delay-ms", type=float, default=5)
+    parser.add_argument("--startup-timeout", type=float, default=120)
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    parser.add_argument("--baseline", help="Results of an earlier run to compare with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Allowed relative change before regression",
+    )
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            report["comparison"] = compare(
+                report["scenarios"], json.load(baseline_file), args.threshold
+            )
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+    print(json.dumps(report, indent=2))
+
+    if report.get("comparison", {}).get("regressions"):
+        sys.exit(1)
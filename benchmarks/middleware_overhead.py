@@ -0,0 +1,144 @@
+"""
+Per-request overhead of the request context and authentication middlewares,
+BaseHTTPMiddleware based (before) vs. pure ASGI (after)
+
+The apps are called directly through ASGI, without a server, so only the middleware stack is
+measured. Run from the project root:
+
+    python -m benchmarks.middleware_overhead [--requests 20000]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+os.environ.setdefault("AUTH_SECRET_KEY", "benchmark-secret-key-of-32-bytes!")
+
+import jwt  # noqa: E402
+from fastapi import FastAPI  # noqa: E402
+from starlette.middleware.base import BaseHTTPMiddleware  # noqa: E402
+
+from config import AUTH_SECRET_KEY  # noqa: E402
+from libs.middlewares.authentication_middleware import (  # noqa: E402
+    ALGORITHM,
+    AuthenticationMiddleware,
+)
+from libs.middlewares.request_context_middleware import (  # noqa: E402
+    RequestContextMiddleware,
+    request_token_ctx_var,
+)
+
+
+class BaseHTTPRequestContextMiddleware(BaseHTTPMiddleware):
+    """The request context middleware as it was before, for comparison"""
+
+    async def dispatch(self, request, call_next):
+        request_token_ctx_var.set(request.headers.get("Authorization", None))
+        return await call_next(request)
+
+
+class BaseHTTPAuthenticationMiddleware(BaseHTTPMiddleware):
+    """Same token checks as AuthenticationMiddleware, on top of BaseHTTPMiddleware"""
+
+    async def dispatch(self, request, call_next):
+        user, error_response = AuthenticationMiddleware.authenticate(
+            request.headers.get("Authorization", None)
+        )
+        if error_response is not None:
+            return error_response
+        request.state.user = user
+        return await call_next(request)
+
+
+def build_app(*middlewares) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"status": "ok"}
+
+    for middleware in middlewares:
+        app.add_middleware(middleware)
+    return app
+
+
+async def call(app, headers) -> int:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": headers,
+        "client": ("127.0.0.1", 50000),
+        "server": ("127.0.0.1", 8000),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app, headers, requests: int) -> float:
+    """:return: Average microseconds per request"""
+    for _ in range(min(requests, 500)):
+        assert await call(app, headers) == 200
+    started = time.perf_counter()
+    for _ in range(requests):
+        await call(app, headers)
+    return (time.perf_counter() - started) / requests * 1_000_000
+
+
+async def run(requests: int) -> dict:
+    token = jwt.encode(
+        {"email": "benchmark@example.com", "iss": "benchmark"},
+        key=AUTH_SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+    headers = [(b"authorization", f"Bearer {token}".encode())]
+
+    scenarios = {
+        "no_middleware": (),
+        "request_context_before": (BaseHTTPRequestContextMiddleware,),
+        "request_context_after": (RequestContextMiddleware,),
+        "authentication_before": (BaseHTTPAuthenticationMiddleware,),
+        "authentication_after": (AuthenticationMiddleware,),
+        "both_before": (
+            BaseHTTPAuthenticationMiddleware,
+            BaseHTTPRequestContextMiddleware,
+        ),
+        "both_after": (AuthenticationMiddleware, RequestContextMiddleware),
+    }
+    results = {
+        name: await measure(build_app(*middlewares), headers, requests)
+        for name, middlewares in scenarios.items()
+    }
+    baseline = results["no_middleware"]
+    return {
+        name: {
+            "us_per_request": round(value, 2),
+            "overhead_us": round(value - baseline, 2),
+        }
+        for name, value in results.items()
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=20000)
+    args = parser.parse_args()
+    print(json.dumps(asyncio.run(run(args.requests)), indent=2))
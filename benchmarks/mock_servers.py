@@ -0,0 +1,310 @@
+"""
+Local stand-ins of the upstream APIs (TMDB, USGS, NewsAPI, Google News) for the load
+benchmarks (benchmarks/load.py)
+
+One Starlette app serves every upstream under its own prefix, with deterministic data (seeded
+by the requested ids) and a configurable latency per response. Run from the project root:
+
+    python -m benchmarks.mock_servers [--port 8900] [--latency-ms 50]
+
+and point the API at it:
+
+    IMDB_BASE_URL=http://127.0.0.1:8900/tmdb/3
+    USGS_API_HOST=http://127.0.0.1:8900/usgs/fdsnws/event/1/query?format=geojson
+    NEWS_API_URL=http://127.0.0.1:8900/newsapi/v2
+    Google News: gnews.gnews.BASE_URL = http://127.0.0.1:8900/gnews/rss (benchmarks/server.py)
+"""
+
+import argparse
+import asyncio
+import bisect
+import json
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from functools import lru_cache
+from typing import List, Optional
+from xml.sax.saxutils import escape
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+MOVIES = 20000
+PERSONS = 50000
+EARTHQUAKES = 50000
+EARTHQUAKE_DAYS = 365
+ARTICLES = 100
+
+
+def movie(movie_id: int) -> dict:
+    rng = random.Random(movie_id)
+    released = date_string(datetime(1950, 1, 1) + timedelta(days=rng.randrange(27000)))
+    return {
+        "id": movie_id,
+        "title": f"Movie {movie_id}",
+        "original_title": f"Original movie {movie_id}",
+        "original_language": "en",
+        "overview": f"Overview of movie {movie_id}",
+        "popularity": round(rng.uniform(0.5, 150), 3),
+        "poster_path": f"/poster{movie_id}.jpg",
+        "backdrop_path": f"/backdrop{movie_id}.jpg",
+        "release_date": released,
+    }
+
+
+def date_string(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d")
+
+
+@lru_cache(maxsize=4096)
+def person_credits(person_id: int) -> str:
+    """Popular movies are shared by many persons, so the intersections are not empty"""
+    rng = random.Random(person_id)
+    movie_ids = {
+        1 + int(MOVIES * rng.random() ** 2) for _ in range(rng.randint(20, 150))
+    }
+    cast = [
+        {**movie(movie_id), "character": f"Character {person_id}-{movie_id}"}
+        for movie_id in sorted(movie_ids)
+    ]
+    crew = [
+        {**movie(movie_id), "job": rng.choice(("Director", "Writer", "Producer"))}
+        for movie_id in rng.sample(
+            sorted(movie_ids), k=min(len(movie_ids), rng.randint(0, 10))
+        )
+    ]
+    return json.dumps({"id": person_id, "cast": cast, "crew": crew})
+
+
+def tmdb_person(person_id: int) -> dict:
+    rng = random.Random(-person_id)
+    return {
+        "id": person_id,
+        "name": f"Person {person_id}",
+        "gender": rng.choice((1, 2)),
+        "known_for_department": rng.choice(("Acting", "Directing", "Writing")),
+        "popularity": round(rng.uniform(0.5, 80), 3),
+        "profile_path": f"/profile{person_id}.jpg",
+        "known_for": [movie(1 + rng.randrange(MOVIES)) for _ in range(3)],
+    }
+
+
+async def delay(request: Request) -> None:
+    latency = request.app.state.latency
+    if latency:
+        await asyncio.sleep(latency)
+
+
+async def tmdb_search_person(request: Request) -> JSONResponse:
+    await delay(request)
+    rng = random.Random(request.query_params.get("query", ""))
+    results = [tmdb_person(1 + rng.randrange(PERSONS)) for _ in range(20)]
+    return JSONResponse({"page": 1, "results": results, "total_results": len(results)})
+
+
+async def tmdb_movie_credits(request: Request) -> Response:
+    await delay(request)
+    return Response(
+        person_credits(request.path_params["person_id"]), media_type="application/json"
+    )
+
+
+async def tmdb_credits_of_movie(request: Request) -> JSONResponse:
+    await delay(request)
+    movie_id = request.path_params["movie_id"]
+    rng = random.Random(movie_id)
+    person_ids = rng.sample(range(1, PERSONS), k=rng.randint(5, 40))
+    return JSONResponse(
+        {
+            "id": movie_id,
+            "cast": [tmdb_person(person_id) for person_id in person_ids],
+            "crew": [],
+        }
+    )
+
+
+class EarthquakeCatalog:
+    """Events of the last EARTHQUAKE_DAYS days (from the start of the server), sorted by time"""
+
+    def __init__(self, count: int, seed: int = 1):
+        rng = random.Random(seed)
+        now_ms = int(time.time() * 1000)
+        events = []
+        for index in range(count):
+            event_time = now_ms - rng.randrange(EARTHQUAKE_DAYS * 86_400_000)
+            magnitude = round(min(2.5 + rng.expovariate(1.6), 9.5), 1)
+            longitude = round(rng.uniform(-180, 180), 4)
+            latitude = round(rng.uniform(-70, 70), 4)
+            feature = {
+                "type": "Feature",
+                "id": f"mock{index}",
+                "properties": {
+                    "mag": magnitude,
+                    "place": f"{index} km of Mock Place",
+                    "time": event_time,
+                    "updated": event_time + 60_000,
+                    "url": f"https://earthquake.example/mock{index}",
+                    "status": "reviewed",
+                    "tsunami": 0,
+                    "sig": int(magnitude * 100),
+                    "net": "mock",
+                    "type": "earthquake",
+                    "title": f"M {magnitude} - Mock Place",
+                },
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [longitude, latitude, round(rng.uniform(0, 600), 2)],
+                },
+            }
+            events.append(
+                (event_time, magnitude, latitude, longitude, json.dumps(feature))
+            )
+        events.sort()
+        self.events = events
+        self.times = [event[0] for event in events]
+
+    def query(self, params) -> List[str]:
+        start = to_epoch_ms(params.get("starttime"), default=0)
+        end = to_epoch_ms(params.get("endtime"), default=2**62)
+        updated_after = to_epoch_ms(params.get("updatedafter"), default=None)
+        min_magnitude = float(params.get("minmagnitude", -10))
+        max_magnitude = float(params.get("maxmagnitude", 10))
+        min_latitude = float(params.get("minlatitude", -90))
+        max_latitude = float(params.get("maxlatitude", 90))
+        min_longitude = float(params.get("minlongitude", -180))
+        max_longitude = float(params.get("maxlongitude", 180))
+
+        selected = [
+            feature
+            for event_time, magnitude, latitude, longitude, feature in self.events[
+                bisect.bisect_left(self.times, start) : bisect.bisect_right(
+                    self.times, end
+                )
+            ]
+            if min_magnitude <= magnitude <= max_magnitude
+            and min_latitude <= latitude <= max_latitude
+            and min_longitude <= longitude <= max_longitude
+            and (updated_after is None or event_time + 60_000 > updated_after)
+        ]
+        # USGS returns the newest first, offset is 1-based
+        selected.reverse()
+        offset = int(params.get("offset", 1)) - 1
+        limit = int(params.get("limit", 20000))
+        return selected[offset : offset + limit]
+
+
+def to_epoch_ms(value: Optional[str], default: Optional[int]) -> Optional[int]:
+    if not value:
+        return default
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+async def usgs_query(request: Request) -> Response:
+    await delay(request)
+    try:
+        features = request.app.state.earthquakes.query(request.query_params)
+    except ValueError as err:
+        return Response(str(err), status_code=400)
+    metadata = json.dumps(
+        {"generated": int(time.time() * 1000), "count": len(features)}
+    )
+    body = (
+        f'{{"type":"FeatureCollection","metadata":{metadata},"features":['
+        f'{",".join(features)}]}}'
+    )
+    return Response(body, media_type="application/json")
+
+
+def articles(query: str) -> List[dict]:
+    rng = random.Random(query)
+    now = datetime.now(timezone.utc)
+    return [
+        {
+            "title": f"{query} article {index}",
+            "source": f"Source {rng.randrange(25)}",
+            "published": now - timedelta(minutes=rng.randrange(7 * 24 * 60)),
+            "url": f"https://news.example/{query}/{index}",
+        }
+        for index in range(ARTICLES)
+    ]
+
+
+async def newsapi_everything(request: Request) -> JSONResponse:
+    await delay(request)
+    query = request.query_params.get("q", "")
+    return JSONResponse(
+        {
+            "status": "ok",
+            "totalResults": ARTICLES,
+            "articles": [
+                {
+                    "source": {"id": None, "name": article["source"]},
+                    "author": None,
+                    "title": article["title"],
+                    "description": article["title"],
+                    "url": article["url"],
+                    "publishedAt": article["published"].strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "content": article["title"],
+                }
+                for article in articles(query)
+            ],
+        }
+    )
+
+
+async def google_news_rss(request: Request) -> Response:
+    await delay(request)
+    query = request.query_params.get("q", "")
+    items = "".join(
+        f"<item><title>{escape(article['title'])} - {escape(article['source'])}</title>"
+        f"<link>{escape(article['url'])}</link>"
+        f"<pubDate>{format_datetime(article['published'])}</pubDate>"
+        f"<description>{escape(article['title'])}</description>"
+        f'<source url="https://{escape(article["source"].replace(" ", "").lower())}.example">'
+        f"{escape(article['source'])}</source></item>"
+        for article in articles(query)
+    )
+    body = (
+        '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+        f"<title>{escape(query)}</title>{items}</channel></rss>"
+    )
+    return Response(body, media_type="application/rss+xml")
+
+
+def build_app(latency_ms: float = 0, earthquakes: int = EARTHQUAKES) -> Starlette:
+    app = Starlette(
+        routes=[
+            Route("/tmdb/3/search/person", tmdb_search_person),
+            Route("/tmdb/3/person/{person_id:int}/movie_credits", tmdb_movie_credits),
+            Route("/tmdb/3/movie/{movie_id:int}/credits", tmdb_credits_of_movie),
+            Route("/usgs/fdsnws/event/1/query", usgs_query),
+            Route("/newsapi/v2/everything", newsapi_everything),
+            Route("/gnews/rss/search", google_news_rss),
+        ]
+    )
+    app.state.latency = latency_ms / 1000
+    app.state.earthquakes = EarthquakeCatalog(earthquakes)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--earthquakes", type=int, default=EARTHQUAKES)
+    args = parser.parse_args()
+
+    uvicorn.run(
+        build_app(args.latency_ms, args.earthquakes),
+        host=args.host,
+        port=args.port,
+        log_level="warning",
+    )
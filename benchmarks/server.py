@@ -0,0 +1,53 @@
+"""
+The API (main:app) under benchmark: every upstream pointed at benchmarks/mock_servers.py and
+the sentiment analyzers replaced by benchmarks/stub_analyzer.py, so it runs offline
+
+The databases are the ones of config.py (DB_HOST, DB_PORT, ...), seeded by
+benchmarks/fixtures.py. Started by benchmarks/load.py, or from the project root:
+
+    python -m benchmarks.server [--port 8800] [--upstream http://127.0.0.1:8900]
+"""
+
+import argparse
+import os
+import tempfile
+
+
+def configure(upstream: str) -> None:
+    """Before config.py is imported, the environment (and .env) keep precedence"""
+    os.environ.setdefault("IMDB_BASE_URL", f"{upstream}/tmdb/3")
+    os.environ.setdefault(
+        "USGS_API_HOST", f"{upstream}/usgs/fdsnws/event/1/query?format=geojson"
+    )
+    os.environ.setdefault("NEWS_API_URL", f"{upstream}/newsapi/v2")
+    os.environ.setdefault("AUTH_SECRET_KEY", "benchmark-secret-key-of-32-bytes!")
+    # Reflected from the seeded databases, not from the snapshots of production
+    os.environ.setdefault(
+        "SCHEMA_SNAPSHOT_DIR", tempfile.mkdtemp(prefix="schema_snapshots")
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--upstream", default="http://127.0.0.1:8900")
+    parser.add_argument(
+        "--analyzer-delay-ms",
+        type=float,
+        default=5,
+        help="Sentiment analysis time per text",
+    )
+    args = parser.parse_args()
+
+    configure(args.upstream)
+
+    import gnews.gnews
+    import uvicorn
+
+    from benchmarks import stub_analyzer
+
+    stub_analyzer.install(args.analyzer_delay_ms)
+    gnews.gnews.BASE_URL = f"{args.upstream}/gnews/rss"
+
+    uvicorn.run("main:app", host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,78 @@
+"""
+Import time and memory of every router, and of the whole app, each in a fresh interpreter
+
+The shared dependencies (fastapi, config) are imported first, so the numbers of a router are
+what enabling it adds. With --load-models the DB reflection of the lifespan is measured too,
+which needs the databases. Run from the project root:
+
+    python -m benchmarks.startup [--load-models] [--routers earthquakes,power_of_words]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+import config
+
+PROBE = """
+import json, os, resource, sys, time
+
+def rss_mb():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # Peak RSS, KB on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+import fastapi, config
+base_rss = rss_mb()
+started = time.perf_counter()
+module = __import__({module!r}, fromlist=["*"])
+result = {{
+    "import_seconds": time.perf_counter() - started,
+    "rss_mb": rss_mb(),
+}}
+result["rss_delta_mb"] = result["rss_mb"] - base_rss
+if {load_models!r}:
+    started = time.perf_counter()
+    for router in getattr(module, "routers", [module]):
+        if hasattr(router, "load_models"):
+            router.load_models()
+    result["load_models_seconds"] = time.perf_counter() - started
+    result["rss_mb_after_models"] = rss_mb()
+print(json.dumps(result))
+"""
+
+
+def probe(module: str, load_models: bool, env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", PROBE.format(module=module, load_models=load_models)],
+        capture_output=True,
+        text=True,
+        env=env,
+        cwd=config.ROOT_DIR,
+    )
+    if completed.returncode:
+        return {"error": completed.stderr.strip().splitlines()[-1]}
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return {key: round(value, 3) for key, value in result.items()}
+
+
+def run(routers, load_models: bool = False) -> dict:
+    env = dict(os.environ, API_ROUTERS=",".join(routers))
+    results = {name: probe(f"apis.{name}", load_models, env) for name in routers}
+    results["main"] = probe("main", load_models, env)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--routers", default=",".join(config.API_ROUTERS))
+    parser.add_argument("--load-models", action="store_true")
+    args = parser.parse_args()
+
+    print(json.dumps(run(args.routers.split(","), args.load_models), indent=2))
@@ -0,0 +1,70 @@
+"""
+Stand-in of the palzlib sentiment analyzers for the load benchmarks (benchmarks/server.py)
+
+The real analyzers load torch and transformer models, the stub sleeps a configurable time per
+text instead and returns deterministic scores (seeded by the text), in the same shapes:
+analyze_text / analyze_batch give Sentiments, pipeline the raw label scores.
+"""
+
+import random
+import sys
+import time
+import types
+from typing import Dict, List
+
+from palzlib.sentiment_analyzers.models.sentiments import (
+    LABEL_MAPPING_ROBERTA,
+    Sentiments,
+)
+
+FACTORY_MODULE = "palzlib.sentiment_analyzers.factory.sentiment_factory"
+
+
+class StubAnalyzer:
+    def __init__(self, delay_ms: float):
+        self.delay = delay_ms / 1000
+
+    def wait(self, texts: int) -> None:
+        if self.delay:
+            time.sleep(self.delay * texts)
+
+    @staticmethod
+    def scores(text: str) -> List[dict]:
+        rng = random.Random(text)
+        weights = [rng.random() for _ in LABEL_MAPPING_ROBERTA]
+        total = sum(weights)
+        return [
+            {"label": label, "score": weight / total}
+            for label, weight in zip(LABEL_MAPPING_ROBERTA, weights)
+        ]
+
+    @staticmethod
+    def sentiments(prediction: List[dict]) -> Sentiments:
+        mapped: Dict[str, float] = {
+            LABEL_MAPPING_ROBERTA[item["label"]]: round(item["score"], 4)
+            for item in prediction
+        }
+        return Sentiments(**mapped)
+
+    def pipeline(self, texts: List[str]) -> List[List[dict]]:
+        self.wait(len(texts))
+        return [self.scores(text) for text in texts]
+
+    def analyze_batch(self, texts: List[str]) -> List[Sentiments]:
+        return [self.sentiments(prediction) for prediction in self.pipeline(texts)]
+
+    def analyze_text(self, text: str) -> Sentiments:
+        return self.analyze_batch([text])[0]
+
+
+def install(delay_ms: float = 0) -> None:
+    """Registers the stub as the analyzer factory module, before the app imports it"""
+
+    class SentimentAnalyzerFactory:
+        @staticmethod
+        def get_analyzer(lang: str) -> StubAnalyzer:
+            return StubAnalyzer(delay_ms)
+
+    module = types.ModuleType(FACTORY_MODULE)
+    setattr(module, "SentimentAnalyzerFactory", SentimentAnalyzerFactory)
+    sys.modules[FACTORY_MODULE] = module
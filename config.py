@@ -7,6 +7,8 @@ import os
 from dotenv import load_dotenv
 from palzlib.database.db_config import DBConfig
 
+from models.db_pool_config import DBPoolConfig
+
 ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
 LIBS_DIR = os.path.join(ROOT_DIR, "libs")
 DATETIME_FORMAT = "%Y-%m-%dT%H:%M:%S"
@@ -25,6 +27,15 @@ except KeyError:
 API_NAME = "api.palzoltan.net"
 API_DEBUG = True
 API_LOG_LEVEL = os.getenv("API_LOG_LEVEL", default="DEBUG")
+# Routers (modules of apis/) served by this process, the others are not even imported
+API_ROUTERS = [
+    router.strip()
+    for router in (
+        os.getenv("API_ROUTERS")
+        or "earthquakes,time_travellers,movie_connections,power_of_words,sentiment_analyzer"
+    ).split(",")
+    if router.strip()
+]
 
 AUTH_ALLOWED_DOMAINS = os.getenv("AUTH_ALLOWED_DOMAINS", default="").split(",")
 AUTH_ALLOWED_USERS = os.getenv("AUTH_ALLOWED_USERS", default="").split(",")
@@ -32,13 +43,66 @@ AUTH_ALLOWED_USERS = os.getenv("AUTH_ALLOWED_USERS", default="").split(",")
 # IMDB-API
 IMDB_API_URL = os.getenv("IMDB_BASE_URL", default="")
 IMDB_API_KEY = os.getenv("IMDB_API_KEY", default="")
+# Limits of the id lists intersected by movie_connections (libs/intersection.py)
+MOVIE_CONNECTIONS_MAX_LISTS = int(os.getenv("MOVIE_CONNECTIONS_MAX_LISTS", default=20))
+MOVIE_CONNECTIONS_MAX_IDS = int(os.getenv("MOVIE_CONNECTIONS_MAX_IDS", default=20000))
+# movie_credits of persons kept in memory (apis/movie_connections.py)
+MOVIE_CREDITS_CACHE_TTL = float(os.getenv("MOVIE_CREDITS_CACHE_TTL", default=3600))
+MOVIE_CREDITS_CACHE_SIZE = int(os.getenv("MOVIE_CREDITS_CACHE_SIZE", default=256))
+# Credits of the local person <-> movie graph, it is cleared when full (libs/credit_graph.py)
+MOVIE_CONNECTIONS_GRAPH_MAX_CREDITS = int(
+    os.getenv("MOVIE_CONNECTIONS_GRAPH_MAX_CREDITS", default=1_000_000)
+)
 
 USGS_API_HOST = os.getenv("USGS_API_HOST", default="")
+# Responses of USGS kept in memory (apis/earthquakes.py)
+USGS_CACHE_TTL = float(os.getenv("USGS_CACHE_TTL", default=60))
+USGS_CACHE_SIZE = int(os.getenv("USGS_CACHE_SIZE", default=64))
+USGS_CACHE_MAX_MB = int(os.getenv("USGS_CACHE_MAX_MB", default=128))
 WEBUI_USER = os.getenv("WEBUI_USER", default="").split(":")
 AUTH_TOKEN = os.getenv("AUTH_TOKEN", default="")
 
 AUTH_SECRET_KEY = os.getenv("AUTH_SECRET_KEY")
+# Number of verified bearer tokens kept in memory, 0 disables the cache
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv("AUTH_TOKEN_CACHE_SIZE", default=1024))
 NEWS_API_KEY = os.getenv("NEWS_API_KEY", default="")
+NEWS_API_URL = os.getenv("NEWS_API_URL", default="https://newsapi.org/v2")
+
+
+def getenv_bool(key: str, default: bool = False) -> bool:
+    return os.getenv(key, default=str(default)).lower() in ("1", "true", "yes")
+
+
+# Answer sentiment aggregates from the feed_sentiment_daily rollup (sql/feed_sentiment_daily.sql)
+POW_SENTIMENT_ROLLUP = getenv_bool("POW_SENTIMENT_ROLLUP")
+
+# Local store of the USGS earthquake events (libs/earthquake_store.py)
+EARTHQUAKE_STORE = getenv_bool("EARTHQUAKE_STORE")
+EARTHQUAKE_STORE_PATH = os.getenv(
+    "EARTHQUAKE_STORE_PATH",
+    default=os.path.join(ROOT_DIR, "data", "earthquakes.sqlite3"),
+)
+EARTHQUAKE_STORE_DAYS = int(os.getenv("EARTHQUAKE_STORE_DAYS", default=365))
+EARTHQUAKE_STORE_MIN_MAGNITUDE = float(
+    os.getenv("EARTHQUAKE_STORE_MIN_MAGNITUDE", default=2.5)
+)
+EARTHQUAKE_STORE_SYNC_INTERVAL = float(
+    os.getenv("EARTHQUAKE_STORE_SYNC_INTERVAL", default=60)
+)
+# Seconds since the last sync the store still answers queries, USGS does afterwards
+EARTHQUAKE_STORE_MAX_STALENESS = float(
+    os.getenv("EARTHQUAKE_STORE_MAX_STALENESS", default=300)
+)
+
+# Reflected DB schemas, loaded on startup instead of reflecting (libs/schema_snapshot.py)
+SCHEMA_SNAPSHOT_DIR = os.getenv(
+    "SCHEMA_SNAPSHOT_DIR", default=os.path.join(ROOT_DIR, "schema_snapshots")
+)
+
+# SQL statement instrumentation (libs/db_instrumentation.py)
+DB_SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", default=1000))
+DB_EXPLAIN_SLOW_QUERIES = getenv_bool("DB_EXPLAIN_SLOW_QUERIES", default=False)
+DB_SLOW_QUERY_PLANS = int(os.getenv("DB_SLOW_QUERY_PLANS", default=50))
 
 
 # Database Configuration
@@ -53,6 +117,51 @@ def get_db_config(db_name: str) -> DBConfig:
     )
 
 
+def get_db_pool_config(prefix: str) -> DBPoolConfig:
+    """
+    Pool options of a database from <prefix>_POOL_SIZE (etc.) env variables,
+    falling back to the DB_POOL_SIZE (etc.) ones shared by every database
+    """
+
+    def option(name: str, default):
+        return os.getenv(f"{prefix}_{name}") or os.getenv(f"DB_{name}") or default
+
+    return DBPoolConfig(
+        pool_size=int(option("POOL_SIZE", 5)),
+        max_overflow=int(option("MAX_OVERFLOW", 10)),
+        pool_timeout=float(option("POOL_TIMEOUT", 30)),
+        pool_recycle=int(option("POOL_RECYCLE", 1800)),
+        pool_pre_ping=getenv_bool(
+            f"{prefix}_POOL_PRE_PING",
+            default=getenv_bool("DB_POOL_PRE_PING", default=True),
+        ),
+        statement_timeout_ms=int(option("STATEMENT_TIMEOUT_MS", 0)),
+    )
+
+
 psql_config = get_db_config(os.getenv("DB_NAME", "postgres"))
 time_travelers_db_config = get_db_config("time_travellers")
 pow_db_config = get_db_config("power_of_words_v2")
+
+time_travelers_db_pool_config = get_db_pool_config("TIME_TRAVELLERS_DB")
+pow_db_pool_config = get_db_pool_config("POW_DB")
+
+# statement_timeout (ms) of the transactions of the analytics routes, so one runaway query
+# cannot hold a pooled connection for long (libs/db_client.py)
+POW_ANALYTICS_STATEMENT_TIMEOUT_MS = int(
+    os.getenv("POW_ANALYTICS_STATEMENT_TIMEOUT_MS", default=15000)
+)
+ROUTE_STATEMENT_TIMEOUTS = {
+    path: POW_ANALYTICS_STATEMENT_TIMEOUT_MS
+    for path in (
+        "/power_of_words/get_sentiment_grouped",
+        "/power_of_words/most_common_words",
+        "/power_of_words/dashboard",
+        "/power_of_words/bias_detection",
+        "/power_of_words/correlation",
+        "/power_of_words/correlation_between_sources_avg_compound",
+        "/power_of_words/correlation_between_sources",
+        "/power_of_words/word_co_occurences",
+        "/power_of_words/word_neighbours",
+    )
+}
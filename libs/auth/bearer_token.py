@@ -1,14 +1,19 @@
-from fastapi import HTTPException
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from http import HTTPStatus
+
+import jwt
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from starlette.requests import Request
 from starlette.responses import JSONResponse
-import jwt
-from http import HTTPStatus
-from config import AUTH_SECRET_KEY
+
+from config import AUTH_SECRET_KEY, AUTH_TOKEN_CACHE_SIZE
+from libs.auth.token_cache import VerifiedTokenCache
 
 # Secret key and algorithm (for demo purposes)
 ALGORITHM = "HS256"
 
+# Shared by every BearerAuth instance, a page load sends many requests with the same token
+verified_tokens = VerifiedTokenCache(maxsize=AUTH_TOKEN_CACHE_SIZE)
+
 
 class BearerAuth(HTTPBearer):
     def __init__(self, auto_error: bool = True):
@@ -26,24 +31,40 @@ class BearerAuth(HTTPBearer):
             )
 
         token = credentials.credentials
+        payload = verified_tokens.get(token)
+        if payload is not None:
+            self.attach_claims(request, payload)
+            return token
+
         try:
             # Decode the JWT token
             payload = jwt.decode(token, key=AUTH_SECRET_KEY, algorithms=[ALGORITHM])
 
             email = payload.get("email")
             if not email:
-                return JSONResponse(status_code=401, content="Invalid token: missing email.")
+                return JSONResponse(
+                    status_code=401, content="Invalid token: missing email."
+                )
 
             issuer = payload.get("iss")
             if not issuer:
-                return JSONResponse(status_code=401, content="Invalid token: missing issuer.")
-
+                return JSONResponse(
+                    status_code=401, content="Invalid token: missing issuer."
+                )
 
         except jwt.ExpiredSignatureError:
             return JSONResponse(status_code=401, content="Token has expired.")
         except jwt.InvalidTokenError as err:
             return JSONResponse(status_code=401, content=f"Invalid token: {str(err)}")
 
+        verified_tokens.set(token, payload)
+        self.attach_claims(request, payload)
+
         # Return the token if it's valid
         return token
 
+    @staticmethod
+    def attach_claims(request: Request, payload: dict):
+        """Verified claims, accessible in other parts of the app"""
+        request.state.token_claims = payload
+        request.state.user = {"email": payload["email"], "issuer": payload["iss"]}
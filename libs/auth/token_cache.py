@@ -0,0 +1,58 @@
+"""
+Bounded cache of verified JWT claims, so a token is decoded and verified once until it expires
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+
+class VerifiedTokenCache:
+    """
+    LRU of token hash -> claims, safe to share between threads.
+    Entries expire at the token's `exp` claim, or after `default_ttl` seconds if it has none.
+    """
+
+    def __init__(self, maxsize: int = 1024, default_ttl: float = 300):
+        self.maxsize = maxsize
+        self.default_ttl = default_ttl
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[bytes, Tuple[float, dict]]" = OrderedDict()
+
+    @staticmethod
+    def key(token: str) -> bytes:
+        # Tokens are not kept in memory, only their digest
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str) -> Optional[dict]:
+        key = self.key(token)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, claims = entry
+            if expires_at <= time.time():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return claims
+
+    def set(self, token: str, claims: dict) -> None:
+        if self.maxsize <= 0:
+            return
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            expires_at = time.time() + self.default_ttl
+
+        key = self.key(token)
+        with self.lock:
+            self.entries[key] = (expires_at, claims)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
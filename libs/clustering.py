@@ -0,0 +1,84 @@
+"""
+Grid clustering of map points with NumPy: count, max magnitude and centroid per cell
+
+Cells follow the Web Mercator tiles of the map: at zoom z a 256px tile holds
+CELLS_PER_TILE x CELLS_PER_TILE cells, so a cluster covers about the same screen area
+at every zoom level.
+"""
+
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+
+CELLS_PER_TILE = 4
+MAX_ZOOM = 22
+# Web Mercator is undefined at the poles
+MAX_LATITUDE = 85.05112878
+
+
+def grid_cells(latitude: np.ndarray, longitude: np.ndarray, zoom: int):
+    """Integer (x, y) cell coordinates of the points at a zoom level"""
+    cells = (2**zoom) * CELLS_PER_TILE
+    x = (longitude + 180.0) / 360.0
+    sin_latitude = np.sin(np.radians(np.clip(latitude, -MAX_LATITUDE, MAX_LATITUDE)))
+    y = 0.5 - np.log((1 + sin_latitude) / (1 - sin_latitude)) / (4 * np.pi)
+    return (
+        np.clip((x * cells).astype(np.int64), 0, cells - 1),
+        np.clip((y * cells).astype(np.int64), 0, cells - 1),
+    )
+
+
+def cluster_points(
+    latitude: Sequence[Optional[float]],
+    longitude: Sequence[Optional[float]],
+    magnitude: Sequence[Optional[float]],
+    zoom: Optional[int] = None,
+    max_points: Optional[int] = None,
+) -> Dict[str, object]:
+    """
+    Aggregates the points into grid cells.
+
+    :param zoom: Map zoom level of the grid, MAX_ZOOM if None
+    :param max_points: Coarsen the grid (lower the zoom) until there are at most this many cells,
+        the zoom 0 grid (CELLS_PER_TILE ** 2 cells) is the coarsest
+    :return: {"zoom": zoom used, "latitude", "longitude" (centroids), "count",
+        "max_magnitude"}, lists of one value per cell, ordered by count descending
+    """
+    lat = np.asarray(latitude, dtype=np.float64)
+    long = np.asarray(longitude, dtype=np.float64)
+    mag = np.asarray(
+        [np.nan if value is None else value for value in magnitude], dtype=np.float64
+    )
+
+    zoom = MAX_ZOOM if zoom is None else min(max(zoom, 0), MAX_ZOOM)
+    x, y = grid_cells(lat, long, zoom)
+
+    # A cell of zoom z - 1 holds 2 x 2 cells of zoom z
+    while True:
+        cell_ids = y * ((2**zoom) * CELLS_PER_TILE) + x
+        cells, inverse, counts = np.unique(
+            cell_ids, return_inverse=True, return_counts=True
+        )
+        if max_points is None or len(cells) <= max_points or zoom == 0:
+            break
+        zoom -= 1
+        x >>= 1
+        y >>= 1
+
+    inverse = inverse.reshape(-1)
+    centroid_latitude = np.bincount(inverse, weights=lat) / counts
+    centroid_longitude = np.bincount(inverse, weights=long) / counts
+    max_magnitude = np.full(len(cells), np.nan)
+    np.fmax.at(max_magnitude, inverse, mag)
+
+    order = np.argsort(-counts, kind="stable")
+    return {
+        "zoom": zoom,
+        "latitude": centroid_latitude[order].round(5).tolist(),
+        "longitude": centroid_longitude[order].round(5).tolist(),
+        "count": counts[order].tolist(),
+        "max_magnitude": [
+            None if np.isnan(value) else value
+            for value in max_magnitude[order].tolist()
+        ],
+    }
@@ -0,0 +1,176 @@
+"""
+Sentiment statistics of the feeds matched by a set of words, computed in one pass
+
+Every matched feed is attributed only to the input words it contains. The per (word, source)
+statistics and the per (source, month) compound averages come from the same rows.
+"""
+
+import statistics
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from libs.functions import SENTIMENT_KEYS
+
+# Sentiment values and compounds are within this range, used by the approximate median
+VALUE_RANGE = (-1.0, 1.0)
+HISTOGRAM_BINS = 400
+
+
+class ValueStats:
+    """
+    Count, min, max, average and (optionally) median of a stream of values.
+
+    The exact median keeps every value, the approximate one a fixed-width histogram over
+    VALUE_RANGE: constant memory, the estimate is within one bin (0.005 with the defaults)
+    of the middle value(s).
+    """
+
+    __slots__ = ("count", "total", "minimum", "maximum", "values", "histogram")
+
+    def __init__(self, with_median: bool = False, approximate: bool = False):
+        self.count = 0
+        self.total = 0.0
+        self.minimum: Optional[float] = None
+        self.maximum: Optional[float] = None
+        self.values: Optional[List[float]] = (
+            [] if with_median and not approximate else None
+        )
+        self.histogram: Optional[List[int]] = (
+            [0] * HISTOGRAM_BINS if with_median and approximate else None
+        )
+
+    def add(self, value) -> None:
+        if value is None:
+            return
+        value = float(value)
+
+        self.count += 1
+        self.total += value
+        if self.minimum is None or value < self.minimum:
+            self.minimum = value
+        if self.maximum is None or value > self.maximum:
+            self.maximum = value
+
+        if self.values is not None:
+            self.values.append(value)
+        elif self.histogram is not None:
+            low, high = VALUE_RANGE
+            index = int((value - low) / (high - low) * HISTOGRAM_BINS)
+            self.histogram[min(max(index, 0), HISTOGRAM_BINS - 1)] += 1
+
+    @property
+    def average(self) -> Optional[float]:
+        return self.total / self.count if self.count else None
+
+    @property
+    def median(self) -> Optional[float]:
+        if not self.count:
+            return None
+        if self.values is not None:
+            return statistics.median(self.values)
+        if self.histogram is None:
+            return None
+
+        # Interpolate inside the bin holding the middle value, clamped to the observed range
+        low, high = VALUE_RANGE
+        width = (high - low) / HISTOGRAM_BINS
+        middle = self.count / 2
+        seen = 0
+        for index, bin_count in enumerate(self.histogram):
+            if bin_count and seen + bin_count >= middle:
+                estimate = low + width * (index + (middle - seen) / bin_count)
+                return min(max(estimate, self.minimum), self.maximum)
+            seen += bin_count
+        return self.maximum
+
+
+class SourceStats:
+    """Statistics of one (word, source) group"""
+
+    __slots__ = ("compound", "sentiments", "key_counts")
+
+    def __init__(self, approximate: bool = False):
+        self.compound = ValueStats()
+        self.sentiments = {
+            key: ValueStats(with_median=True, approximate=approximate)
+            for key in SENTIMENT_KEYS
+        }
+        self.key_counts = dict.fromkeys(SENTIMENT_KEYS, 0)
+
+    def add(self, sentiment_key, sentiment_value, sentiment_compound) -> None:
+        self.compound.add(sentiment_compound)
+        if sentiment_key in self.sentiments:
+            self.key_counts[sentiment_key] += 1
+            self.sentiments[sentiment_key].add(sentiment_value)
+
+    def asdict(self) -> dict:
+        result = {
+            "min_compound": self.compound.minimum,
+            "max_compound": self.compound.maximum,
+            "avg_compound": self.compound.average,
+        }
+        for key in ("positive", "negative", "neutral"):
+            stats = self.sentiments[key]
+            result |= {
+                f"nm_of_{key}": self.key_counts[key],
+                f"max_{key}": stats.maximum,
+                f"min_{key}": stats.minimum,
+                f"avg_{key}": stats.average,
+                f"median_{key}": stats.median,
+            }
+        return result
+
+
+class CorrelationEngine:
+    """Consumes the matched feeds once, serves both the per-source and the monthly view"""
+
+    def __init__(self, approximate: bool = False):
+        self.approximate = approximate
+        self.by_source: Dict[Tuple[str, Optional[str]], SourceStats] = {}
+        self.by_month: Dict[Tuple[Optional[str], object], ValueStats] = {}
+
+    def add(
+        self,
+        words: Iterable[str],
+        sourcename: Optional[str],
+        month,
+        sentiment_key: Optional[str],
+        sentiment_value,
+        sentiment_compound,
+    ) -> None:
+        for word in words:
+            group = self.by_source.get((word, sourcename))
+            if group is None:
+                group = self.by_source[(word, sourcename)] = SourceStats(
+                    self.approximate
+                )
+            group.add(sentiment_key, sentiment_value, sentiment_compound)
+
+        month_stats = self.by_month.get((sourcename, month))
+        if month_stats is None:
+            month_stats = self.by_month[(sourcename, month)] = ValueStats()
+        month_stats.add(sentiment_compound)
+
+    def consume(self, rows: Iterable) -> "CorrelationEngine":
+        """
+        :param rows: Rows of (matched_words, sourcename, month, sentiment_key, sentiment_value,
+            sentiment_compound)
+        """
+        for row in rows:
+            self.add(*row)
+        return self
+
+    def source_rows(self) -> List[dict]:
+        return [
+            {"word": word, "sourcename": sourcename, **stats.asdict()}
+            for (word, sourcename), stats in sorted(
+                self.by_source.items(), key=lambda item: (item[0][0], item[0][1] or "")
+            )
+        ]
+
+    def monthly_rows(self) -> List[dict]:
+        return [
+            {"sourcename": sourcename, "month": month, "avg_compound": stats.average}
+            for (sourcename, month), stats in sorted(
+                self.by_month.items(), key=lambda item: (item[0][0] or "", item[0][1])
+            )
+        ]
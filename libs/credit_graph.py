@@ -0,0 +1,176 @@
+"""
+Person <-> movie credit graph, built from the TMDB movie_credits of persons the API fetched
+
+Persons and movies get dense integer indices in the order they are seen, the adjacency lists
+are arrays of these indices (4 bytes per credit). Connections between people are searched
+locally, without calling TMDB.
+
+The graph holds at most max_credits credits: when the credits of a person would exceed it,
+it is cleared and grows again from the persons fetched afterwards.
+"""
+
+from array import array
+from typing import Dict, List, Optional, Sequence, Set
+
+
+class CreditGraph:
+    """
+    Bipartite graph, an edge is a cast or crew credit of a person in a movie.
+    Used from the event loop only, so it takes no locks.
+    """
+
+    def __init__(self, max_credits: Optional[int] = None):
+        self.max_credits = max_credits
+        self.clear()
+
+    def clear(self) -> None:
+        self.person_ids: List[int] = []
+        self.movie_ids: List[int] = []
+        self.person_index: Dict[int, int] = {}
+        self.movie_index: Dict[int, int] = {}
+        self.movie_titles: List[Optional[str]] = []
+        self.person_movies: List[array] = []
+        self.movie_persons: List[array] = []
+        # Persons whose complete filmography was added, not only some of their credits
+        self.complete_persons: Set[int] = set()
+        self.credits = 0
+
+    def _person(self, person_id: int) -> int:
+        index = self.person_index.get(person_id)
+        if index is None:
+            index = self.person_index[person_id] = len(self.person_ids)
+            self.person_ids.append(person_id)
+            self.person_movies.append(array("i"))
+        return index
+
+    def _movie(self, movie_id: int, title: Optional[str] = None) -> int:
+        index = self.movie_index.get(movie_id)
+        if index is None:
+            index = self.movie_index[movie_id] = len(self.movie_ids)
+            self.movie_ids.append(movie_id)
+            self.movie_titles.append(title)
+            self.movie_persons.append(array("i"))
+        elif title and not self.movie_titles[index]:
+            self.movie_titles[index] = title
+        return index
+
+    def _link(self, person: int, movie: int) -> None:
+        self.person_movies[person].append(movie)
+        self.movie_persons[movie].append(person)
+        self.credits += 1
+
+    @staticmethod
+    def _credits(credits: dict) -> Sequence[dict]:
+        return (*credits.get("cast", ()), *credits.get("crew", ()))
+
+    def add_person_credits(self, person_id: int, credits: dict) -> None:
+        """Adds a TMDB /person/{id}/movie_credits response"""
+        self.add_persons_credits({person_id: credits})
+
+    def add_persons_credits(self, credits_by_person: Dict[int, dict]) -> None:
+        """
+        Adds the movie_credits of the persons missing from the graph. If they would exceed
+        max_credits, the graph is cleared first, so every one of them is in it afterwards.
+        """
+        missing = {
+            person_id: self._credits(credits)
+            for person_id, credits in credits_by_person.items()
+            if not self.has_person(person_id)
+        }
+        if (
+            self.max_credits is not None
+            and self.credits + sum(map(len, missing.values())) > self.max_credits
+        ):
+            self.clear()
+            missing = {
+                person_id: self._credits(credits)
+                for person_id, credits in credits_by_person.items()
+            }
+
+        for person_id, person_credits in missing.items():
+            person = self._person(person_id)
+            # A person can have several credits (jobs, characters) in the same movie
+            linked = set(self.person_movies[person])
+            for credit in person_credits:
+                movie = self._movie(credit["id"], credit.get("title"))
+                if movie not in linked:
+                    linked.add(movie)
+                    self._link(person, movie)
+            self.complete_persons.add(person_id)
+
+    def has_person(self, person_id: int) -> bool:
+        return person_id in self.complete_persons
+
+    def stats(self) -> dict:
+        return {
+            "persons": len(self.person_ids),
+            "movies": len(self.movie_ids),
+            "credits": self.credits,
+        }
+
+    def _expand(self, frontier: List[int], parents: Dict[int, tuple]) -> List[int]:
+        """Persons one movie away from the frontier, not visited from the same side yet"""
+        next_frontier = []
+        for person in frontier:
+            for movie in self.person_movies[person]:
+                for neighbour in self.movie_persons[movie]:
+                    if neighbour not in parents:
+                        parents[neighbour] = (person, movie)
+                        next_frontier.append(neighbour)
+        return next_frontier
+
+    def shortest_path(
+        self, source_id: int, target_id: int, max_degrees: int = 6
+    ) -> Optional[List[dict]]:
+        """
+        Bidirectional BFS, the smaller frontier is expanded by one movie at a time.
+
+        :return: Alternating persons and movies from source to target, e.g.
+            [{"person_id": 1}, {"movie_id": 10, "title": ...}, {"person_id": 2}], or None if
+            they are not connected within max_degrees movies in the local graph
+        """
+        source = self.person_index.get(source_id)
+        target = self.person_index.get(target_id)
+        if source is None or target is None:
+            return None
+        if source == target:
+            return [self._person_node(source)]
+
+        forward_parents: Dict[int, tuple] = {source: None}
+        backward_parents: Dict[int, tuple] = {target: None}
+        forward, backward = [source], [target]
+        degrees = 0
+
+        while forward and backward and degrees < max_degrees:
+            degrees += 1
+            if len(forward) <= len(backward):
+                forward = self._expand(forward, forward_parents)
+                meeting = [person for person in forward if person in backward_parents]
+            else:
+                backward = self._expand(backward, backward_parents)
+                meeting = [person for person in backward if person in forward_parents]
+            if meeting:
+                return self._path(meeting[0], forward_parents, backward_parents)
+        return None
+
+    def _path(
+        self, meeting: int, forward_parents: dict, backward_parents: dict
+    ) -> List[dict]:
+        path = [self._person_node(meeting)]
+
+        person = meeting
+        while forward_parents[person] is not None:
+            person, movie = forward_parents[person]
+            path[:0] = [self._person_node(person), self._movie_node(movie)]
+
+        person = meeting
+        while backward_parents[person] is not None:
+            person, movie = backward_parents[person]
+            path += [self._movie_node(movie), self._person_node(person)]
+        return path
+
+    def _person_node(self, person: int) -> dict:
+        return {"person_id": self.person_ids[person]}
+
+    def _movie_node(self, movie: int) -> dict:
+        return {"movie_id": self.movie_ids[movie], "title": self.movie_titles[movie]}
@@ -0,0 +1,118 @@
+"""
+DBClient with a configurable, instrumented connection pool and per-route statement timeouts
+"""
+
+import time
+
+from palzlib.database.db_client import DBClient
+from palzlib.database.db_config import DBConfig
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+import config
+from libs.db_instrumentation import query_stats_ctx_var
+from libs.metrics import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUTS,
+    DB_POOL_UTILIZATION,
+    DB_POOL_WAIT,
+    route_template,
+)
+from models.db_pool_config import DBPoolConfig
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool measuring how long checkouts wait, labelled by the pool's logging name"""
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            DB_POOL_TIMEOUTS.labels(self.logging_name).inc()
+            raise
+        finally:
+            DB_POOL_WAIT.labels(self.logging_name).observe(
+                time.perf_counter() - started
+            )
+
+
+def set_route_statement_timeout(connection) -> None:
+    """Limits the statements of the transaction if the current route has a timeout configured"""
+    stats = query_stats_ctx_var.get()
+    if stats is None or stats.scope is None:
+        return
+
+    timeout = config.ROUTE_STATEMENT_TIMEOUTS.get(route_template(stats.scope))
+    if timeout:
+        connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout)}")
+
+
+def checked_out(engine: Engine) -> int:
+    """Connections in use, only a QueuePool counts them"""
+    pool = engine.pool
+    return pool.checkedout() if isinstance(pool, QueuePool) else 0
+
+
+def track_pool(name: str, engine: Engine, pool_config: DBPoolConfig) -> None:
+    """Pool usage read at scrape time, engine.pool is replaced when the engine is disposed"""
+    max_connections = max(pool_config.max_connections, 1)
+    DB_POOL_CHECKED_OUT.labels(name).set_function(lambda: checked_out(engine))
+    DB_POOL_SIZE.labels(name).set(max_connections)
+    DB_POOL_UTILIZATION.labels(name).set_function(
+        lambda: checked_out(engine) / max_connections
+    )
+
+
+class PooledDBClient(DBClient):
+    def __init__(
+        self, db_config: DBConfig, pool_config: DBPoolConfig, name: str, **kwargs
+    ):
+        """
+        :param pool_config: Pool options of the engine
+        :param name: Database label of the pool metrics
+        """
+        self.db_config = db_config
+        self.pool_config = pool_config
+        self.name = name
+        super().__init__(db_config=db_config, **kwargs)
+        track_pool(name, self.engine, pool_config)
+
+    def _create_engine(self):
+        # Called by DBClient.__init__, which creates the engine without pool options
+        db_config = self.db_config
+        pool_config = self.pool_config
+
+        url = URL.create(
+            drivername=db_config.dialect,
+            username=db_config.username,
+            password=db_config.password,
+            host=db_config.host,
+            port=db_config.port,
+            database=db_config.dbname,
+        )
+        is_postgresql = url.get_backend_name() == "postgresql"
+
+        connect_args = {}
+        if is_postgresql and pool_config.statement_timeout_ms:
+            connect_args["options"] = (
+                f"-c statement_timeout={int(pool_config.statement_timeout_ms)}"
+            )
+
+        engine = create_engine(
+            url,
+            poolclass=InstrumentedQueuePool,
+            pool_logging_name=self.name,
+            pool_size=pool_config.pool_size,
+            max_overflow=pool_config.max_overflow,
+            pool_timeout=pool_config.pool_timeout,
+            pool_recycle=pool_config.pool_recycle,
+            pool_pre_ping=pool_config.pool_pre_ping,
+            connect_args=connect_args,
+        )
+        if is_postgresql:
+            event.listen(engine, "begin", set_route_statement_timeout)
+        return engine
@@ -0,0 +1,167 @@
+"""
+SQL statement instrumentation based on SQLAlchemy engine events
+
+Every statement executed by any engine (so every DBClient) is timed and counted for the
+route of the current request. With DB_EXPLAIN_SLOW_QUERIES, statements slower than
+DB_SLOW_QUERY_MS are re-run with EXPLAIN (ANALYZE, BUFFERS) in a background thread and the
+plans are kept in memory.
+"""
+
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Deque, Dict, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.types import Scope
+
+import config
+from libs.metrics import (
+    BACKGROUND_ROUTE,
+    DB_QUERIES,
+    DB_ROWS,
+    DB_SLOW_QUERIES,
+    DB_TIME,
+    route_template,
+)
+
+logger = logging.getLogger(__name__)
+
+EXPLAIN_PREFIX = "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) "
+EXPLAINABLE_STATEMENTS = ("SELECT", "WITH")
+# The same statement is explained again only after this many seconds
+EXPLAIN_INTERVAL = 300
+MAX_PENDING_EXPLAINS = 4
+MAX_EXPLAINED_STATEMENTS = 1000
+
+
+@dataclass
+class QueryStats:
+    """DB usage of one request, shared with the threads the request runs code on"""
+
+    scope: Optional[Scope] = field(default=None, repr=False)
+    queries: int = 0
+    rows: int = 0
+    duration: float = 0.0
+    slow_queries: int = 0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def route(self) -> str:
+        return (
+            route_template(self.scope) if self.scope is not None else BACKGROUND_ROUTE
+        )
+
+    def add(self, duration: float, rows: int, slow: bool) -> None:
+        with self.lock:
+            self.queries += 1
+            self.rows += rows
+            self.duration += duration
+            self.slow_queries += slow
+
+
+query_stats_ctx_var: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+# Last captured plans of slow statements, newest last
+SLOW_QUERY_PLANS: Deque[dict] = deque(maxlen=config.DB_SLOW_QUERY_PLANS)
+
+_explain_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="explain")
+_explain_lock = threading.Lock()
+_explained_at: Dict[str, float] = {}
+_pending_explains = 0
+
+
+def get_slow_query_plans() -> List[dict]:
+    return list(SLOW_QUERY_PLANS)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    duration = time.perf_counter() - conn.info["query_start_time"].pop()
+    rows = max(cursor.rowcount or 0, 0)
+    slow = duration * 1000 >= config.DB_SLOW_QUERY_MS
+
+    stats = query_stats_ctx_var.get()
+    if stats is not None:
+        stats.add(duration, rows, slow)
+    else:
+        # Requests record their totals once in the middleware
+        DB_QUERIES.labels(BACKGROUND_ROUTE).inc()
+        DB_ROWS.labels(BACKGROUND_ROUTE).inc(rows)
+        DB_TIME.labels(BACKGROUND_ROUTE).inc(duration)
+        if slow:
+            DB_SLOW_QUERIES.labels(BACKGROUND_ROUTE).inc()
+
+    if slow and config.DB_EXPLAIN_SLOW_QUERIES and not executemany:
+        route = stats.route if stats is not None else BACKGROUND_ROUTE
+        _schedule_explain(conn.engine, statement, parameters, duration, route)
+
+
+def _schedule_explain(engine: Engine, statement: str, parameters, duration, route):
+    global _pending_explains
+
+    if not statement.lstrip()[:6].upper().startswith(EXPLAINABLE_STATEMENTS):
+        return
+
+    now = time.monotonic()
+    with _explain_lock:
+        if _pending_explains >= MAX_PENDING_EXPLAINS:
+            return
+        if now - _explained_at.get(statement, -EXPLAIN_INTERVAL) < EXPLAIN_INTERVAL:
+            return
+        if len(_explained_at) >= MAX_EXPLAINED_STATEMENTS:
+            _explained_at.clear()
+        _explained_at[statement] = now
+        _pending_explains += 1
+
+    _explain_executor.submit(
+        _capture_plan, engine, statement, parameters, duration, route
+    )
+
+
+def _capture_plan(engine: Engine, statement: str, parameters, duration, route):
+    """
+    Runs on a separate connection in a rolled back transaction.
+    Statements using temporary tables cannot be explained.
+    """
+    global _pending_explains
+
+    try:
+        with engine.connect() as connection:
+            plan = connection.exec_driver_sql(
+                EXPLAIN_PREFIX + statement, parameters
+            ).scalar()
+            connection.rollback()
+
+        SLOW_QUERY_PLANS.append(
+            {
+                "route": route,
+                "statement": statement,
+                "duration_ms": round(duration * 1000, 2),
+                "captured_at": datetime.now().isoformat(timespec="seconds"),
+                "plan": plan,
+            }
+        )
+    except Exception as err:
+        logger.warning("Could not explain slow query: %s", err)
+    finally:
+        with _explain_lock:
+            _pending_explains -= 1
+
+
+def instrument_engines() -> None:
+    """Listens to the statements of every Engine, existing and future ones"""
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
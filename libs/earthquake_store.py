@@ -0,0 +1,354 @@
+"""
+Local store of USGS earthquake events (SQLite), synced incrementally by their `updated` time
+
+Events of the last EARTHQUAKE_STORE_DAYS days with magnitude >= EARTHQUAKE_STORE_MIN_MAGNITUDE
+are backfilled once, then only the events updated since the previous sync are fetched, and the
+events older than the window are pruned. An R-tree answers the bounding box filters, a
+(time, magnitude) index the time windows.
+
+The store answers windows ending before the last sync, while that sync is at most
+EARTHQUAKE_STORE_MAX_STALENESS seconds old, the others are left to USGS. Only one process
+(of the workers sharing the file) syncs at a time, the others read the state it saved.
+"""
+
+import fcntl
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, Iterator, List, Optional, Sequence
+
+import httpx
+from starlette.concurrency import run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS events (
+        id TEXT NOT NULL UNIQUE,
+        time INTEGER NOT NULL,
+        updated INTEGER NOT NULL,
+        latitude REAL NOT NULL,
+        longitude REAL NOT NULL,
+        depth REAL,
+        magnitude REAL,
+        feature TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS events_time_magnitude ON events (time, magnitude);
+    CREATE VIRTUAL TABLE IF NOT EXISTS events_rtree USING rtree (
+        event_rowid, min_longitude, max_longitude, min_latitude, max_latitude
+    );
+    CREATE TABLE IF NOT EXISTS sync_state (
+        key TEXT PRIMARY KEY,
+        value INTEGER NOT NULL
+    );
+"""
+
+UPSERT_EVENT = """
+    INSERT INTO events (id, time, updated, latitude, longitude, depth, magnitude, feature)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (id) DO UPDATE SET
+        time = excluded.time,
+        updated = excluded.updated,
+        latitude = excluded.latitude,
+        longitude = excluded.longitude,
+        depth = excluded.depth,
+        magnitude = excluded.magnitude,
+        feature = excluded.feature
+    WHERE excluded.updated >= events.updated
+"""
+
+UPSERT_EVENT_RTREE = """
+    INSERT OR REPLACE INTO events_rtree
+    SELECT rowid, longitude, longitude, latitude, latitude FROM events WHERE id = ?
+"""
+
+# USGS returns at most this many events per query, larger results are paged
+USGS_PAGE_SIZE = 20000
+BACKFILL_WINDOW = timedelta(days=30)
+
+
+def to_epoch_ms(value: str) -> Optional[int]:
+    """ISO date(time), UTC if no offset is given (as USGS reads it)"""
+    try:
+        moment = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp() * 1000)
+
+
+def to_iso(epoch_ms: int) -> str:
+    return datetime.fromtimestamp(epoch_ms / 1000, tz=timezone.utc).strftime(
+        "%Y-%m-%dT%H:%M:%S.%f"
+    )[:-3]
+
+
+class EarthquakeStore:
+    def __init__(
+        self,
+        path: str,
+        min_magnitude: float = 2.5,
+        days: int = 365,
+        max_staleness: float = 300,
+    ):
+        """
+        :param max_staleness: Seconds since the last sync the store still answers queries
+        """
+        self.path = path
+        self.min_magnitude = min_magnitude
+        self.days = days
+        self.max_staleness_ms = max_staleness * 1000
+        self.write_lock = threading.Lock()
+
+        with closing(self.connect()) as connection:
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.executescript(SCHEMA)
+        self.load_state()
+
+    def connect(self) -> sqlite3.Connection:
+        # One connection per call, queries run on the threads of the threadpool
+        return sqlite3.connect(self.path, timeout=30)
+
+    def load_state(self) -> None:
+        with closing(self.connect()) as connection:
+            self.state = dict(connection.execute("SELECT key, value FROM sync_state"))
+
+    @property
+    def covered_from(self) -> Optional[int]:
+        """Start (epoch ms) of the complete history, None until the backfill finished"""
+        return self.state.get("covered_from")
+
+    def covers(
+        self, start_ms: Optional[int], end_ms: Optional[int], min_magnitude: float
+    ) -> bool:
+        """The window is within the synced history, and the last sync is recent enough"""
+        synced_at = self.state.get("synced_at")
+        return (
+            self.covered_from is not None
+            and synced_at is not None
+            and time.time() * 1000 - synced_at <= self.max_staleness_ms
+            and start_ms is not None
+            and end_ms is not None
+            and self.covered_from <= start_ms
+            and end_ms <= synced_at
+            and min_magnitude >= self.min_magnitude
+        )
+
+    def save_state(self, connection: sqlite3.Connection, **values: int) -> None:
+        connection.executemany(
+            "INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)",
+            values.items(),
+        )
+        self.state.update(values)
+
+    def write(
+        self, features: Iterable[dict], prune_before: Optional[int] = None, **state: int
+    ) -> int:
+        """
+        Upserts the events and deletes the deleted ones, in one transaction with the state
+
+        :param prune_before: Events older than this (epoch ms) are deleted too
+        """
+        rows, deleted = [], []
+        for feature in features:
+            properties = feature.get("properties") or {}
+            if properties.get("status") == "deleted":
+                deleted.append((feature["id"],))
+                continue
+            longitude, latitude, depth = (feature["geometry"]["coordinates"] + [None])[
+                :3
+            ]
+            rows.append(
+                (
+                    feature["id"],
+                    properties["time"],
+                    properties.get("updated") or properties["time"],
+                    latitude,
+                    longitude,
+                    depth,
+                    properties.get("mag"),
+                    json.dumps(feature, separators=(",", ":")),
+                )
+            )
+
+        with self.write_lock, closing(self.connect()) as connection, connection:
+            connection.executemany(UPSERT_EVENT, rows)
+            connection.executemany(UPSERT_EVENT_RTREE, ((row[0],) for row in rows))
+            connection.executemany(
+                "DELETE FROM events_rtree WHERE event_rowid = "
+                "(SELECT rowid FROM events WHERE id = ?)",
+                deleted,
+            )
+            connection.executemany("DELETE FROM events WHERE id = ?", deleted)
+            if prune_before is not None:
+                connection.execute(
+                    "DELETE FROM events_rtree WHERE event_rowid IN "
+                    "(SELECT rowid FROM events WHERE time < ?)",
+                    (prune_before,),
+                )
+                connection.execute("DELETE FROM events WHERE time < ?", (prune_before,))
+            self.save_state(connection, **state)
+        return len(rows) + len(deleted)
+
+    def query(
+        self,
+        columns: Sequence[str],
+        start_ms: int,
+        end_ms: int,
+        min_magnitude: float,
+        max_magnitude: float,
+        min_lat: Optional[float] = None,
+        max_lat: Optional[float] = None,
+        min_long: Optional[float] = None,
+        max_long: Optional[float] = None,
+    ) -> List[tuple]:
+        """Rows of the given event columns, newest first (as USGS orders them)"""
+        sql = f"SELECT {', '.join(f'e.{column}' for column in columns)} FROM events e"
+        params: list = []
+        if any(value is not None for value in (min_lat, max_lat, min_long, max_long)):
+            sql += (
+                " JOIN events_rtree r ON r.event_rowid = e.rowid"
+                " AND r.min_longitude >= ? AND r.max_longitude <= ?"
+                " AND r.min_latitude >= ? AND r.max_latitude <= ?"
+            )
+            params += [
+                -180.0 if min_long is None else min_long,
+                180.0 if max_long is None else max_long,
+                -90.0 if min_lat is None else min_lat,
+                90.0 if max_lat is None else max_lat,
+            ]
+        sql += (
+            " WHERE e.time BETWEEN ? AND ? AND e.magnitude BETWEEN ? AND ?"
+            " ORDER BY e.time DESC"
+        )
+        params += [start_ms, end_ms, min_magnitude, max_magnitude]
+
+        with closing(self.connect()) as connection:
+            return connection.execute(sql, params).fetchall()
+
+    def feature_collection(self, *args, **kwargs) -> bytes:
+        """GeoJSON of the matching events, assembled from the stored features"""
+        features = [row[0] for row in self.query(("feature",), *args, **kwargs)]
+        metadata = {
+            "generated": int(time.time() * 1000),
+            "title": "USGS Earthquakes (local store)",
+            "count": len(features),
+            "synced_at": self.state.get("synced_at"),
+        }
+        return (
+            f'{{"type":"FeatureCollection","metadata":{json.dumps(metadata)},"features":['
+            f'{",".join(features)}]}}'
+        ).encode()
+
+    async def fetch(
+        self, client: httpx.AsyncClient, url: str, params: dict
+    ) -> List[dict]:
+        """Every page of a USGS query"""
+        features: List[dict] = []
+        offset = 1
+        while True:
+            response = await client.get(
+                httpx.URL(url).copy_merge_params(
+                    {**params, "limit": USGS_PAGE_SIZE, "offset": offset}
+                )
+            )
+            response.raise_for_status()
+            page = response.json().get("features", [])
+            features += page
+            if len(page) < USGS_PAGE_SIZE:
+                return features
+            offset += USGS_PAGE_SIZE
+
+    async def backfill(self, client: httpx.AsyncClient, url: str) -> None:
+        """Loads the history window by window, the store answers queries once it is complete"""
+        started_ms = int(time.time() * 1000)
+        start = datetime.now(timezone.utc) - timedelta(days=self.days)
+        window_start = start
+        while window_start < datetime.now(timezone.utc):
+            window_end = window_start + BACKFILL_WINDOW
+            features = await self.fetch(
+                client,
+                url,
+                {
+                    "starttime": window_start.isoformat(),
+                    "endtime": window_end.isoformat(),
+                    "minmagnitude": self.min_magnitude,
+                },
+            )
+            await run_in_threadpool(self.write, features)
+            window_start = window_end
+
+        # Events updated while backfilling are fetched by the next incremental sync
+        await run_in_threadpool(
+            self.write,
+            [],
+            covered_from=int(start.timestamp() * 1000),
+            last_updated=started_ms,
+            synced_at=int(time.time() * 1000),
+        )
+
+    async def sync_updates(self, client: httpx.AsyncClient, url: str) -> int:
+        """
+        Fetches the events created, changed or deleted since the previous sync, and moves the
+        start of the history to the last `days` days, pruning the older events
+        """
+        started_ms = int(time.time() * 1000)
+        covered_from = max(self.covered_from, started_ms - self.days * 86_400_000)
+        features = await self.fetch(
+            client,
+            url,
+            {
+                "starttime": to_iso(covered_from),
+                "updatedafter": to_iso(self.state["last_updated"]),
+                "minmagnitude": self.min_magnitude,
+                "includedeleted": "true",
+            },
+        )
+        last_updated = max(
+            (
+                feature["properties"].get("updated") or 0
+                for feature in features
+                if feature.get("properties")
+            ),
+            default=self.state["last_updated"],
+        )
+        return await run_in_threadpool(
+            self.write,
+            features,
+            prune_before=covered_from,
+            covered_from=covered_from,
+            last_updated=max(last_updated, self.state["last_updated"]),
+            synced_at=started_ms,
+        )
+
+    @contextmanager
+    def sync_lock(self) -> Iterator[bool]:
+        """Whether this process holds the sync lock (a file lock next to the store)"""
+        with open(f"{self.path}.lock", "a") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+            try:
+                yield True
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    async def sync(self, client: httpx.AsyncClient, url: str) -> None:
+        with self.sync_lock() as locked:
+            # Synced by another process since, or being synced now
+            await run_in_threadpool(self.load_state)
+            if not locked:
+                return
+            if self.covered_from is None:
+                logger.info(
+                    "Backfilling the earthquake store from the last %s days", self.days
+                )
+                await self.backfill(client, url)
+            await self.sync_updates(client, url)
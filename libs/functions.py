@@ -1,35 +1,66 @@
-from collections import defaultdict
+from operator import attrgetter
+from typing import Callable, Dict, Optional, Tuple
 
+# Order of the pivoted sentiment columns expected by generate_sentiment_series
+SENTIMENT_KEYS = ("negative", "neutral", "positive")
 
-def to_dict(obj):
-    """Converts an SQLAlchemy ORM object to a dictionary."""
-    return {column.name: getattr(obj, column.name) for column in obj.__table__.columns}
+# Converters by (mapped class, columns, exclude), a class is not Hashable for lru_cache in mypy
+row_converters: Dict[tuple, Callable[[object], dict]] = {}
 
 
-def generate_sentiment_by_source_series(input_data) -> dict:
+def row_converter(
+    model, columns: Optional[Tuple[str, ...]] = None, exclude: Tuple[str, ...] = ()
+) -> Callable[[object], dict]:
     """
-    Organizes sentiment data by source
-        and aggregates values into separate lists for negative, neutral, and positive sentiments.
+    Builds (once per mapped class and projection) a function converting an ORM object to a dictionary.
 
-    :param input_data: List of tuples (source, value, sentiment)
-    :return: Dictionary containing lists of values for each sentiment category.
+    :param model: SQLAlchemy mapped class (e.g. a DBMapper reflected model)
+    :param columns: Column names to keep, in table order. All columns if None.
+    :param exclude: Column names to drop from the result.
+    :return: Callable taking an instance of the model and returning a dictionary.
     """
+    key = (model, columns, exclude)
+    converter = row_converters.get(key)
+    if converter is None:
+        converter = row_converters[key] = build_row_converter(model, columns, exclude)
+    return converter
 
-    sentiment_data: defaultdict = defaultdict(lambda: defaultdict(list))
-
-    # Categorize data by sentiment type
-    for key, value, sentiment in input_data:
-        sentiment_data[sentiment][key].append(value)
 
-    # Prepare final structured output
-    series_data: dict = {"Negative": [], "Neutral": [], "Positive": []}
-    all_keys = sorted(
-        set(key for sentiment in sentiment_data.values() for key in sentiment)
+def build_row_converter(
+    model, columns: Optional[Tuple[str, ...]], exclude: Tuple[str, ...]
+) -> Callable[[object], dict]:
+    names = tuple(
+        column.name
+        for column in model.__table__.columns
+        if (columns is None or column.name in columns) and column.name not in exclude
     )
+    if not names:
+        return lambda obj: {}
+
+    getter = attrgetter(*names)
+    if len(names) == 1:
+        name = names[0]
+        return lambda obj: {name: getter(obj)}
+
+    return lambda obj: dict(zip(names, getter(obj)))
+
+
+def generate_sentiment_series(rows, with_categories: bool = False) -> dict:
+    """
+    Turns pivoted sentiment counts into chart series.
+
+    :param rows: Rows of (group, negative, neutral, positive) counts, one per group, already ordered
+    :param with_categories: Add the group keys as "categories"
+    :return: Dictionary containing lists of values for each sentiment category.
+    """
+    categories, negative, neutral, positive = zip(*rows) if rows else ((), (), (), ())
 
-    for key in all_keys:
-        series_data["Negative"].extend(sentiment_data["negative"].get(key, [0]))
-        series_data["Neutral"].extend(sentiment_data["neutral"].get(key, [0]))
-        series_data["Positive"].extend(sentiment_data["positive"].get(key, [0]))
+    series_data: dict = {
+        "Negative": list(negative),
+        "Neutral": list(neutral),
+        "Positive": list(positive),
+    }
+    if with_categories:
+        series_data["categories"] = list(categories)
 
     return series_data
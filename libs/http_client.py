@@ -0,0 +1,32 @@
+"""
+Shared, pooled httpx clients of the upstream APIs, closed by the application lifespan
+"""
+
+from typing import Dict
+
+import httpx
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def get_http_client(name: str, **kwargs) -> httpx.AsyncClient:
+    """
+    Client of an upstream API, created on the first use and reused for the keep-alive connections.
+
+    :param name: Name of the upstream (e.g. "usgs"), one client per name
+    :param kwargs: httpx.AsyncClient options, used when the client is created
+    """
+    client = _clients.get(name)
+    if client is None or client.is_closed:
+        kwargs.setdefault("timeout", httpx.Timeout(30.0, connect=5.0))
+        kwargs.setdefault(
+            "limits", httpx.Limits(max_connections=20, max_keepalive_connections=10)
+        )
+        client = _clients[name] = httpx.AsyncClient(**kwargs)
+    return client
+
+
+async def close_http_clients() -> None:
+    while _clients:
+        _, client = _clients.popitem()
+        await client.aclose()
@@ -0,0 +1,100 @@
+"""
+Intersection of id lists (e.g. the movie ids of several people)
+
+Lists are intersected smallest first, the shrinking result is the only set built and the work
+stops as soon as it is empty. Counting how many lists contain each id is done in a NumPy
+array indexed by the id (a dense bitmap of counters) when the ids are integers.
+"""
+
+from collections import Counter
+from typing import Hashable, List, Optional, Sequence, Tuple, TypeVar
+
+import numpy as np
+
+# Fewer ids than this are counted in Python, converting them to arrays would cost more
+NUMPY_MIN_SIZE = 1024
+# Ids above this are counted by sorting instead of in an array of max id counters
+DENSE_MAX_ID = 2**24
+
+Id = TypeVar("Id", bound=Hashable)
+
+
+def check_size(lists: Sequence[Sequence], max_lists: int, max_ids: int) -> None:
+    if len(lists) > max_lists:
+        raise ValueError(
+            f"Too many lists: {len(lists)}, at most {max_lists} are allowed."
+        )
+    if any(len(ids) > max_ids for ids in lists):
+        raise ValueError(f"Too many ids in a list, at most {max_ids} are allowed.")
+
+
+def intersect(lists: Sequence[Sequence[Id]]) -> List[Id]:
+    """:return: The ids present in every list, sorted"""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+
+    result = set(lists[0])
+    for ids in lists[1:]:
+        if not result:
+            break
+        result.intersection_update(ids)
+    try:
+        return sorted(result)  # type: ignore[type-var]
+    except TypeError:
+        # Ids of mixed types
+        return list(result)
+
+
+def id_array(ids: Sequence) -> Optional[np.ndarray]:
+    """The ids as an integer array, None if they are not all non-negative integers"""
+    try:
+        array = np.asarray(ids)
+    except ValueError:
+        return None
+    if not len(array):
+        return np.empty(0, dtype=np.int64)
+    if array.dtype.kind not in "iu" or array.ndim != 1 or array.min() < 0:
+        return None
+    return array
+
+
+def count_array(arrays: List[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+    """:return: (ids, number of arrays containing the id), ids in ascending order"""
+    max_id = max((int(array.max()) for array in arrays if len(array)), default=-1)
+    if max_id < DENSE_MAX_ID:
+        counts = np.zeros(max_id + 1, dtype=np.min_scalar_type(len(arrays)))
+        for array in arrays:
+            # Repeated ids of a list are incremented once
+            counts[array] += 1
+        ids = np.flatnonzero(counts)
+        return ids, counts[ids]
+    return np.unique(
+        np.concatenate([np.unique(array) for array in arrays]), return_counts=True
+    )
+
+
+def count_shared(
+    lists: Sequence[Sequence[Id]], min_count: int = 2
+) -> List[Tuple[Id, int]]:
+    """
+    :return: (id, number of lists it is in) of the ids present in at least min_count lists,
+        most shared first, then by id (if the ids are comparable)
+    """
+    if sum(len(ids) for ids in lists) >= NUMPY_MIN_SIZE:
+        arrays = [id_array(ids) for ids in lists]
+        if all(array is not None for array in arrays):
+            ids, counts = count_array(arrays)
+            shared = counts >= min_count
+            ids, counts = ids[shared], counts[shared]
+            order = np.argsort(-counts.astype(np.int64), kind="stable")
+            return list(zip(ids[order].tolist(), counts[order].tolist()))
+
+    counter = Counter(id for ids in lists for id in set(ids))
+    counted = [(id, count) for id, count in counter.items() if count >= min_count]
+    try:
+        counted.sort()
+    except TypeError:
+        # Ids of mixed types
+        pass
+    return sorted(counted, key=lambda item: -item[1])
@@ -0,0 +1,102 @@
+"""
+Prometheus metrics of the API, exposed by the /metrics endpoint
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_client import Counter, Gauge, Histogram
+from starlette.types import Scope
+
+# HTTP requests per route template (libs/middlewares/metrics_middleware.py)
+HTTP_REQUESTS = Counter(
+    "http_requests_total",
+    "Number of handled HTTP requests",
+    ["method", "route", "status"],
+)
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time from receiving an HTTP request to sending the end of its response",
+    ["method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+# The route of a request in progress is matched by the middleware before the router runs
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "Number of HTTP requests being handled",
+    ["method", "route"],
+)
+EVENT_LOOP_LAG = Histogram(
+    "event_loop_lag_seconds",
+    "Delay of the event loop in waking up a periodic task",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5),
+)
+EXECUTOR_QUEUE_DEPTH = Gauge(
+    "executor_queue_depth", "Number of tasks waiting for a worker thread", ["executor"]
+)
+EXECUTOR_THREADS = Gauge(
+    "executor_threads", "Number of started worker threads", ["executor"]
+)
+
+# DB usage per route template (libs/db_instrumentation.py)
+DB_QUERIES = Counter("db_queries_total", "Number of executed SQL statements", ["route"])
+DB_ROWS = Counter(
+    "db_rows_total", "Number of rows returned or affected by SQL statements", ["route"]
+)
+DB_TIME = Counter(
+    "db_time_seconds_total", "Time spent executing SQL statements", ["route"]
+)
+DB_SLOW_QUERIES = Counter(
+    "db_slow_queries_total",
+    "Number of SQL statements slower than the DB_SLOW_QUERY_MS threshold",
+    ["route"],
+)
+DB_REQUEST_TIME = Histogram(
+    "db_request_time_seconds",
+    "Time spent executing SQL statements per request",
+    ["route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+)
+
+# Connection pools per database (libs/db_client.py)
+DB_POOL_WAIT = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time waited for a pooled connection, including opening a new one",
+    ["database"],
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5, 30),
+)
+DB_POOL_TIMEOUTS = Counter(
+    "db_pool_timeouts_total",
+    "Number of checkouts failed because the pool stayed exhausted for pool_timeout",
+    ["database"],
+)
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out", "Number of connections in use", ["database"]
+)
+DB_POOL_SIZE = Gauge(
+    "db_pool_max_connections", "pool_size + max_overflow of the pool", ["database"]
+)
+DB_POOL_UTILIZATION = Gauge(
+    "db_pool_utilization", "Connections in use / max connections", ["database"]
+)
+
+# Label of DB work done outside an HTTP request (startup, background threads)
+BACKGROUND_ROUTE = "background"
+UNMATCHED_ROUTE = "unmatched"
+
+
+def route_template(scope: Scope) -> str:
+    """
+    Route template (e.g. /movie_connections/person/{person_id}/movies) of a handled request.
+    FastAPI stores the matched route in the scope, so it is known after the app was called.
+    """
+    route = scope.get("route")
+    return getattr(route, "path", None) or UNMATCHED_ROUTE
+
+
+def track_executor(name: str, executor: ThreadPoolExecutor) -> None:
+    """
+    Exposes the queue depth and the thread count of a thread pool, read at scrape time.
+    ThreadPoolExecutor has no public API for these, its work queue and thread set are used.
+    """
+    EXECUTOR_QUEUE_DEPTH.labels(name).set_function(executor._work_queue.qsize)
+    EXECUTOR_THREADS.labels(name).set_function(lambda: len(executor._threads))
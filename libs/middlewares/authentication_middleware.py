@@ -1,35 +1,63 @@
 import jwt
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
 from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 from config import AUTH_SECRET_KEY
+from libs.auth.bearer_token import verified_tokens
+from libs.middlewares.request_context_middleware import get_header
 
 # Secret key to decode the JWT token (this should be kept safe in production)
 ALGORITHM = "HS256"
 
+# Exclude /docs and /openapi.json from authentication check
+PUBLIC_PATHS = ("/openapi.json", "/swagger.json")
+PUBLIC_PATH_PREFIXES = ("/docs",)
 
-class AuthenticationMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
-        # Exclude /docs and /openapi.json from authentication check
-        if request.url.path.startswith(
-                "/docs") or request.url.path == "/openapi.json" or request.url.path == "/swagger.json":
-            return await call_next(request)
-        header_authorization = request.headers.get("Authorization", None)
 
+class AuthenticationMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        if path in PUBLIC_PATHS or path.startswith(PUBLIC_PATH_PREFIXES):
+            await self.app(scope, receive, send)
+            return
+
+        user, error_response = self.authenticate(get_header(scope, b"authorization"))
+        if error_response is not None:
+            await error_response(scope, receive, send)
+            return
+
+        # Attach the user information to the request state (accessible in other parts of the app)
+        scope.setdefault("state", {})["user"] = user
+        await self.app(scope, receive, send)
+
+    @staticmethod
+    def authenticate(header_authorization):
+        """:return: (user, None) for a valid token, (None, error response) otherwise"""
         if header_authorization is None:
-            return JSONResponse(
-                {"detail": "Authorization token is missing"},
-                status_code=401
+            return None, JSONResponse(
+                {"detail": "Authorization token is missing"}, status_code=401
             )
 
         if not header_authorization.lower().startswith("bearer "):
-            return JSONResponse(status_code=401, content="Invalid authorization header format.")
+            return None, JSONResponse(
+                status_code=401, content="Invalid authorization header format."
+            )
 
         try:
             token = header_authorization.split(" ")[1]  # get the token part
         except BaseException:
-            return JSONResponse(status_code=401, content="Invalid token.")
+            return None, JSONResponse(status_code=401, content="Invalid token.")
+
+        payload = verified_tokens.get(token)
+        if payload is not None:
+            return {"email": payload["email"], "issuer": payload["iss"]}, None
 
         try:
 
@@ -37,18 +65,22 @@ class AuthenticationMiddleware(BaseHTTPMiddleware):
             payload = jwt.decode(token, key=AUTH_SECRET_KEY, algorithms=[ALGORITHM])
             email = payload.get("email")
             if not email:
-                return JSONResponse(status_code=401, content="Invalid token: missing email.")
+                return None, JSONResponse(
+                    status_code=401, content="Invalid token: missing email."
+                )
 
             issuer = payload.get("iss")
             if not issuer:
-                return JSONResponse(status_code=401, content="Invalid token: missing issuer.")
-
-            # Attach the user information to the request state (accessible in other parts of the app)
-            request.state.user = {"email": email, "issuer": issuer}
+                return None, JSONResponse(
+                    status_code=401, content="Invalid token: missing issuer."
+                )
 
         except jwt.ExpiredSignatureError:
-            return JSONResponse(status_code=401, content="Token has expired.")
+            return None, JSONResponse(status_code=401, content="Token has expired.")
         except jwt.InvalidTokenError as err:
-            return JSONResponse(status_code=401, content=f"Invalid token: {str(err)}")
+            return None, JSONResponse(
+                status_code=401, content=f"Invalid token: {str(err)}"
+            )
 
-        return await call_next(request)
+        verified_tokens.set(token, payload)
+        return {"email": email, "issuer": issuer}, None
@@ -0,0 +1,44 @@
+"""
+Per-route DB statistics of the requests and the Server-Timing response header
+"""
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from libs.db_instrumentation import QueryStats, query_stats_ctx_var
+from libs.metrics import DB_QUERIES, DB_REQUEST_TIME, DB_ROWS, DB_SLOW_QUERIES, DB_TIME
+
+
+class DBInstrumentationMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = QueryStats(scope=scope)
+        token = query_stats_ctx_var.set(stats)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start" and stats.queries:
+                headers = MutableHeaders(scope=message)
+                headers.append(
+                    "Server-Timing",
+                    f'db;dur={stats.duration * 1000:.1f};desc="{stats.queries} queries"',
+                )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            query_stats_ctx_var.reset(token)
+            if stats.queries:
+                route = stats.route
+                DB_QUERIES.labels(route).inc(stats.queries)
+                DB_ROWS.labels(route).inc(stats.rows)
+                DB_TIME.labels(route).inc(stats.duration)
+                DB_REQUEST_TIME.labels(route).observe(stats.duration)
+                if stats.slow_queries:
+                    DB_SLOW_QUERIES.labels(route).inc(stats.slow_queries)
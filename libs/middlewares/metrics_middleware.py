@@ -0,0 +1,98 @@
+"""
+Request count, latency and in-flight metrics per route template, and event loop lag
+"""
+
+import asyncio
+import time
+from typing import Iterable, Optional
+
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from libs.metrics import (
+    EVENT_LOOP_LAG,
+    HTTP_REQUEST_DURATION,
+    HTTP_REQUESTS,
+    HTTP_REQUESTS_IN_PROGRESS,
+    UNMATCHED_ROUTE,
+    route_template,
+)
+
+# Seconds between two wake-ups of the event loop lag monitor
+LOOP_LAG_INTERVAL = 0.5
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL) -> None:
+    """Sleeps `interval` seconds in a loop, the extra time it takes to wake up is the lag"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(loop.time() - started - interval, 0.0))
+
+
+_loop_lag_task: Optional[asyncio.Task] = None
+
+
+def start_event_loop_lag_monitor() -> None:
+    """Started by the application lifespan, so it runs on the server's event loop"""
+    global _loop_lag_task
+    if _loop_lag_task is None or _loop_lag_task.done():
+        _loop_lag_task = asyncio.get_running_loop().create_task(
+            monitor_event_loop_lag()
+        )
+
+
+async def stop_event_loop_lag_monitor() -> None:
+    global _loop_lag_task
+    if _loop_lag_task is not None:
+        _loop_lag_task.cancel()
+        try:
+            await _loop_lag_task
+        except asyncio.CancelledError:
+            pass
+        _loop_lag_task = None
+
+
+def match_route_template(routes: Iterable[BaseRoute], scope: Scope) -> str:
+    """Route template of a request before the router handled it, like the router matches it"""
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return getattr(route, "path", None) or UNMATCHED_ROUTE
+    return UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp, routes: Iterable[BaseRoute] = ()) -> None:
+        """:param routes: Routes of the app, to label the requests in progress"""
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        started = time.perf_counter()
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels(
+            method, match_route_template(self.routes, scope)
+        )
+        in_progress.inc()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - started
+            in_progress.dec()
+            route = route_template(scope)
+            HTTP_REQUEST_DURATION.labels(method, route).observe(duration)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
@@ -1,33 +1,141 @@
 """
 Convert comma-delimited query parameter strings into repeated query parameters
 """
-from urllib.parse import parse_qs as parse_query_string
-from urllib.parse import urlencode as encode_query_string
 
+import types
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+    get_args,
+    get_origin,
+)
+from urllib.parse import unquote_plus
+
+from fastapi.dependencies.utils import get_flat_dependant
+from fastapi.routing import APIRoute
+from starlette.routing import BaseRoute, compile_path
 from starlette.types import ASGIApp, Receive, Scope, Send
 
+ENCODED_COMMAS = (b"%2C", b"%2c")
 
-class QueryStringFlatteningMiddleware:
-    def __init__(self, app: ASGIApp) -> None:
-        self.app = app
 
-    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
-        query_string = scope.get("query_string", None).decode()
+def has_comma(value: bytes) -> bool:
+    return b"," in value or any(comma in value for comma in ENCODED_COMMAS)
+
+
+def flatten_query_string(
+    query_string: bytes, names: Optional[FrozenSet[str]] = None
+) -> bytes:
+    """
+    Splits the comma-separated values of the `names` parameters (all if None) into repeated
+    parameters. Works on the raw bytes: the other parameters and the split values keep their
+    original encoding, nothing is decoded and encoded again.
+    """
+    pairs = []
+    for pair in query_string.split(b"&"):
+        name, separator, value = pair.partition(b"=")
+        if (
+            not separator
+            or not has_comma(value)
+            or (names is not None and unquote_plus(name.decode("latin-1")) not in names)
+        ):
+            pairs.append(pair)
+            continue
+
+        for comma in ENCODED_COMMAS:
+            value = value.replace(comma, b",")
+        pairs.extend(name + b"=" + part for part in value.split(b",") if part)
+
+    return b"&".join(pairs)
+
+
+def route_path(scope: Scope) -> str:
+    """The path the routes are matched against, without the root_path of a mounted app"""
+    path, root_path = scope["path"], scope.get("root_path", "")
+    if (
+        root_path
+        and path.startswith(root_path)
+        and path[len(root_path) :][:1] in ("", "/")
+    ):
+        return path[len(root_path) :]
+    return path
 
-        if scope["type"] == "http" and query_string:
-            parsed = parse_query_string(query_string)
-            flattened = {}
-            for name, values in parsed.items():
-                all_values = []
-                for value in values:
-                    all_values.extend(value.split(","))
 
-                flattened[name] = all_values
+def is_list_annotation(annotation: Any) -> bool:
+    """list, List[int], Optional[List[str]], ..."""
+    origin = get_origin(annotation)
+    if origin is Union or origin is types.UnionType:
+        return any(is_list_annotation(arg) for arg in get_args(annotation))
+    origin = origin or annotation
+    return isinstance(origin, type) and issubclass(
+        origin, (list, tuple, set, frozenset)
+    )
 
-            # Convert lists into repeated parameters, which is better for FastAPI
-            scope["query_string"] = encode_query_string(flattened, doseq=True).encode(
-                "utf-8"
+
+def list_query_params(routes: Iterable[BaseRoute]) -> Dict[str, Tuple[str, ...]]:
+    """
+    List-typed query parameters of the routes by path template (e.g. "/items/{item_id}"),
+    with the ones of their dependencies.
+    For the `list_params` of QueryStringFlatteningMiddleware, after the routers are included.
+    """
+    params: Dict[str, Tuple[str, ...]] = {}
+    for route in routes:
+        if not isinstance(route, APIRoute):
+            continue
+        names = tuple(
+            field.alias
+            for field in get_flat_dependant(route.dependant).query_params
+            if is_list_annotation(field.field_info.annotation)
+        )
+        if names:
+            params[route.path] = tuple(
+                dict.fromkeys(params.get(route.path, ()) + names)
             )
-            await self.app(scope, receive, send)
-        else:
-            await self.app(scope, receive, send)
+    return params
+
+
+class QueryStringFlatteningMiddleware:
+    def __init__(
+        self, app: ASGIApp, list_params: Optional[Mapping[str, Iterable[str]]] = None
+    ) -> None:
+        """
+        :param list_params: List-valued query parameter names by path template, other
+            requests are passed through untouched. None flattens every parameter of every path.
+        """
+        self.app = app
+        # Matched like the routes do, "/items/{item_id}" matches "/items/1"
+        self.list_params: Optional[List[Tuple[Pattern, FrozenSet[str]]]] = (
+            None
+            if list_params is None
+            else [
+                (compile_path(path)[0], frozenset(names))
+                for path, names in list_params.items()
+            ]
+        )
+
+    def path_list_params(self, scope: Scope) -> FrozenSet[str]:
+        path = route_path(scope)
+        for path_regex, names in self.list_params or ():
+            if path_regex.match(path):
+                return names
+        return frozenset()
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Convert lists into repeated parameters, which is better for FastAPI
+        if scope["type"] == "http" and has_comma(scope.get("query_string") or b""):
+            if self.list_params is None:
+                scope["query_string"] = flatten_query_string(scope["query_string"])
+            elif names := self.path_list_params(scope):
+                scope["query_string"] = flatten_query_string(
+                    scope["query_string"], names
+                )
+
+        await self.app(scope, receive, send)
@@ -3,9 +3,9 @@ Get TOKEN string from the request Authorization header
 """
 
 from contextvars import ContextVar
+from typing import Optional
 
-from starlette.middleware.base import BaseHTTPMiddleware, RequestResponseEndpoint
-from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
 
 # create context variable for TOKEN
 REQUEST_TOKEN_CTX_KEY = "request_token"
@@ -16,9 +16,25 @@ def get_request_token() -> str:
     return request_token_ctx_var.get()
 
 
-class RequestContextMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: RequestResponseEndpoint):
-        request_token = request.headers.get("Authorization", None)
-        request_token_ctx_var.set(request_token)
-        response = await call_next(request)
-        return response
+def get_header(scope: Scope, name: bytes) -> Optional[str]:
+    """First value of a header of an ASGI scope, `name` in lower case (as ASGI servers send it)"""
+    for key, value in scope.get("headers", ()):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+class RequestContextMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = request_token_ctx_var.set(get_header(scope, b"authorization"))
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_token_ctx_var.reset(token)
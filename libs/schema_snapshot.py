@@ -0,0 +1,148 @@
+"""
+Automapped models from a pickled schema snapshot instead of live DB reflection
+
+The first start reflects the database and writes the snapshot. Later starts load it without
+touching the database, and a background thread compares it with the live schema. A changed
+schema is written to the snapshot, to be used from the next start.
+"""
+
+import logging
+import os
+import pickle
+import threading
+from datetime import datetime
+from typing import Optional
+
+import sqlalchemy
+from sqlalchemy import MetaData
+from sqlalchemy.ext.automap import AutomapBase, automap_base
+
+import config
+
+logger = logging.getLogger(__name__)
+
+# Version of the snapshot file layout, snapshots of another version are not loaded
+SNAPSHOT_FORMAT = 1
+
+
+def schema_fingerprint(metadata: MetaData) -> dict:
+    """
+    What the models depend on: tables, columns, their types, nullability and primary keys,
+    and the foreign keys automap builds the relationships from
+    """
+    return {
+        table.fullname: (
+            [
+                (column.name, repr(column.type), column.nullable, column.primary_key)
+                for column in table.columns
+            ],
+            sorted(
+                (
+                    tuple(constraint.column_keys),
+                    tuple(element.target_fullname for element in constraint.elements),
+                )
+                for constraint in table.foreign_key_constraints
+            ),
+        )
+        for table in metadata.sorted_tables
+    }
+
+
+class SchemaSnapshotMapper:
+    """Same interface as palzlib's DBMapper, models are built on the first get_model call"""
+
+    def __init__(self, db_client, name: str, snapshot_dir: str = None):
+        """
+        :param db_client: DBClient of the database
+        :param name: Name of the snapshot file (one per database)
+        :param snapshot_dir: Directory of the snapshots, config.SCHEMA_SNAPSHOT_DIR by default
+        """
+        self.db_client = db_client
+        self.path = os.path.join(
+            snapshot_dir or config.SCHEMA_SNAPSHOT_DIR, f"{name}.schema.pickle"
+        )
+        self.lock = threading.Lock()
+        self.base: Optional[AutomapBase] = None
+
+    def get_model(self, table_name: str):
+        base = self.base if self.base is not None else self.load()
+        if table_name not in base.classes:
+            raise KeyError(f"Table '{table_name}' not found in database.")
+        return base.classes[table_name]
+
+    def load(self) -> AutomapBase:
+        with self.lock:
+            if self.base is not None:
+                return self.base
+
+            metadata = self.read_snapshot()
+            if metadata is None:
+                metadata = self.reflect()
+                self.write_snapshot(metadata)
+            else:
+                threading.Thread(
+                    target=self.verify,
+                    args=(metadata,),
+                    name="schema-snapshot-check",
+                    daemon=True,
+                ).start()
+
+            base = automap_base(metadata=metadata)
+            base.prepare()
+            self.base = base
+            return base
+
+    def reflect(self) -> MetaData:
+        metadata = MetaData()
+        metadata.reflect(self.db_client.engine, views=True)
+        return metadata
+
+    def read_snapshot(self) -> Optional[MetaData]:
+        try:
+            with open(self.path, "rb") as snapshot_file:
+                snapshot = pickle.load(snapshot_file)
+        except FileNotFoundError:
+            return None
+        except Exception as err:
+            logger.warning("Unreadable schema snapshot %s: %s", self.path, err)
+            return None
+
+        # Pickled SQLAlchemy objects are only compatible with the same version
+        if (
+            snapshot.get("format") != SNAPSHOT_FORMAT
+            or snapshot.get("sqlalchemy") != sqlalchemy.__version__
+        ):
+            return None
+        return snapshot["metadata"]
+
+    def write_snapshot(self, metadata: MetaData) -> None:
+        snapshot = {
+            "format": SNAPSHOT_FORMAT,
+            "sqlalchemy": sqlalchemy.__version__,
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "metadata": metadata,
+        }
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            # Written next to the snapshot and renamed, workers never read a partial file
+            temp_path = f"{self.path}.{os.getpid()}.tmp"
+            with open(temp_path, "wb") as snapshot_file:
+                pickle.dump(snapshot, snapshot_file, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(temp_path, self.path)
+        except OSError as err:
+            logger.warning("Could not write schema snapshot %s: %s", self.path, err)
+
+    def verify(self, metadata: MetaData) -> None:
+        """Compares the loaded snapshot with the live schema, runs in a background thread"""
+        try:
+            live_metadata = self.reflect()
+        except Exception as err:
+            logger.warning("Could not check schema snapshot %s: %s", self.path, err)
+            return
+
+        if schema_fingerprint(live_metadata) != schema_fingerprint(metadata):
+            logger.warning(
+                "Schema snapshot %s differs from the database, updated for the next start",
+                self.path,
+            )
+            self.write_snapshot(live_metadata)
@@ -0,0 +1,158 @@
+"""
+Daily sentiment rollup of the power_of_words database (sql/feed_sentiment_daily.sql)
+
+The rollup answers the date/source/model filtered sentiment aggregates without scanning
+the feeds - feed_sentiments join. Word and free-text filters need the raw tables.
+"""
+
+from typing import List, Optional
+
+from sqlalchemy import (
+    Date,
+    Float,
+    Integer,
+    String,
+    asc,
+    cast,
+    column,
+    func,
+    select,
+    table,
+)
+
+import config
+from libs.functions import SENTIMENT_KEYS
+from models.feed_db_filters import FeedDBFilters
+
+feed_sentiment_daily = table(
+    "feed_sentiment_daily",
+    column("feed_date", Date),
+    column("source_id", Integer),
+    column("model_id", Integer),
+    column("sentiment_key", String),
+    column("feed_count", Integer),
+    column("value_sum", Float),
+    column("value_min", Float),
+    column("value_max", Float),
+    column("compound_sum", Float),
+    column("compound_min", Float),
+    column("compound_max", Float),
+)
+
+
+def date_bucket(date_column, granularity: str = "day"):
+    """Truncates a date column to the start of its day, week or month"""
+    if granularity == "day":
+        return date_column
+    return cast(func.date_trunc(granularity, date_column), Date)
+
+
+def can_use_rollup(filters: FeedDBFilters) -> bool:
+    """
+    Query planner: the rollup can answer when only date, source and model filters are present.
+
+    :param filters: Filters of the request
+    :return: True if the query can be answered from the rollup
+    """
+    if not config.POW_SENTIMENT_ROLLUP:
+        return False
+    return not filters.words and not filters.free_text
+
+
+def date_conditions(start_date: str, end_date: str) -> list:
+    """Dates can be given with time part too, the date part is used"""
+    return [
+        feed_sentiment_daily.c.feed_date >= cast(start_date, Date),
+        feed_sentiment_daily.c.feed_date <= cast(end_date, Date),
+    ]
+
+
+def count_sentiments_query(
+    start_date: str,
+    end_date: str,
+    model_id: int = 1,
+    sources: Optional[List[int]] = None,
+):
+    conditions = [
+        feed_sentiment_daily.c.model_id == model_id,
+        *date_conditions(start_date, end_date),
+    ]
+    if sources:
+        conditions.append(feed_sentiment_daily.c.source_id.in_(sources))
+
+    return select(
+        *(
+            func.sum(feed_sentiment_daily.c.feed_count)
+            .filter(feed_sentiment_daily.c.sentiment_key == sentiment_key)
+            .label(f"{sentiment_key}_sentiments")
+            for sentiment_key in SENTIMENT_KEYS
+        )
+    ).where(*conditions)
+
+
+def sentiment_grouped_query(
+    filters: FeedDBFilters,
+    group_by: str = "source",
+    granularity: str = "day",
+    model_id: int = 1,
+):
+    """Same rows as the raw get_sentiment_grouped query: (group_by, negative, neutral, positive)"""
+    if group_by == "source":
+        group_by_column = feed_sentiment_daily.c.source_id
+    else:
+        group_by_column = date_bucket(feed_sentiment_daily.c.feed_date, granularity)
+
+    conditions = [
+        feed_sentiment_daily.c.model_id == model_id,
+        *date_conditions(filters.start_date, filters.end_date),
+    ]
+    if filters.sources:
+        conditions.append(feed_sentiment_daily.c.source_id.in_(filters.sources))
+
+    return (
+        select(
+            group_by_column.label("group_by"),
+            *(
+                func.coalesce(
+                    func.sum(feed_sentiment_daily.c.feed_count).filter(
+                        feed_sentiment_daily.c.sentiment_key == sentiment_key
+                    ),
+                    0,
+                ).label(sentiment_key)
+                for sentiment_key in SENTIMENT_KEYS
+            ),
+        )
+        .where(*conditions)
+        .group_by(group_by_column)
+        .order_by(asc(group_by_column))
+    )
+
+
+def top_value_threshold_query(
+    start_date: str,
+    end_date: str,
+    sentiment_key: str,
+    limit: int,
+    sources: Optional[List[int]] = None,
+):
+    """
+    Lower bound of the `limit` highest sentiment values in the date range.
+
+    Every daily bucket's maximum belongs to a different feed, so the `limit`-th highest bucket
+    maximum has at least `limit` feeds at or above it. Returns no row if there are fewer buckets.
+    """
+    conditions = [
+        feed_sentiment_daily.c.sentiment_key == sentiment_key,
+        feed_sentiment_daily.c.value_max.is_not(None),
+        *date_conditions(start_date, end_date),
+    ]
+    if sources:
+        conditions.append(feed_sentiment_daily.c.source_id.in_(sources))
+
+    return (
+        select(feed_sentiment_daily.c.value_max)
+        .where(*conditions)
+        .order_by(feed_sentiment_daily.c.value_max.desc())
+        .offset(max(limit - 1, 0))
+        .limit(1)
+    )
@@ -0,0 +1,61 @@
+"""
+In-memory LRU cache with per-entry expiry, for values shared by the requests of one process
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+
+class TTLCache:
+    """
+    Bounded by the number of entries and, optionally, by the total size given for them.
+    Used from the event loop only, so it takes no locks.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 128, max_bytes: Optional[int] = None):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self.entries: "OrderedDict[Hashable, Tuple[float, int, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Any:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        expires_at, _, value = entry
+        if expires_at <= time.monotonic():
+            self.pop(key)
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def set(
+        self, key: Hashable, value: Any, size: int = 0, ttl: Optional[float] = None
+    ) -> None:
+        if self.maxsize <= 0 or (self.max_bytes is not None and size > self.max_bytes):
+            return
+        self.pop(key)
+        self.entries[key] = (
+            time.monotonic() + (self.ttl if ttl is None else ttl),
+            size,
+            value,
+        )
+        self.total_bytes += size
+        while len(self.entries) > self.maxsize or (
+            self.max_bytes is not None and self.total_bytes > self.max_bytes
+        ):
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+
+    def pop(self, key: Hashable) -> Any:
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+        self.total_bytes -= entry[1]
+        return entry[2]
+
+    def clear(self) -> None:
+        self.entries.clear()
+        self.total_bytes = 0
@@ -0,0 +1,77 @@
+"""
+Binary response of numeric columns, readable as JavaScript typed arrays without parsing
+
+Layout: uint32 (little-endian) length of a JSON header, the header, padding to a multiple of
+8 bytes, then one little-endian buffer per numeric column, each padded to 8 bytes. The header
+lists the columns' type, length and byte offset from the start of the buffers; non-numeric
+columns are carried in the header's "values".
+
+    const headerLength = new DataView(body).getUint32(0, true);
+    const header = JSON.parse(new TextDecoder().decode(new Uint8Array(body, 4, headerLength)));
+    const start = Math.ceil((4 + headerLength) / 8) * 8;
+    const magnitudes = new Float32Array(body, start + column.offset, column.length);
+"""
+
+import json
+import math
+import sys
+from array import array
+from typing import Mapping, Sequence
+
+# JSON header name -> array module typecode
+TYPECODES = {"float32": "f", "float64": "d"}
+ALIGNMENT = 8
+
+
+def padding(size: int) -> int:
+    return -size % ALIGNMENT
+
+
+def is_numeric(values: Sequence) -> bool:
+    return all(
+        value is None
+        or (isinstance(value, (int, float)) and not isinstance(value, bool))
+        for value in values
+    )
+
+
+def pack_columns(columns: Mapping[str, Sequence], types: Mapping[str, str]) -> bytes:
+    """
+    :param columns: Column name -> values, all of the same length
+    :param types: Column name -> "float32" or "float64", other numeric columns are float32,
+        non-numeric ones go to the header. Missing values are NaN.
+    """
+    count = len(next(iter(columns.values()), ()))
+    header: dict = {"count": count, "columns": [], "values": {}}
+    buffers = []
+    offset = 0
+
+    for name, values in columns.items():
+        if not is_numeric(values):
+            header["values"][name] = list(values)
+            continue
+
+        column_type = types.get(name, "float32")
+        buffer = array(
+            TYPECODES[column_type],
+            (math.nan if value is None else value for value in values),
+        )
+        if sys.byteorder == "big":
+            buffer.byteswap()
+        data = buffer.tobytes()
+        buffers.append(data + b"\0" * padding(len(data)))
+
+        header["columns"].append(
+            {"name": name, "type": column_type, "length": count, "offset": offset}
+        )
+        offset += len(buffers[-1])
+
+    encoded_header = json.dumps(header, separators=(",", ":")).encode()
+    return b"".join(
+        [
+            len(encoded_header).to_bytes(4, "little"),
+            encoded_header,
+            b"\0" * padding(4 + len(encoded_header)),
+            *buffers,
+        ]
+    )
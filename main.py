@@ -1,30 +1,62 @@
+from contextlib import asynccontextmanager
+from importlib import import_module
 from urllib.request import Request
 
 from fastapi import FastAPI
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
 from starlette.exceptions import HTTPException
 from starlette.responses import JSONResponse
 
 import config
-from apis import (
-    earthquakes,
-    movie_connections,
-    power_of_words,
-    sentiment_analyzer,
-    time_travellers,
+from apis import metrics
+from libs.db_instrumentation import instrument_engines
+from libs.http_client import close_http_clients
+from libs.middlewares.db_instrumentation_middleware import DBInstrumentationMiddleware
+from libs.middlewares.metrics_middleware import (
+    MetricsMiddleware,
+    start_event_loop_lag_monitor,
+    stop_event_loop_lag_monitor,
+)
+from libs.middlewares.query_flattening_middleware import (
+    QueryStringFlatteningMiddleware,
+    list_query_params,
 )
-from libs.middlewares.query_flattening_middleware import QueryStringFlatteningMiddleware
 from libs.middlewares.request_context_middleware import RequestContextMiddleware
 from libs.responses import responses
 
+# Only the enabled routers are imported, with their dependencies
+routers = [import_module(f"apis.{name}") for name in config.API_ROUTERS]
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_event_loop_lag_monitor()
+    # DB reflection and background tasks of the routers, before the first request is served
+    for module in routers:
+        if hasattr(module, "load_models"):
+            await run_in_threadpool(module.load_models)
+        if hasattr(module, "startup"):
+            await module.startup()
+    yield
+    for module in routers:
+        if hasattr(module, "shutdown"):
+            await module.shutdown()
+    await close_http_clients()
+    await stop_event_loop_lag_monitor()
+
+
 app = FastAPI(
     title=config.API_NAME,
     debug=config.API_DEBUG,
     version="0.1",
     openapi_url="/swagger.json",
+    lifespan=lifespan,
 )
 
+instrument_engines()
+
 origins = config.AWS_CORS_ALLOWED_LIST
 
 app.add_middleware(
@@ -35,15 +67,19 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+for module in routers:
+    app.include_router(module.router)
+app.include_router(metrics.router)
+
 # app.add_middleware(AuthenticationMiddleware)
-app.add_middleware(QueryStringFlatteningMiddleware)
+# Comma-separated values of the list-typed query parameters of the routes
+app.add_middleware(
+    QueryStringFlatteningMiddleware, list_params=list_query_params(app.routes)
+)
 app.add_middleware(RequestContextMiddleware)
-
-app.include_router(earthquakes.router)
-app.include_router(time_travellers.router)
-app.include_router(movie_connections.router)
-app.include_router(power_of_words.router)
-app.include_router(sentiment_analyzer.router)
+app.add_middleware(DBInstrumentationMiddleware)
+# Outermost, so the time spent in the other middlewares is measured too
+app.add_middleware(MetricsMiddleware, routes=app.routes)
 
 
 @app.exception_handler(HTTPException)
@@ -0,0 +1,18 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class DBPoolConfig:
+    pool_size: int = 5
+    max_overflow: int = 10
+    # Seconds to wait for a connection when the pool is exhausted
+    pool_timeout: float = 30
+    # Seconds after which a connection is replaced, -1 keeps connections forever
+    pool_recycle: int = 1800
+    pool_pre_ping: bool = True
+    # Default statement_timeout of the connections in milliseconds, 0 disables it
+    statement_timeout_ms: int = 0
+
+    @property
+    def max_connections(self) -> int:
+        return self.pool_size + max(self.max_overflow, 0)
@@ -0,0 +1,175 @@
+-- Daily sentiment rollup of the power_of_words database
+--
+-- One row per (feed_date, source_id, model_id, sentiment_key) with counts, sums and min/max of
+-- sentiment_value and sentiment_compound. Feeds without a source are counted with a NULL
+-- source_id, like the raw queries count them. New feed_sentiments rows are added incrementally
+-- by a trigger, updated and deleted ones recompute their daily rows. Changes of feeds.feed_date
+-- or feeds.source_id are not followed: refresh_feed_sentiment_daily() rebuilds a date range.
+--
+-- Initial load:
+--   SELECT refresh_feed_sentiment_daily((SELECT MIN(feed_date) FROM feeds), CURRENT_DATE);
+
+CREATE TABLE IF NOT EXISTS feed_sentiment_daily (
+    feed_date       DATE             NOT NULL,
+    source_id       INTEGER,
+    model_id        INTEGER          NOT NULL,
+    sentiment_key   VARCHAR          NOT NULL,
+    feed_count      INTEGER          NOT NULL DEFAULT 0,
+    value_sum       DOUBLE PRECISION NOT NULL DEFAULT 0,
+    value_min       DOUBLE PRECISION,
+    value_max       DOUBLE PRECISION,
+    compound_sum    DOUBLE PRECISION NOT NULL DEFAULT 0,
+    compound_min    DOUBLE PRECISION,
+    compound_max    DOUBLE PRECISION
+);
+
+-- The key of the rows, a NULL source_id is one source here
+CREATE UNIQUE INDEX IF NOT EXISTS feed_sentiment_daily_key_idx
+    ON feed_sentiment_daily (feed_date, COALESCE(source_id, 0), model_id, sentiment_key);
+
+CREATE INDEX IF NOT EXISTS feed_sentiment_daily_model_date_idx
+    ON feed_sentiment_daily (model_id, feed_date);
+
+-- Used by top_feeds: the rollup gives a lower bound of the top N values, this index finds them
+CREATE INDEX IF NOT EXISTS feed_sentiments_key_value_idx
+    ON feed_sentiments (sentiment_key, sentiment_value DESC);
+
+
+CREATE OR REPLACE FUNCTION refresh_feed_sentiment_daily(p_from DATE, p_to DATE)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM feed_sentiment_daily WHERE feed_date BETWEEN p_from AND p_to;
+
+    INSERT INTO feed_sentiment_daily (
+        feed_date, source_id, model_id, sentiment_key, feed_count,
+        value_sum, value_min, value_max, compound_sum, compound_min, compound_max
+    )
+    SELECT
+        f.feed_date,
+        f.source_id,
+        fs.model_id,
+        fs.sentiment_key,
+        COUNT(*),
+        COALESCE(SUM(fs.sentiment_value), 0),
+        MIN(fs.sentiment_value),
+        MAX(fs.sentiment_value),
+        COALESCE(SUM(fs.sentiment_compound), 0),
+        MIN(fs.sentiment_compound),
+        MAX(fs.sentiment_compound)
+    FROM feeds f
+    JOIN feed_sentiments fs ON fs.feed_id = f.id
+    WHERE f.feed_date BETWEEN p_from AND p_to
+      AND fs.sentiment_key IS NOT NULL
+    GROUP BY f.feed_date, f.source_id, fs.model_id, fs.sentiment_key;
+END;
+$$ LANGUAGE plpgsql;
+
+
+-- Recomputes one daily row, min/max can not be maintained incrementally on updates and deletes
+CREATE OR REPLACE FUNCTION refresh_feed_sentiment_daily_row(
+    p_feed_id BIGINT, p_model_id INTEGER, p_sentiment_key VARCHAR
+)
+RETURNS VOID AS $$
+DECLARE
+    v_feed_date DATE;
+    v_source_id INTEGER;
+BEGIN
+    SELECT feed_date, source_id INTO v_feed_date, v_source_id FROM feeds WHERE id = p_feed_id;
+    IF v_feed_date IS NULL OR p_sentiment_key IS NULL THEN
+        RETURN;
+    END IF;
+
+    DELETE FROM feed_sentiment_daily
+    WHERE feed_date = v_feed_date
+      AND source_id IS NOT DISTINCT FROM v_source_id
+      AND model_id = p_model_id
+      AND sentiment_key = p_sentiment_key;
+
+    INSERT INTO feed_sentiment_daily (
+        feed_date, source_id, model_id, sentiment_key, feed_count,
+        value_sum, value_min, value_max, compound_sum, compound_min, compound_max
+    )
+    SELECT
+        v_feed_date,
+        v_source_id,
+        p_model_id,
+        p_sentiment_key,
+        COUNT(*),
+        COALESCE(SUM(fs.sentiment_value), 0),
+        MIN(fs.sentiment_value),
+        MAX(fs.sentiment_value),
+        COALESCE(SUM(fs.sentiment_compound), 0),
+        MIN(fs.sentiment_compound),
+        MAX(fs.sentiment_compound)
+    FROM feeds f
+    JOIN feed_sentiments fs ON fs.feed_id = f.id
+    WHERE f.feed_date = v_feed_date
+      AND f.source_id IS NOT DISTINCT FROM v_source_id
+      AND fs.model_id = p_model_id
+      AND fs.sentiment_key = p_sentiment_key
+    HAVING COUNT(*) > 0;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION feed_sentiment_daily_on_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO feed_sentiment_daily AS d (
+        feed_date, source_id, model_id, sentiment_key, feed_count,
+        value_sum, value_min, value_max, compound_sum, compound_min, compound_max
+    )
+    SELECT
+        f.feed_date,
+        f.source_id,
+        NEW.model_id,
+        NEW.sentiment_key,
+        1,
+        COALESCE(NEW.sentiment_value, 0),
+        NEW.sentiment_value,
+        NEW.sentiment_value,
+        COALESCE(NEW.sentiment_compound, 0),
+        NEW.sentiment_compound,
+        NEW.sentiment_compound
+    FROM feeds f
+    WHERE f.id = NEW.feed_id
+      AND f.feed_date IS NOT NULL
+      AND NEW.sentiment_key IS NOT NULL
+    ON CONFLICT (feed_date, COALESCE(source_id, 0), model_id, sentiment_key) DO UPDATE SET
+        feed_count   = d.feed_count + 1,
+        value_sum    = d.value_sum + EXCLUDED.value_sum,
+        value_min    = LEAST(d.value_min, EXCLUDED.value_min),
+        value_max    = GREATEST(d.value_max, EXCLUDED.value_max),
+        compound_sum = d.compound_sum + EXCLUDED.compound_sum,
+        compound_min = LEAST(d.compound_min, EXCLUDED.compound_min),
+        compound_max = GREATEST(d.compound_max, EXCLUDED.compound_max);
+
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS feed_sentiment_daily_insert ON feed_sentiments;
+CREATE TRIGGER feed_sentiment_daily_insert
+    AFTER INSERT ON feed_sentiments
+    FOR EACH ROW EXECUTE FUNCTION feed_sentiment_daily_on_insert();
+
+
+CREATE OR REPLACE FUNCTION feed_sentiment_daily_on_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    PERFORM refresh_feed_sentiment_daily_row(OLD.feed_id, OLD.model_id, OLD.sentiment_key);
+    IF TG_OP = 'UPDATE'
+       AND (NEW.feed_id, NEW.model_id, NEW.sentiment_key)
+           IS DISTINCT FROM (OLD.feed_id, OLD.model_id, OLD.sentiment_key) THEN
+        PERFORM refresh_feed_sentiment_daily_row(NEW.feed_id, NEW.model_id, NEW.sentiment_key);
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS feed_sentiment_daily_change ON feed_sentiments;
+CREATE TRIGGER feed_sentiment_daily_change
+    AFTER UPDATE OF feed_id, model_id, sentiment_key, sentiment_value, sentiment_compound
+    OR DELETE ON feed_sentiments
+    FOR EACH ROW EXECUTE FUNCTION feed_sentiment_daily_on_change();
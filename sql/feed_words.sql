@@ -0,0 +1,30 @@
+-- Vocabulary of the power_of_words database: every distinct word of feeds.words
+--
+-- Prefix searches (input word -> words starting with it) use the text_pattern_ops index.
+-- New and updated feeds are added by a trigger.
+--
+-- Initial load:
+--   INSERT INTO feed_words (word) SELECT DISTINCT unnest(words) FROM feeds ON CONFLICT DO NOTHING;
+
+CREATE TABLE IF NOT EXISTS feed_words (
+    word TEXT PRIMARY KEY
+);
+
+CREATE INDEX IF NOT EXISTS feed_words_word_pattern_idx
+    ON feed_words (word text_pattern_ops);
+
+
+CREATE OR REPLACE FUNCTION feed_words_on_change()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO feed_words (word)
+    SELECT DISTINCT w FROM unnest(NEW.words) AS w WHERE w IS NOT NULL
+    ON CONFLICT DO NOTHING;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS feed_words_change ON feeds;
+CREATE TRIGGER feed_words_change
+    AFTER INSERT OR UPDATE OF words ON feeds
+    FOR EACH ROW EXECUTE FUNCTION feed_words_on_change();
@@ -0,0 +1,11 @@
+-- Indexes of the power_of_words database used by the API queries
+--
+-- CONCURRENTLY cannot run inside a transaction block, run this file with autocommit (psql -f).
+
+-- Array containment on feeds.words (words @> ARRAY[...], words && ARRAY[...])
+CREATE INDEX CONCURRENTLY IF NOT EXISTS feeds_words_gin_idx
+    ON feeds USING GIN (words);
+
+-- Sentiments of a feed for one model
+CREATE INDEX CONCURRENTLY IF NOT EXISTS feed_sentiments_feed_model_idx
+    ON feed_sentiments (feed_id, model_id);
@@ -0,0 +1,116 @@
+-- Daily word co-occurrence index of the power_of_words database
+--
+-- One row per unordered pair (word_a < word_b, feed_date) with the number of articles
+-- containing both words and their sentiment tallies (sentiment model 1). The neighbours of a
+-- word are read from both sides: the primary key for word_a, word_pair_daily_word_b_idx for
+-- word_b. Words of word_pair_excluded_words (stop-words, the most frequent words) are left out.
+-- New feed_sentiments rows of model 1 are added by a trigger, refresh_word_pair_daily() rebuilds
+-- a date range.
+--
+-- Initial load (after changing word_pair_excluded_words, refresh the affected dates again):
+--   INSERT INTO word_pair_excluded_words (word)
+--   SELECT w FROM feeds, unnest(words) AS w GROUP BY w ORDER BY COUNT(*) DESC LIMIT 50
+--   ON CONFLICT DO NOTHING;
+--   -- and the stop-words of power_of_words.get_stopwords()
+--   SELECT refresh_word_pair_daily((SELECT MIN(feed_date) FROM feeds), CURRENT_DATE);
+
+CREATE TABLE IF NOT EXISTS word_pair_daily (
+    word_a          TEXT    NOT NULL,
+    feed_date       DATE    NOT NULL,
+    word_b          TEXT    NOT NULL,
+    pair_count      INTEGER NOT NULL DEFAULT 0,
+    positive_count  INTEGER NOT NULL DEFAULT 0,
+    negative_count  INTEGER NOT NULL DEFAULT 0,
+    neutral_count   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (word_a, feed_date, word_b)
+);
+
+CREATE INDEX IF NOT EXISTS word_pair_daily_word_b_idx
+    ON word_pair_daily (word_b, feed_date);
+
+CREATE TABLE IF NOT EXISTS word_pair_excluded_words (
+    word TEXT PRIMARY KEY
+);
+
+
+-- Distinct unordered pairs of the words of a feed, without the excluded words
+CREATE OR REPLACE FUNCTION word_pairs(p_words TEXT[])
+RETURNS TABLE (word_a TEXT, word_b TEXT) AS $$
+    WITH feed_words AS (
+        SELECT DISTINCT u.word
+        FROM unnest(p_words) AS u (word)
+        WHERE u.word IS NOT NULL
+          AND NOT EXISTS (
+              SELECT 1 FROM word_pair_excluded_words x WHERE x.word = u.word
+          )
+    )
+    SELECT a.word, b.word
+    FROM feed_words a
+    JOIN feed_words b ON a.word < b.word;
+$$ LANGUAGE sql STABLE;
+
+
+CREATE OR REPLACE FUNCTION refresh_word_pair_daily(p_from DATE, p_to DATE)
+RETURNS VOID AS $$
+BEGIN
+    DELETE FROM word_pair_daily WHERE feed_date BETWEEN p_from AND p_to;
+
+    INSERT INTO word_pair_daily (
+        word_a, feed_date, word_b, pair_count, positive_count, negative_count, neutral_count
+    )
+    SELECT
+        p.word_a,
+        f.feed_date,
+        p.word_b,
+        COUNT(*),
+        COUNT(*) FILTER (WHERE fs.sentiment_key = 'positive'),
+        COUNT(*) FILTER (WHERE fs.sentiment_key = 'negative'),
+        COUNT(*) FILTER (WHERE fs.sentiment_key = 'neutral')
+    FROM feeds f
+    JOIN feed_sentiments fs ON fs.feed_id = f.id AND fs.model_id = 1
+    CROSS JOIN LATERAL word_pairs(f.words) p
+    WHERE f.feed_date BETWEEN p_from AND p_to
+    GROUP BY p.word_a, f.feed_date, p.word_b;
+END;
+$$ LANGUAGE plpgsql;
+
+
+CREATE OR REPLACE FUNCTION word_pair_daily_add_feed(p_feed_id BIGINT, p_sentiment_key VARCHAR)
+RETURNS VOID AS $$
+    INSERT INTO word_pair_daily AS d (
+        word_a, feed_date, word_b, pair_count, positive_count, negative_count, neutral_count
+    )
+    SELECT
+        p.word_a,
+        f.feed_date,
+        p.word_b,
+        1,
+        (p_sentiment_key = 'positive')::INTEGER,
+        (p_sentiment_key = 'negative')::INTEGER,
+        (p_sentiment_key = 'neutral')::INTEGER
+    FROM feeds f
+    CROSS JOIN LATERAL word_pairs(f.words) p
+    WHERE f.id = p_feed_id
+      AND f.feed_date IS NOT NULL
+    ON CONFLICT (word_a, feed_date, word_b) DO UPDATE SET
+        pair_count     = d.pair_count + 1,
+        positive_count = d.positive_count + EXCLUDED.positive_count,
+        negative_count = d.negative_count + EXCLUDED.negative_count,
+        neutral_count  = d.neutral_count + EXCLUDED.neutral_count;
+$$ LANGUAGE sql;
+
+
+CREATE OR REPLACE FUNCTION word_pair_daily_on_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.model_id = 1 THEN
+        PERFORM word_pair_daily_add_feed(NEW.feed_id, NEW.sentiment_key);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS word_pair_daily_insert ON feed_sentiments;
+CREATE TRIGGER word_pair_daily_insert
+    AFTER INSERT ON feed_sentiments
+    FOR EACH ROW EXECUTE FUNCTION word_pair_daily_on_insert();
@@ -0,0 +1,46 @@
+from libs.clustering import CELLS_PER_TILE, cluster_points
+
+
+def test_points_of_a_cell_are_aggregated():
+    clusters = cluster_points(
+        [47.50, 47.51, 47.49, -33.9],
+        [19.04, 19.05, 19.03, 18.4],
+        [3.0, None, 4.5, None],
+        zoom=5,
+    )
+    assert clusters["zoom"] == 5
+    assert clusters["count"] == [3, 1]
+    assert clusters["latitude"] == [47.5, -33.9]
+    assert clusters["longitude"] == [19.04, 18.4]
+    assert clusters["max_magnitude"] == [4.5, None]
+
+
+def test_max_points_coarsens_the_grid():
+    latitude = [45 + index * 0.5 for index in range(10)]
+    longitude = [15 + index * 0.5 for index in range(10)]
+    magnitude = [2.5] * 10
+
+    assert len(cluster_points(latitude, longitude, magnitude)["count"]) == 10
+
+    clusters = cluster_points(latitude, longitude, magnitude, max_points=4)
+    assert len(clusters["count"]) <= 4
+    assert sum(clusters["count"]) == 10
+    assert 0 < clusters["zoom"] < 22
+
+
+def test_zoom_0_is_the_coarsest_grid():
+    latitude = [-80 + index * 16.0 for index in range(11)]
+    longitude = [-175 + index * 35.0 for index in range(11)]
+    clusters = cluster_points(latitude, longitude, [None] * 11, max_points=1)
+    assert clusters["zoom"] == 0
+    assert 1 < len(clusters["count"]) <= CELLS_PER_TILE**2
+
+
+def test_no_points():
+    assert cluster_points([], [], [], zoom=3) == {
+        "zoom": 3,
+        "latitude": [],
+        "longitude": [],
+        "count": [],
+        "max_magnitude": [],
+    }
@@ -0,0 +1,65 @@
+import random
+import statistics
+
+import pytest
+
+from libs.correlation import HISTOGRAM_BINS, VALUE_RANGE, CorrelationEngine, ValueStats
+
+BIN_WIDTH = (VALUE_RANGE[1] - VALUE_RANGE[0]) / HISTOGRAM_BINS
+
+
+def value_stats(values, **kwargs) -> ValueStats:
+    stats = ValueStats(with_median=True, **kwargs)
+    for value in values:
+        stats.add(value)
+    return stats
+
+
+@pytest.mark.parametrize("count", [1, 2, 101, 1000])
+def test_approximate_median_is_within_a_bin_of_the_exact_one(count):
+    rng = random.Random(count)
+    values = [rng.betavariate(2, 5) * 2 - 1 for _ in range(count)]
+
+    exact = value_stats(values)
+    approximate = value_stats(values, approximate=True)
+
+    assert exact.median == statistics.median(values)
+    # Within a bin of the middle value(s)
+    middle = sorted(values)[(count - 1) // 2 : count // 2 + 1]
+    assert middle[0] - BIN_WIDTH <= approximate.median <= middle[-1] + BIN_WIDTH
+    assert approximate.histogram is not None and approximate.values is None
+
+
+def test_approximate_median_stays_in_the_observed_range():
+    stats = value_stats([1.0, 1.0, 0.999], approximate=True)
+    assert 0.999 <= stats.median <= 1.0
+    assert value_stats([-1.0], approximate=True).median == -1.0
+
+
+def test_missing_values_are_skipped():
+    stats = value_stats([None, 0.5, None, -0.5])
+    assert (stats.count, stats.minimum, stats.maximum) == (2, -0.5, 0.5)
+    assert stats.average == 0 and stats.median == 0
+    assert value_stats([None]).median is None
+    assert ValueStats().median is None
+
+
+def test_engine_attributes_feeds_to_their_words():
+    engine = CorrelationEngine().consume(
+        [
+            (["war", "peace"], "A", "2024-01", "negative", 0.9, -0.8),
+            (["war"], "A", "2024-01", "positive", 0.6, 0.4),
+            (["peace"], None, "2024-02", "neutral", 0.7, 0.1),
+        ]
+    )
+
+    rows = {(row["word"], row["sourcename"]): row for row in engine.source_rows()}
+    assert list(rows) == [("peace", None), ("peace", "A"), ("war", "A")]
+    assert rows[("war", "A")]["nm_of_negative"] == 1
+    assert rows[("war", "A")]["median_positive"] == 0.6
+    assert rows[("war", "A")]["avg_compound"] == pytest.approx(-0.2)
+
+    assert engine.monthly_rows() == [
+        {"sourcename": None, "month": "2024-02", "avg_compound": 0.1},
+        {"sourcename": "A", "month": "2024-01", "avg_compound": pytest.approx(-0.2)},
+    ]
@@ -0,0 +1,76 @@
+from libs.credit_graph import CreditGraph
+
+
+def credits(*movie_ids: int) -> dict:
+    return {
+        "cast": [
+            {"id": movie_id, "title": f"Movie {movie_id}"} for movie_id in movie_ids
+        ],
+        "crew": [],
+    }
+
+
+def chain_graph(**kwargs) -> CreditGraph:
+    """1 -(10)- 2 -(20)- 3 -(30)- 4, and 5 in a movie of their own"""
+    graph = CreditGraph(**kwargs)
+    graph.add_person_credits(1, credits(10))
+    graph.add_person_credits(2, credits(10, 20))
+    graph.add_person_credits(3, credits(20, 30))
+    graph.add_person_credits(4, credits(30))
+    graph.add_person_credits(5, credits(50))
+    return graph
+
+
+def test_shortest_path_alternates_persons_and_movies():
+    assert chain_graph().shortest_path(1, 4) == [
+        {"person_id": 1},
+        {"movie_id": 10, "title": "Movie 10"},
+        {"person_id": 2},
+        {"movie_id": 20, "title": "Movie 20"},
+        {"person_id": 3},
+        {"movie_id": 30, "title": "Movie 30"},
+        {"person_id": 4},
+    ]
+
+
+def test_shortest_path_prefers_the_direct_movie():
+    graph = chain_graph()
+    graph.add_person_credits(6, credits(10, 30))
+    path = graph.shortest_path(1, 4)
+    assert [node.get("person_id") for node in path[::2]] == [1, 6, 4]
+
+
+def test_max_degrees_cutoff():
+    graph = chain_graph()
+    assert graph.shortest_path(1, 4, max_degrees=2) is None
+    assert len(graph.shortest_path(1, 4, max_degrees=3)) == 7
+    assert graph.shortest_path(1, 5) is None
+    assert graph.shortest_path(1, 99) is None
+    assert graph.shortest_path(2, 2) == [{"person_id": 2}]
+
+
+def test_repeated_credits_link_once():
+    graph = CreditGraph()
+    graph.add_person_credits(
+        1, {"cast": [{"id": 10}], "crew": [{"id": 10, "job": "Writer"}]}
+    )
+    assert graph.stats() == {"persons": 1, "movies": 1, "credits": 1}
+
+
+def test_max_credits_clears_the_graph():
+    graph = chain_graph(max_credits=7)
+    assert graph.stats()["credits"] == 7
+
+    graph.add_person_credits(6, credits(60))
+    assert graph.stats() == {"persons": 1, "movies": 1, "credits": 1}
+    assert graph.has_person(6)
+    assert not graph.has_person(1)
+
+
+def test_persons_added_together_survive_the_clear():
+    graph = chain_graph(max_credits=7)
+
+    graph.add_persons_credits({1: credits(10), 6: credits(10, 60)})
+    assert graph.stats() == {"persons": 2, "movies": 2, "credits": 3}
+    assert graph.has_person(1) and graph.has_person(6)
+    assert len(graph.shortest_path(1, 6)) == 3
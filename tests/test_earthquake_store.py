@@ -0,0 +1,83 @@
+import asyncio
+import time
+
+import httpx
+
+from libs.earthquake_store import EarthquakeStore
+
+DAY_MS = 86_400_000
+URL = "http://usgs.test/query?format=geojson"
+
+
+def feature(event_id: str, event_time: int, magnitude: float = 3.0) -> dict:
+    return {
+        "type": "Feature",
+        "id": event_id,
+        "properties": {"time": event_time, "updated": event_time, "mag": magnitude},
+        "geometry": {"type": "Point", "coordinates": [19.0, 47.5, 10.0]},
+    }
+
+
+def usgs_client(features: list) -> httpx.AsyncClient:
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json={"features": features})
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+def synced_store(tmp_path, **kwargs) -> EarthquakeStore:
+    store = EarthquakeStore(str(tmp_path / "events.sqlite3"), days=10, **kwargs)
+    now_ms = int(time.time() * 1000)
+    store.write(
+        [],
+        covered_from=now_ms - 10 * DAY_MS,
+        last_updated=now_ms,
+        synced_at=now_ms,
+    )
+    return store
+
+
+def test_covers_only_windows_before_a_recent_sync(tmp_path):
+    store = synced_store(tmp_path, max_staleness=60)
+    synced_at = store.state["synced_at"]
+    start_ms = synced_at - 5 * DAY_MS
+
+    assert store.covers(start_ms, synced_at, 2.5)
+    assert not store.covers(start_ms, synced_at + 60_000, 2.5)
+    assert not store.covers(synced_at - 11 * DAY_MS, synced_at, 2.5)
+    assert not store.covers(start_ms, synced_at, 2.0)
+    assert not store.covers(start_ms, None, 2.5)
+
+    store.state["synced_at"] = synced_at - 120_000
+    assert not store.covers(start_ms, synced_at - 120_000, 2.5)
+
+
+def test_sync_updates_prunes_the_events_before_the_window(tmp_path):
+    store = synced_store(tmp_path)
+    now_ms = store.state["synced_at"]
+    old_covered_from = now_ms - 12 * DAY_MS
+    store.write(
+        [feature("old", now_ms - 11 * DAY_MS), feature("kept", now_ms - DAY_MS)],
+        covered_from=old_covered_from,
+    )
+
+    asyncio.run(store.sync_updates(usgs_client([feature("new", now_ms)]), URL))
+
+    assert store.covered_from > old_covered_from
+    rows = store.query(("id",), 0, now_ms + DAY_MS, 0, 10)
+    assert sorted(event_id for (event_id,) in rows) == ["kept", "new"]
+    assert store.query(("id",), 0, now_ms, 0, 10, min_lat=40, max_lat=50) == rows
+
+
+def test_only_one_process_syncs(tmp_path):
+    store = synced_store(tmp_path)
+    other = EarthquakeStore(store.path, days=10)
+
+    with store.sync_lock() as locked:
+        assert locked
+        asyncio.run(
+            other.sync(usgs_client([feature("new", int(time.time() * 1000))]), URL)
+        )
+
+    assert store.query(("id",), 0, 2**62, 0, 10) == []
+    assert other.state == store.state
@@ -0,0 +1,92 @@
+import numpy as np
+import pytest
+
+from libs import intersection
+from libs.intersection import (
+    NUMPY_MIN_SIZE,
+    check_size,
+    count_array,
+    count_shared,
+    id_array,
+    intersect,
+)
+
+
+def test_intersect():
+    assert intersect([[5, 3, 1, 3], [3, 5, 7], [1, 3, 5]]) == [3, 5]
+    assert intersect([[1, 2], [], [2]]) == []
+    assert intersect([]) == []
+    assert intersect([[2, 1]]) == [1, 2]
+
+
+def test_intersect_mixed_types():
+    assert sorted(intersect([[1, "a", 2], ["a", 1]]), key=str) == [1, "a"]
+
+
+def test_check_size():
+    check_size([[1, 2], [3]], max_lists=2, max_ids=2)
+    with pytest.raises(ValueError):
+        check_size([[1], [2], [3]], max_lists=2, max_ids=2)
+    with pytest.raises(ValueError):
+        check_size([[1, 2, 3]], max_lists=2, max_ids=2)
+
+
+def test_id_array():
+    assert id_array([3, 1, 2]).tolist() == [3, 1, 2]
+    assert id_array([]).dtype == np.int64
+    assert id_array([1, -2]) is None
+    assert id_array([1.5, 2]) is None
+    assert id_array([1, "a"]) is None
+    assert id_array([True, False]) is None
+    assert id_array([[1, 2], [3]]) is None
+
+
+def test_count_array_repeated_ids_count_once():
+    ids, counts = count_array(
+        [np.array([4, 4, 1]), np.array([4, 9]), np.empty(0, np.int64)]
+    )
+    assert ids.tolist() == [1, 4, 9]
+    assert counts.tolist() == [1, 2, 1]
+
+
+def test_count_array_sparse_ids(monkeypatch):
+    arrays = [np.array([7, 3, 100]), np.array([100, 3]), np.array([3])]
+    dense = count_array(arrays)
+    monkeypatch.setattr(intersection, "DENSE_MAX_ID", 10)
+    sparse = count_array(arrays)
+    assert [values.tolist() for values in sparse] == [
+        values.tolist() for values in dense
+    ]
+    assert dense[0].tolist() == [3, 7, 100]
+    assert dense[1].tolist() == [3, 1, 2]
+
+
+def test_count_array_empty():
+    ids, counts = count_array([np.empty(0, np.int64)])
+    assert ids.tolist() == [] and counts.tolist() == []
+
+
+def test_count_shared_small_lists():
+    lists = [[1, 2, 3, 3], [3, 2], [3, 4], []]
+    assert count_shared(lists) == [(3, 3), (2, 2)]
+    assert count_shared(lists, min_count=1) == [(3, 3), (2, 2), (1, 1), (4, 1)]
+    assert count_shared([["b", 1], [1, "b"], ["a"]]) in (
+        [(1, 2), ("b", 2)],
+        [("b", 2), (1, 2)],
+    )
+
+
+@pytest.mark.parametrize("dense_max_id", [intersection.DENSE_MAX_ID, 100])
+def test_count_shared_numpy_path_matches_python(monkeypatch, dense_max_id):
+    rng = np.random.default_rng(1)
+    lists = [rng.integers(0, 5000, size=NUMPY_MIN_SIZE // 2).tolist() for _ in range(4)]
+    monkeypatch.setattr(intersection, "DENSE_MAX_ID", dense_max_id)
+    numpy_result = count_shared(lists)
+    monkeypatch.setattr(intersection, "NUMPY_MIN_SIZE", 10**9)
+    assert numpy_result == count_shared(lists)
+    assert numpy_result[0][1] >= numpy_result[-1][1] >= 2
+
+
+def test_count_shared_falls_back_for_negative_and_mixed_ids():
+    lists = [list(range(-10, NUMPY_MIN_SIZE)), [-5, 3, -5], ["x", 3]]
+    assert count_shared(lists) == [(3, 3), (-5, 2)]
@@ -0,0 +1,87 @@
+import asyncio
+from typing import Annotated, List, Optional
+
+from fastapi import Depends, FastAPI, Query
+
+from libs.middlewares.query_flattening_middleware import (
+    QueryStringFlatteningMiddleware,
+    flatten_query_string,
+    list_query_params,
+)
+
+
+def paging(pages: List[int] = Query([1])) -> List[int]:
+    return pages
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/items")
+    async def items(
+        ids: Annotated[list, Query()] = [],
+        tags: Optional[List[str]] = Query(None),
+        name: Optional[str] = None,
+        pages: List[int] = Depends(paging),
+    ):
+        return ids
+
+    @app.get("/items/{item_id}/tags")
+    async def item_tags(item_id: int, tags: List[str] = Query([])):
+        return tags
+
+    @app.get("/scalar")
+    async def scalar(limit: int = 5):
+        return limit
+
+    return app
+
+
+def test_list_query_params_of_routes_and_dependencies():
+    assert list_query_params(build_app().routes) == {
+        "/items": ("ids", "tags", "pages"),
+        "/items/{item_id}/tags": ("tags",),
+    }
+
+
+def test_flatten_query_string_only_named_params():
+    query_string = b"ids=1,2&name=a,b&tags=x%2Cy"
+    assert (
+        flatten_query_string(query_string, frozenset(("ids", "tags")))
+        == b"ids=1&ids=2&name=a,b&tags=x&tags=y"
+    )
+
+
+def flattened_scope(scope: dict) -> dict:
+    """The scope the app behind the middleware receives"""
+    received = {}
+
+    async def app(scope, receive, send):
+        received.update(scope)
+
+    middleware = QueryStringFlatteningMiddleware(
+        app, list_params=list_query_params(build_app().routes)
+    )
+    asyncio.run(middleware({"type": "http", **scope}, None, None))
+    return received
+
+
+def test_middleware_matches_the_path_templates():
+    scope = flattened_scope({"path": "/items/7/tags", "query_string": b"tags=a,b"})
+    assert scope["query_string"] == b"tags=a&tags=b"
+
+    scope = flattened_scope({"path": "/items/7/other", "query_string": b"tags=a,b"})
+    assert scope["query_string"] == b"tags=a,b"
+    scope = flattened_scope({"path": "/scalar", "query_string": b"limit=1,2"})
+    assert scope["query_string"] == b"limit=1,2"
+
+
+def test_middleware_strips_the_root_path():
+    scope = flattened_scope(
+        {"path": "/api/items", "root_path": "/api", "query_string": b"ids=1,2"}
+    )
+    assert scope["query_string"] == b"ids=1&ids=2"
+
+
+def test_middleware_without_query_string():
+    assert "query_string" not in flattened_scope({"path": "/items"})
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table
+
+from libs.schema_snapshot import schema_fingerprint
+
+
+def feeds_metadata(source_column: str = "sources.id", title_type=String) -> MetaData:
+    metadata = MetaData()
+    Table("sources", metadata, Column("id", Integer, primary_key=True))
+    Table("authors", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "feeds",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("title", title_type),
+        Column("source_id", Integer, ForeignKey(source_column)),
+    )
+    return metadata
+
+
+def test_same_schema_same_fingerprint():
+    assert schema_fingerprint(feeds_metadata()) == schema_fingerprint(feeds_metadata())
+
+
+def test_fingerprint_of_columns_and_foreign_keys():
+    fingerprint = schema_fingerprint(feeds_metadata())
+    assert fingerprint != schema_fingerprint(feeds_metadata(title_type=Integer))
+    assert fingerprint != schema_fingerprint(feeds_metadata("authors.id"))
+    assert fingerprint["feeds"][1] == [(("source_id",), ("sources.id",))]
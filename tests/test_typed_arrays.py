@@ -0,0 +1,49 @@
+import json
+import math
+from array import array
+
+from libs.typed_arrays import ALIGNMENT, pack_columns
+
+
+def unpack(body: bytes):
+    header_length = int.from_bytes(body[:4], "little")
+    header = json.loads(body[4 : 4 + header_length])
+    start = math.ceil((4 + header_length) / ALIGNMENT) * ALIGNMENT
+    columns = {}
+    for column in header["columns"]:
+        assert (start + column["offset"]) % ALIGNMENT == 0
+        values = array("f" if column["type"] == "float32" else "d")
+        offset = start + column["offset"]
+        values.frombytes(body[offset : offset + column["length"] * values.itemsize])
+        columns[column["name"]] = values.tolist()
+    return header, columns
+
+
+def test_numeric_columns_are_aligned_typed_arrays():
+    header, columns = unpack(
+        pack_columns(
+            {
+                "time": [1700000000000, 1700000060000, 1700000120000],
+                "mag": [2.5, None, 4],
+            },
+            {"time": "float64"},
+        )
+    )
+    assert header["count"] == 3
+    assert columns["time"] == [1700000000000, 1700000060000, 1700000120000]
+    assert columns["mag"][0] == 2.5 and columns["mag"][2] == 4
+    assert math.isnan(columns["mag"][1])
+
+
+def test_non_numeric_columns_go_to_the_header():
+    header, columns = unpack(
+        pack_columns({"id": ["a", "b"], "tsunami": [True, False], "depth": [1, 2]}, {})
+    )
+    assert header["values"] == {"id": ["a", "b"], "tsunami": [True, False]}
+    assert columns == {"depth": [1, 2]}
+
+
+def test_empty_columns():
+    header, columns = unpack(pack_columns({"time": [], "mag": []}, {}))
+    assert header["count"] == 0
+    assert columns == {"time": [], "mag": []}